@@ -0,0 +1,128 @@
+"""Parametric generators for large synthetic linkages.
+
+Every generator returns a list of line segments ([[x1, y1], [x2, y2]]) approximating the requested
+number of hubs. Segments sharing a hub use exactly the same coordinates for it.
+"""
+
+import math
+import numpy as np
+
+MAGIC = b"\xb1\xb2\xb3SolveSpaceREVa\n\n\n"
+WORKPLANE = "80020000"
+# request handles 1 to 3 are SolveSpace's reference planes, point handles keep the request in their high word
+FIRST_REQUEST = 4
+MAX_REQUEST = 0xFFFF
+
+
+def parallelogram_grid(hubs: int, link_length: float = 40.0, shear: float = 0.35) -> list:
+    """A sheared grid of hubs connected along both grid directions, i.e. a field of parallelograms. """
+    columns = max(2, int(round(math.sqrt(hubs))))
+    rows = max(2, int(math.ceil(hubs / columns)))
+
+    def position(row, column):
+        return [column * link_length + row * link_length * shear, row * link_length]
+
+    segments = []
+    for row in range(rows):
+        for column in range(columns):
+            if column + 1 < columns:
+                segments.append([position(row, column), position(row, column + 1)])
+            if row + 1 < rows:
+                segments.append([position(row, column), position(row + 1, column)])
+    return segments
+
+
+def peaucellier_chain(hubs: int, arm: float = 120.0, side: float = 50.0, crank: float = 40.0) -> list:
+    """Peaucellier-Lipkin cells in a row, each cell's traced point drives the next cell's crank.
+
+    A cell has 6 hubs: the fixed pivot O, the rhombus A C B P and the crank pivot M.
+    """
+    cells = max(1, int(round(hubs / 6)))
+    # rhombus diagonal A-B, chosen such that the arms O-A and O-B end at its corners
+    half_diagonal = 0.8 * side
+    rhombus_offset = math.sqrt(side ** 2 - half_diagonal ** 2)
+    arm_offset = math.sqrt(arm ** 2 - half_diagonal ** 2)
+    cell_width = arm_offset + rhombus_offset + 2 * crank
+
+    segments = []
+    previous_p = None
+    for cell in range(cells):
+        x = cell * cell_width
+        o = [x, 0.0]
+        a = [x + arm_offset, half_diagonal]
+        b = [x + arm_offset, -half_diagonal]
+        c = [x + arm_offset - rhombus_offset, 0.0]
+        p = [x + arm_offset + rhombus_offset, 0.0]
+        m = [x + (arm_offset - rhombus_offset) / 2, crank]
+        segments += [[o, a], [o, b], [a, c], [c, b], [a, p], [p, b], [m, c]]
+        if previous_p is not None:
+            segments.append([previous_p, m])
+        previous_p = p
+    return segments
+
+
+def random_planar_graph(hubs: int, spacing: float = 40.0, jitter: float = 0.25, density: float = 0.7,
+                        seed: int = 0) -> list:
+    """A planar graph on a jittered grid: grid edges are kept with probability density,
+    every grid cell additionally gets one of its diagonals with probability density / 2. """
+    random = np.random.RandomState(seed)
+    columns = max(2, int(round(math.sqrt(hubs))))
+    rows = max(2, int(math.ceil(hubs / columns)))
+    offsets = random.uniform(-jitter, jitter, size=(rows, columns, 2)) * spacing
+
+    def position(row, column):
+        return [float(column * spacing + offsets[row, column, 0]), float(row * spacing + offsets[row, column, 1])]
+
+    segments = []
+    for row in range(rows):
+        for column in range(columns):
+            if column + 1 < columns and random.rand() < density:
+                segments.append([position(row, column), position(row, column + 1)])
+            if row + 1 < rows and random.rand() < density:
+                segments.append([position(row, column), position(row + 1, column)])
+            if column + 1 < columns and row + 1 < rows and random.rand() < density / 2:
+                if random.rand() < 0.5:
+                    segments.append([position(row, column), position(row + 1, column + 1)])
+                else:
+                    segments.append([position(row, column + 1), position(row + 1, column)])
+    return segments
+
+
+GENERATORS = {
+    "grid": parallelogram_grid,
+    "peaucellier": peaucellier_chain,
+    "random": random_planar_graph,
+}
+
+
+def write_slvs(line_segments: list, file_name: str):
+    """Writes the line segments as 2d line requests of a .slvs file.
+
+    The file contains the params and entities read by parse.read_line_segments, it is not meant
+    to be opened in SolveSpace (groups, reference planes and constraints are missing).
+    """
+    if len(line_segments) > MAX_REQUEST - FIRST_REQUEST:
+        raise ValueError("At most {} line segments fit into a .slvs file".format(MAX_REQUEST - FIRST_REQUEST))
+
+    requests = range(FIRST_REQUEST, FIRST_REQUEST + len(line_segments))
+    with open(file_name, "wb") as file:
+        file.write(MAGIC)
+        for request in requests:
+            file.write("Request.h.v={:08x}\nRequest.type=200\nRequest.workplane.v={}\n"
+                       "Request.group.v=00000002\nRequest.construction=0\nAddRequest\n\n"
+                       .format(request, WORKPLANE).encode("ascii"))
+        for request, segment in zip(requests, line_segments):
+            # params 16 + 3 * i hold u and v of the request's i-th point
+            for index, point in enumerate(segment):
+                for offset, value in enumerate(point[:2]):
+                    file.write("Param.h.v.={:08x}\nParam.val={:.20f}\nAddParam\n\n".format(
+                        (request << 16) | (16 + 3 * index + offset), value).encode("ascii"))
+        for request in requests:
+            file.write("Entity.h.v={0:04x}0000\nEntity.type=11000\nEntity.construction=0\n"
+                       "Entity.point[0].v={0:04x}0001\nEntity.point[1].v={0:04x}0002\n"
+                       "Entity.workplane.v={1}\nEntity.actVisible=1\nAddEntity\n\n".format(request, WORKPLANE)
+                       .encode("ascii"))
+            for point in (1, 2):
+                file.write("Entity.h.v={:04x}{:04x}\nEntity.type=2001\nEntity.construction=0\n"
+                           "Entity.workplane.v={}\nEntity.actVisible=1\nAddEntity\n\n"
+                           .format(request, point, WORKPLANE).encode("ascii"))
@@ -0,0 +1,59 @@
+"""The svg output of earlier versions, kept as baseline for the streaming svg writer (see run_benchmarks.py).
+
+The document is built by string concatenation and re-parsed with minidom for styling. Don't use it for output,
+export.write_layout writes the same styled svg in a single pass.
+"""
+
+import io
+from xml.dom import minidom
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from linkage_graph.linkage_link import ConfigurationSpace
+from svg_writer import Bounds
+
+
+def create_svg(linkage_configuration: LinkageConfiguration, space: ConfigurationSpace) -> str:
+    """Builds the svg document by string concatenation (quadratic in the number of links). """
+    svg_string = ""
+    bounds = Bounds()
+    label_positions = linkage_configuration.label_positions(space)
+    for link, positions in zip(linkage_configuration.links, label_positions):
+        polygon = link.as_polygon(space)
+        bounds.add(polygon.bounds)
+
+        svg_string += polygon.svg()
+        svg_string += "\n"
+        hub_a_label = '<text x="{}" y="{}" > {} </text>'.format(
+            float(positions[0][0]), float(positions[0][1]), link.hub_a.get_id())
+        svg_string += hub_a_label
+        svg_string += "\n"
+        hub_b_label = '<text x="{}" y="{}" > {} </text>'.format(
+            float(positions[1][0]), float(positions[1][1]), link.hub_b.get_id())
+        svg_string += hub_b_label
+        svg_string += "\n"
+
+    bounds = bounds.as_tuple()
+    width = bounds[2] - bounds[0]
+    height = bounds[3] - bounds[1]
+    svg_string = '<svg width="{}mm" height="{}mm" viewBox="{} {} {} {}" > \n <g transform = "scale(1,1)">'.format(
+        width, height, bounds[0], bounds[1], width, height) + svg_string
+    svg_string += '</g>'
+    svg_string += "</svg>"
+    return svg_string
+
+
+def style_svg(svg: str) -> minidom.Document:
+    """Re-parses the document to style its paths and labels. """
+    svg = minidom.parse(io.StringIO(svg))
+    paths = svg.getElementsByTagName("path")
+    for path in paths:
+        path.setAttribute("fill", "none")
+        path.setAttribute("stroke", "#FF0000")
+        path.setAttribute("stroke-width", "0.2")
+        path.setAttribute("opacity", "1.0")
+
+    labels = svg.getElementsByTagName("text")
+    for label in labels:
+        label.setAttribute("font-size", "5")
+        label.setAttribute("fill", "#0000FF")
+    return svg
@@ -0,0 +1,210 @@
+"""Times every stage of the conversion pipeline on synthetic linkages of increasing size.
+
+Usage (from the repository root):
+    python3 benchmarks/run_benchmarks.py --sizes 100 1000 5000 --output benchmark.json
+    python3 benchmarks/run_benchmarks.py --compare benchmark.json
+
+Every stage is timed on its own with the inputs it depends on prepared (untimed) beforehand,
+memoized link geometry is dropped between repetitions. The json output contains the timings of
+every run and scaling exponents (slope of log(time) over log(size)) per generator and stage.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import numpy as np
+import shapely
+
+from generators import GENERATORS, write_slvs
+from legacy_svg import create_svg, style_svg
+from parse import read_line_segments
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from linkage_graph.linkage_link import ConfigurationSpace
+from export import layout_links, write_layout
+from labels import place_labels
+
+STAGES = ("parse", "from_line_segments", "create_geometry", "create_geometry_shapely", "primitive_transform",
+          "primitive_transforms_batched", "layout_links", "create_svg", "style_svg", "write_svg", "write_svg_shapely",
+          "write_svg_symbols", "write_dxf", "write_gcode", "place_labels")
+
+
+def benchmark(generator: str, size: int, repeat: int, sheet: tuple) -> dict:
+    line_segments = GENERATORS[generator](size)
+    timings = {stage: [] for stage in STAGES}
+
+    with tempfile.TemporaryDirectory() as directory:
+        slvs_file = os.path.join(directory, "linkage.slvs")
+        write_slvs(line_segments, slvs_file)
+
+        for _ in range(repeat):
+            segments = timed(timings["parse"], read_line_segments, slvs_file)
+            configuration = timed(timings["from_line_segments"], LinkageConfiguration.from_line_segments, segments)
+            links = configuration.links
+
+            timed(timings["create_geometry"], lambda: [link._create_geometry() for link in links])
+            timed(timings["create_geometry_shapely"],
+                  lambda: [link._create_geometry(kernel="shapely") for link in links])
+
+            for link in links:
+                link._get_geometry()
+            timed(timings["primitive_transform"], lambda: [link._create_primitive_transform() for link in links])
+            timed(timings["primitive_transforms_batched"], configuration.primitive_transforms)
+
+            for link in links:
+                link.as_polygon(ConfigurationSpace.primitive)
+            timed(timings["layout_links"], layout_links, links, sheet)
+
+            # the svg stages measure serialization, not polygon construction
+            for link in links:
+                link.as_polygon(ConfigurationSpace.fabrication)
+            svg = timed(timings["create_svg"], create_svg, configuration, ConfigurationSpace.fabrication)
+            timed(timings["style_svg"], style_svg, svg)
+            timed(timings["write_svg"], write_layout, configuration, ConfigurationSpace.fabrication, io.StringIO())
+            for link in links:
+                link.as_polygon(ConfigurationSpace.fabrication, kernel="shapely")
+            timed(timings["write_svg_shapely"], lambda: write_layout(configuration, ConfigurationSpace.fabrication,
+                                                                     io.StringIO(), geometry="shapely"))
+            timed(timings["write_svg_symbols"], lambda: write_layout(configuration, ConfigurationSpace.fabrication,
+                                                                     io.StringIO(), symbols=True))
+            for output_format in ("dxf", "gcode"):
+                timed(timings["write_" + output_format], lambda: write_layout(
+                    configuration, ConfigurationSpace.fabrication, io.StringIO(), output_format=output_format))
+            timed(timings["place_labels"], place_labels, configuration)
+
+            for link in links:
+                link.clear_cache()
+
+    return {
+        "generator": generator,
+        "size": size,
+        "hubs": len(configuration.hubs),
+        "links": len(links),
+        "stages": {stage: summarize(runs) for stage, runs in timings.items()},
+    }
+
+
+def timed(runs: list, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    runs.append(time.perf_counter() - start)
+    return result
+
+
+def summarize(runs: list) -> dict:
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def scaling(results: list) -> dict:
+    """Least squares slope of log(median time) over log(link count) per generator and stage,
+    1 means linear scaling, 2 quadratic. """
+    exponents = {}
+    for generator in sorted({result["generator"] for result in results}):
+        points = [result for result in results if result["generator"] == generator]
+        if len(points) < 2:
+            continue
+        sizes = np.log([result["links"] for result in points])
+        exponents[generator] = {}
+        for stage in STAGES:
+            times = np.log([max(result["stages"][stage]["median"], 1e-9) for result in points])
+            exponents[generator][stage] = float(np.polyfit(sizes, times, 1)[0])
+    return exponents
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "shapely": shapely.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def baseline_medians(baseline: dict) -> dict:
+    medians = {}
+    for result in baseline["results"]:
+        for stage, timing in result["stages"].items():
+            medians[(result["generator"], result["size"], stage)] = timing["median"]
+    return medians
+
+
+def print_header(compare: bool):
+    print("{:<12} {:>6} {:>6} {:<29} {:>10}{}".format(
+        "generator", "size", "links", "stage", "median", "   vs. baseline" if compare else ""))
+
+
+def print_results(results: list, medians: dict):
+    for result in results:
+        for stage in STAGES:
+            median = result["stages"][stage]["median"]
+            line = "{:<12} {:>6} {:>6} {:<29} {:>9.4f}s".format(
+                result["generator"], result["size"], result["links"], stage, median)
+            reference = medians.get((result["generator"], result["size"], stage))
+            if reference:
+                line += "   {:>6.2f}x".format(median / reference)
+            print(line)
+
+
+def print_scaling(exponents: dict):
+    for generator, stages in exponents.items():
+        print("scaling {}: {}".format(generator, ", ".join(
+            "{} {:.2f}".format(stage, exponent) for stage, exponent in stages.items())))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='LinkageFab: Benchmark the conversion pipeline on synthetic linkages')
+    parser.add_argument('--generators', type=str, nargs='+', default=sorted(GENERATORS), choices=sorted(GENERATORS),
+                        help='Synthetic linkage generators to benchmark.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000],
+                        help='Approximate hub counts of the generated linkages.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per generator and size.')
+    parser.add_argument('--sheet', type=str, default='1000x1000',
+                        help='Sheet size in mm as WIDTHxHEIGHT used for nesting.')
+    parser.add_argument('--output', type=str, default=None,
+                        help='File the json results are written to.')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Json results of an earlier run, medians are printed relative to it.')
+    args = parser.parse_args(argv)
+
+    sheet = tuple(float(size) for size in args.sheet.lower().split('x'))
+    medians = {}
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            medians = baseline_medians(json.load(baseline_file))
+
+    print_header(args.compare is not None)
+    results = []
+    for generator in args.generators:
+        for size in sorted(args.sizes):
+            results.append(benchmark(generator, size, args.repeat, sheet))
+            print_results(results[-1:], medians)
+
+    exponents = scaling(results)
+    print_scaling(exponents)
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump({"environment": environment(), "repeat": args.repeat, "sheet": sheet,
+                       "results": results, "scaling": exponents}, output_file, indent=2)
+        print("results written to {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
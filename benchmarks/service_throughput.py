@@ -0,0 +1,131 @@
+"""Measures the throughput of the in-memory rendering API (service.render) under concurrent load.
+
+Usage (from the repository root):
+    python3 benchmarks/service_throughput.py --requests 200 --threads 1 4 8
+    python3 benchmarks/service_throughput.py --http --requests 200 --threads 1 4 8
+
+Renders the given inputs (default: all samples plus a synthetic grid) from a thread pool, or through the local
+http front end with --http, and checks every result against a sequential reference rendering.
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from generators import parallelogram_grid, write_slvs
+from service import render, create_server
+
+SAMPLE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "sample")
+
+
+def load_inputs(files: list, grid_hubs: int) -> dict:
+    inputs = {}
+    for file_name in files or sorted(glob.glob(os.path.join(SAMPLE_DIRECTORY, "*.slvs"))):
+        with open(file_name, "rb") as input_file:
+            inputs[os.path.basename(file_name)] = input_file.read()
+    if grid_hubs > 0:
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "grid.slvs")
+            write_slvs(parallelogram_grid(grid_hubs), file_name)
+            with open(file_name, "rb") as input_file:
+                inputs["grid{}.slvs".format(grid_hubs)] = input_file.read()
+    return inputs
+
+
+def render_direct(data: bytes) -> bytes:
+    result = render(data)
+    return b"".join(result.fabrication) + result.assembly
+
+
+def render_http(url: str):
+    def request(data: bytes) -> bytes:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, method="POST")) as response:
+            result = json.loads(response.read())
+        return ("".join(result["fabrication"]) + result["assembly"]).encode("utf-8")
+    return request
+
+
+def run(render_function, jobs: list, threads: int, references: dict) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def job(name):
+        start = time.perf_counter()
+        output = render_function(jobs_by_name[name])
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+        return output == references[name]
+
+    jobs_by_name = dict(jobs)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        matches = list(executor.map(job, [name for name, _ in jobs]))
+    seconds = time.perf_counter() - start
+    return {
+        "threads": threads,
+        "requests": len(jobs),
+        "seconds": seconds,
+        "requests_per_second": len(jobs) / seconds,
+        "median_latency": statistics.median(latencies),
+        "max_latency": max(latencies),
+        "mismatches": matches.count(False),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='LinkageFab: Throughput of the rendering service under concurrent load')
+    parser.add_argument('inputs', type=str, nargs='*',
+                        help='Input .slvs files (default: all samples).')
+    parser.add_argument('--grid', type=int, default=200,
+                        help='Hub count of an additional synthetic grid input, 0 to disable.')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='Number of renders per run, cycling through the inputs.')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Thread pool sizes to measure.')
+    parser.add_argument('--http', action='store_true',
+                        help='Send the requests to a local http front end instead of calling render directly.')
+    parser.add_argument('--output', type=str, default=None,
+                        help='File the json results are written to.')
+    args = parser.parse_args(argv)
+
+    inputs = load_inputs(args.inputs, args.grid)
+    names = sorted(inputs)
+    jobs = [(names[index % len(names)], inputs[names[index % len(names)]]) for index in range(args.requests)]
+    references = {name: render_direct(data) for name, data in inputs.items()}
+
+    server = None
+    render_function = render_direct
+    if args.http:
+        server = create_server(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        render_function = render_http("http://{}:{}/render".format(*server.server_address[:2]))
+
+    results = []
+    try:
+        for threads in args.threads:
+            results.append(run(render_function, jobs, threads, references))
+            print("{threads:>3} threads: {requests_per_second:8.1f} requests/s, median latency {median_latency:.3f}s, "
+                  "max latency {max_latency:.3f}s, {mismatches} mismatching outputs".format(**results[-1]))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump({"inputs": names, "http": args.http, "results": results}, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
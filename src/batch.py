@@ -0,0 +1,141 @@
+"""Batch conversion of many linkage files in parallel worker processes."""
+
+import glob
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+from conversion import convert_file as convert_single_file
+from cache import LinkageCache
+import util.profiling as profiling
+
+SUPPORTED_EXTENSIONS = (".slvs",)
+
+
+def collect_input_files(inputs: List[str]) -> List[str]:
+    """Expands directories (searched recursively) and glob patterns into a sorted list of supported input files. """
+    files = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            candidates = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        files.update(candidate for candidate in candidates
+                     if os.path.isfile(candidate) and candidate.lower().endswith(SUPPORTED_EXTENSIONS))
+    return sorted(files)
+
+
+def output_file_names(input_files: List[str], output_directory: str, extension: str = ".svg") -> List[str]:
+    """Derives an output file name in output_directory for every input file, keeping names unique. """
+    names = []
+    used = set()
+    for input_file in input_files:
+        stem = os.path.splitext(os.path.basename(input_file))[0]
+        name = stem
+        counter = 2
+        while name in used:
+            name = "{}_{}".format(stem, counter)
+            counter += 1
+        used.add(name)
+        names.append(os.path.join(output_directory, name + extension))
+    return names
+
+
+def summary_entry(input_file: str, output_file: str, profile: bool = False) -> dict:
+    """Summary entry of a file before its conversion. All entries have the same keys, values of
+    stages that didn't run (parsing or rendering served from the cache, failures) stay None. """
+    entry = {"input": input_file, "output": output_file, "status": "ok", "error": None, "traceback": None,
+             "links": None, "sheets": None, "cached": None, "parse_seconds": None, "render_seconds": None,
+             "seconds": None}
+    if profile:
+        entry["profile"] = None
+    return entry
+
+
+def convert_file(input_file: str, output_file: str, render_options: dict, cache=None, parse_options=None,
+                 profile: bool = False) -> dict:
+    """Converts a single file, never raises. Returns a summary entry with status, the time spent in total
+    and per stage (and the recorded profile, if enabled). """
+    result = summary_entry(input_file, output_file, profile)
+    if profile:
+        profiling.enable()
+    timings = {}
+    start = time.perf_counter()
+    try:
+        conversion = convert_single_file(input_file, output_file, render_options, cache, parse_options, timings)
+        result["links"] = conversion["links"]
+        result["sheets"] = conversion["sheets"]
+        result["cached"] = conversion["cached"]
+    except Exception as error:
+        result["status"] = "failed"
+        result["error"] = "{}: {}".format(type(error).__name__, error)
+        result["traceback"] = traceback.format_exc()
+    finally:
+        if cache is not None:
+            cache.flush_stats()
+    result["parse_seconds"] = timings.get("parse")
+    result["render_seconds"] = timings.get("render")
+    result["seconds"] = time.perf_counter() - start
+    if profile:
+        result["profile"] = profiling.disable().as_dict()
+    return result
+
+
+def run_batch(inputs: List[str], output_directory: str, render_options: dict = None, workers: int = None,
+              summary_file: str = None, cache: LinkageCache = None, parse_options: dict = None,
+              profile: bool = False) -> List[dict]:
+    """Converts all files matched by inputs (directories or glob patterns) using a pool of worker processes.
+
+    Failures of single files are recorded and don't abort the run. A json summary with per file
+    timings is written to summary_file (default: batch_summary.json within output_directory).
+    Unchanged inputs are served from cache, if given. With profile set, every worker records
+    a profile (see util.profiling) into its file's result.
+    """
+    render_options = {} if render_options is None else render_options
+    input_files = collect_input_files(inputs)
+    output_files = output_file_names(input_files, output_directory)
+    os.makedirs(output_directory, exist_ok=True)
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_file, input_file, output_file, render_options, cache, parse_options,
+                                   profile):
+                   (input_file, output_file)
+                   for input_file, output_file in zip(input_files, output_files)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                # the worker process itself died
+                result = summary_entry(*futures[future], profile)
+                result["status"] = "failed"
+                result["error"] = "{}: {}".format(type(error).__name__, error)
+            results.append(result)
+            print("{:<7} {:>8} {}{}{}".format(
+                result["status"], format_seconds(result["seconds"]), result["input"],
+                " (cached)" if result.get("cached") else "",
+                "" if result["error"] is None else " ({})".format(result["error"])))
+
+    results.sort(key=lambda result: result["input"])
+    summary = {
+        "files": len(results),
+        "succeeded": sum(result["status"] == "ok" for result in results),
+        "failed": sum(result["status"] != "ok" for result in results),
+        "seconds": time.perf_counter() - start,
+        "results": results,
+    }
+    summary_file = os.path.join(output_directory, "batch_summary.json") if summary_file is None else summary_file
+    with open(summary_file, "w") as file:
+        json.dump(summary, file, indent=2)
+
+    print("{} of {} files converted in {}, summary written to {}".format(
+        summary["succeeded"], summary["files"], format_seconds(summary["seconds"]), summary_file))
+    return results
+
+
+def format_seconds(seconds) -> str:
+    return "-" if seconds is None else "{:.2f}s".format(seconds)
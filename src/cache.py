@@ -0,0 +1,225 @@
+"""Content addressed on-disk cache for parsed linkage graphs and rendered output files.
+
+Entries are keyed by a hash of the input file bytes and the parameters that influence the result.
+Every entry is a directory within the cache directory, its modification time tracks the last access,
+which drives the least recently used eviction once the cache grows beyond its size limit.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+import util.profiling as profiling
+
+# bump whenever parsing or rendering changes its output, invalidates all existing entries
+CACHE_VERSION = 5
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+GRAPH_FILE = "graph.json"
+META_FILE = "meta.json"
+# hit and miss counts accumulated over all runs, concurrent processes update it under STATS_LOCK_FILE
+STATS_FILE = "stats.json"
+STATS_LOCK_FILE = ".stats.lock"
+# per process statistics written by earlier versions, merged into STATS_FILE on the next flush
+LEGACY_STATS_PREFIX = "stats-"
+
+
+def default_cache_directory() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "linkage_fab")
+
+
+class LinkageCache:
+    """On-disk cache with size bounded LRU eviction. Safe to share between processes, entries are
+    written to a temporary directory first and moved into place atomically."""
+
+    def __init__(self, directory: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = default_cache_directory() if directory is None else directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(input_bytes: bytes, parameters: dict = None) -> str:
+        """Hash of the input file content and the (json serializable) parameters. """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"version": CACHE_VERSION, "parameters": parameters},
+                                 sort_keys=True, default=str).encode("utf-8"))
+        digest.update(input_bytes)
+        return digest.hexdigest()
+
+    @profiling.timed("cache.get_configuration")
+    def get_configuration(self, key: str) -> LinkageConfiguration:
+        """Returns the cached linkage configuration for key or None. """
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        with open(os.path.join(entry, GRAPH_FILE)) as graph_file:
+            return LinkageConfiguration.from_dict(json.load(graph_file))
+
+    @profiling.timed("cache.put_configuration")
+    def put_configuration(self, key: str, linkage_configuration: LinkageConfiguration):
+        self._store(key, {GRAPH_FILE: json.dumps(linkage_configuration.to_dict()).encode("utf-8")})
+
+    @profiling.timed("cache.get_outputs")
+    def get_outputs(self, key: str, base_name: str):
+        """Restores cached output files next to base_name (file names are stored relative to it).
+        Returns the entry's meta data with the restored 'files' or None on a miss.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        with open(os.path.join(entry, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+
+        files = []
+        for index, suffix in enumerate(meta["suffixes"]):
+            files.append(base_name + suffix)
+            shutil.copyfile(os.path.join(entry, "output{}".format(index)), files[-1])
+        meta["files"] = files
+        return meta
+
+    @profiling.timed("cache.put_outputs")
+    def put_outputs(self, key: str, base_name: str, files: list, meta: dict = None):
+        """Stores output files (named base_name + suffix) along with json compatible meta data. """
+        meta = dict(meta or {})
+        meta["suffixes"] = [file_name[len(base_name):] for file_name in files]
+        contents = {META_FILE: json.dumps(meta).encode("utf-8")}
+        for index, file_name in enumerate(files):
+            with open(file_name, "rb") as output_file:
+                contents["output{}".format(index)] = output_file.read()
+        self._store(key, contents)
+
+    def stats(self) -> dict:
+        """Size and hit statistics, hits and misses are accumulated over all runs using this cache directory. """
+        entries = self._entries()
+        persisted = self._read_stats_file(os.path.join(self.directory, STATS_FILE))
+        return {
+            "directory": self.directory,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": persisted.get("hits", 0) + self.hits,
+            "misses": persisted.get("misses", 0) + self.misses,
+        }
+
+    def flush_stats(self):
+        """Adds this instance's hit and miss counts to the persisted statistics. """
+        file_name = os.path.join(self.directory, STATS_FILE)
+        with self._stats_lock():
+            persisted = self._read_stats_file(file_name)
+            legacy_files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                            if name.startswith(LEGACY_STATS_PREFIX) and name.endswith(".json")]
+            for counts in [{"hits": self.hits, "misses": self.misses}] + \
+                    [self._read_stats_file(legacy_file) for legacy_file in legacy_files]:
+                for count in ("hits", "misses"):
+                    persisted[count] = persisted.get(count, 0) + counts.get(count, 0)
+            self._write_atomically(file_name, json.dumps(persisted).encode("utf-8"))
+            for legacy_file in legacy_files:
+                os.remove(legacy_file)
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        for entry, _, _ in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits into max_bytes. """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for entry, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def _lookup(self, key: str):
+        entry = os.path.join(self.directory, key)
+        if not os.path.isdir(entry):
+            self.misses += 1
+            profiling.count("cache misses")
+            return None
+        self.hits += 1
+        profiling.count("cache hits")
+        # mark as recently used
+        os.utime(entry)
+        return entry
+
+    def _store(self, key: str, contents: dict):
+        temporary = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        for name, data in contents.items():
+            with open(os.path.join(temporary, name), "wb") as entry_file:
+                entry_file.write(data)
+        try:
+            os.rename(temporary, os.path.join(self.directory, key))
+        except OSError:
+            # stored concurrently by another process
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.evict()
+
+    def _entries(self):
+        """Returns (path, size in bytes, last access) of all entries. """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, file_name)) for file_name in os.listdir(path))
+                entries.append((path, size, os.path.getmtime(path)))
+            except OSError:
+                # evicted concurrently
+                continue
+        return entries
+
+    @contextlib.contextmanager
+    def _stats_lock(self):
+        """Exclusive lock (across processes) on the persisted statistics. """
+        with open(os.path.join(self.directory, STATS_LOCK_FILE), "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _read_stats_file(file_name: str) -> dict:
+        try:
+            with open(file_name) as stats_file:
+                return json.load(stats_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_atomically(self, file_name: str, data: bytes):
+        descriptor, temporary = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        with os.fdopen(descriptor, "wb") as temporary_file:
+            temporary_file.write(data)
+        os.replace(temporary, file_name)
+
+
+def format_stats(stats: dict) -> str:
+    lookups = stats["hits"] + stats["misses"]
+    return "cache {}: {} entries, {:.1f} of {:.1f} MB used, {} hits / {} misses ({:.0%} hit rate)".format(
+        stats["directory"], stats["entries"], stats["bytes"] / 2 ** 20, stats["max_bytes"] / 2 ** 20,
+        stats["hits"], stats["misses"], stats["hits"] / lookups if lookups else 0.0)
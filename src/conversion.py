@@ -0,0 +1,77 @@
+"""Conversion of a single input file into fabrication output, optionally served from a LinkageCache."""
+
+import os
+import time
+
+from parse import parse_solvespace_file
+from export import render_fabrication_layout
+from cache import LinkageCache
+
+
+def convert_file(input_file: str, output_file: str = None, render_options: dict = None,
+                 cache: LinkageCache = None, parse_options: dict = None, timings: dict = None) -> dict:
+    """Parses input_file (see parse_solvespace_file for parse_options) and renders it to output_file
+    (see render_fabrication_layout for render_options).
+
+    Returns the number of links and sheets, the printable render report, the written files
+    and whether the result was served from the cache. The seconds spent on the stages that ran
+    ('parse', 'render') are added to timings as they complete, stages served from the cache are left out.
+    """
+    render_options = {} if render_options is None else render_options
+    parse_options = {} if parse_options is None else parse_options
+    output_file = "linkage.svg" if output_file is None else output_file
+    timings = {} if timings is None else timings
+
+    # verbose output and cross checks are about the parse itself, they never come from the cache
+    if cache is None or parse_options.get("verbose") or parse_options.get("cross_check"):
+        linkage_configuration = _timed(timings, "parse", parse_solvespace_file, input_file, **parse_options)
+        report = _timed(timings, "render", render_fabrication_layout, linkage_configuration, output_file,
+                        **render_options)
+        return _result(linkage_configuration, report, cached=False)
+
+    with open(input_file, "rb") as file:
+        input_bytes = file.read()
+    base_name, extension = os.path.splitext(output_file)
+
+    reader = parse_options.get("reader", "native")
+    # the number of worker processes doesn't change the output
+    key_parameters = {"stage": "render", "extension": extension.lower(), "reader": reader,
+                      **{name: value for name, value in render_options.items() if name != "workers"}}
+    if render_options.get("manual_tiles") is not None:
+        # the overview page of a tiled manual links to its pages by file name
+        key_parameters["base_name"] = os.path.basename(base_name)
+    output_key = cache.key(input_bytes, key_parameters)
+    result = cache.get_outputs(output_key, base_name)
+    if result is not None:
+        result["cached"] = True
+        return result
+
+    graph_key = cache.key(input_bytes, {"stage": "parse", "reader": reader})
+    linkage_configuration = cache.get_configuration(graph_key)
+    if linkage_configuration is None:
+        linkage_configuration = _timed(timings, "parse", parse_solvespace_file, input_file, **parse_options)
+        cache.put_configuration(graph_key, linkage_configuration)
+
+    report = _timed(timings, "render", render_fabrication_layout, linkage_configuration, output_file,
+                    **render_options)
+    result = _result(linkage_configuration, report, cached=False)
+    cache.put_outputs(output_key, base_name, report.files,
+                      meta={key: result[key] for key in ("links", "sheets", "report")})
+    return result
+
+
+def _timed(timings: dict, stage: str, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+def _result(linkage_configuration, report, cached: bool) -> dict:
+    return {
+        "links": len(linkage_configuration.links),
+        "sheets": report.nesting.sheet_count,
+        "report": str(report),
+        "files": report.files,
+        "cached": cached,
+    }
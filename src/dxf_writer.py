@@ -0,0 +1,146 @@
+"""Streaming DXF (R12, ASCII) output with the same element interface as svg_writer.SvgWriter.
+
+Link outlines and hub holes become LINE, ARC and CIRCLE entities, other geometry POLYLINEs. Cut geometry goes
+onto the red CUT layer, labels onto the blue ENGRAVE layer (matching the svg styling). DXF's y axis points up,
+so the layout is mirrored within its bounds to look like the svg.
+"""
+
+import math
+
+import util.geometry as utils
+from util.formatting import format_number
+import util.profiling as profiling
+
+CUT_LAYER = "CUT"
+ENGRAVE_LAYER = "ENGRAVE"
+# ACI colours of the layers: red and blue
+LAYER_COLOURS = {CUT_LAYER: 1, ENGRAVE_LAYER: 5}
+# cap height of labels in mm, about the cap height of the svg's 5 unit font
+TEXT_HEIGHT = 3.5
+# coordinates are written with up to this many decimals (sub micrometre) by default
+DECIMALS = 6
+
+
+class DxfWriter:
+    """Writes a DXF document entity by entity to a text stream.
+
+    The bounding box (in svg coordinates) has to be known upfront, it goes into the header and defines the mirror axis.
+    Use as context manager or call close() to finish the document.
+    With document=False only the entities are written, without the sections around them (fragments, see watch.py).
+    Coordinates are rounded to decimals (default: DECIMALS).
+    """
+
+    def __init__(self, stream, bounds: tuple, document: bool = True, decimals: int = None):
+        self.stream = stream
+        self.closed = not document
+        self.mirror = bounds[1] + bounds[3]
+        self.decimals = DECIMALS if decimals is None else decimals
+        # coordinate pairs of cut geometry written and bytes saved by rounding to fewer than DECIMALS
+        self.vertices = 0
+        self.saved_bytes = 0
+        if not document:
+            return
+
+        self._group(0, "SECTION", 2, "HEADER",
+                    9, "$ACADVER", 1, "AC1009",
+                    9, "$INSUNITS", 70, 4,
+                    9, "$EXTMIN", 10, self._number(bounds[0]), 20, self._number(bounds[1]),
+                    9, "$EXTMAX", 10, self._number(bounds[2]), 20, self._number(bounds[3]),
+                    0, "ENDSEC")
+        self._group(0, "SECTION", 2, "TABLES", 0, "TABLE", 2, "LAYER", 70, len(LAYER_COLOURS))
+        for layer, colour in LAYER_COLOURS.items():
+            self._group(0, "LAYER", 2, layer, 70, 0, 62, colour, 6, "CONTINUOUS")
+        self._group(0, "ENDTAB", 0, "ENDSEC", 0, "SECTION", 2, "ENTITIES")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def path(self, geometry):
+        """Writes the rings of a (multi) polygon as closed polylines. """
+        if geometry.is_empty:
+            return
+
+        polygons = geometry.geoms if hasattr(geometry, "geoms") else [geometry]
+        for polygon in polygons:
+            for ring in [polygon.exterior] + list(polygon.interiors):
+                self.polyline(ring.coords, closed=True)
+
+    def rings(self, rings):
+        """Writes closed rings (point arrays, first point repeated at the end) as closed polylines. """
+        for ring in rings:
+            self.polyline(ring, closed=True)
+
+    def link_arcs(self, tangents, hubs, linkage_radius: float, joint_radius: float):
+        """Writes a link outline as two lines and two arcs plus a circle around both hubs, from the tangent
+        end points (4, 2) (see util.link_geometry.tangent_points) and the hub positions (2, 2). """
+        a_left, b_left, b_right, a_right = (self._point(point) for point in tangents.tolist())
+        a, b = (self._point(point) for point in hubs.tolist())
+        self._line(a_left, b_left)
+        self._arc(b, linkage_radius, b_left, b_right, utils.point_beyond(b, a, linkage_radius))
+        self._line(b_right, a_right)
+        self._arc(a, linkage_radius, a_right, a_left, utils.point_beyond(a, b, linkage_radius))
+        for center in (a, b):
+            self._group(0, "CIRCLE", 8, CUT_LAYER, 10, self._number(center[0]), 20, self._number(center[1]),
+                        40, self._number(joint_radius))
+        profiling.count("dxf entities", 6)
+        self.vertices += 6
+
+    def polyline(self, coords, closed: bool = True):
+        """Writes a single (open or closed) polyline, closed ones repeat their first point at the end. """
+        points = [self._point(coord) for coord in (coords.tolist() if hasattr(coords, "tolist") else coords)]
+        if closed and len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        self._group(0, "POLYLINE", 8, CUT_LAYER, 66, 1, 70, 1 if closed else 0)
+        for x, y in points:
+            self._group(0, "VERTEX", 8, CUT_LAYER, 10, self._number(x), 20, self._number(y))
+        self._group(0, "SEQEND", 8, CUT_LAYER)
+        profiling.count("dxf entities")
+        profiling.count("dxf vertices", len(points))
+        self.vertices += len(points)
+
+    def text(self, x: float, y: float, label: str):
+        """Writes a label with its baseline starting at (x, y). """
+        x, y = self._point((float(x), float(y)))
+        self._group(0, "TEXT", 8, ENGRAVE_LAYER, 10, self._number(x), 20, self._number(y), 40, self._number(TEXT_HEIGHT),
+                    1, label.strip())
+        profiling.count("dxf entities")
+
+    def close(self):
+        if self.closed:
+            return
+        self._group(0, "ENDSEC", 0, "EOF")
+        self.closed = True
+
+    def _number(self, value: float) -> str:
+        text = format_number(value, self.decimals)
+        if self.decimals != DECIMALS:
+            self.saved_bytes += len(format_number(value, DECIMALS)) - len(text)
+        return text
+
+    def _point(self, point) -> tuple:
+        return (point[0], self.mirror - point[1])
+
+    def _line(self, start, end):
+        self._group(0, "LINE", 8, CUT_LAYER, 10, self._number(start[0]), 20, self._number(start[1]),
+                    11, self._number(end[0]), 21, self._number(end[1]))
+
+    def _arc(self, center, radius: float, start, end, through):
+        """Writes the arc from start over through to end, DXF arcs run counter clockwise. """
+        start_angle, end_angle = _angle(center, start), _angle(center, end)
+        if not utils.is_counter_clockwise(center, start, through):
+            start_angle, end_angle = end_angle, start_angle
+        self._group(0, "ARC", 8, CUT_LAYER, 10, self._number(center[0]), 20, self._number(center[1]), 40, self._number(radius),
+                    50, self._number(start_angle), 51, self._number(end_angle))
+
+    def _group(self, *pairs):
+        """Writes (group code, value) pairs given as flat argument list. """
+        self.stream.write("".join("{}\n{}\n".format(pairs[index], pairs[index + 1])
+                                  for index in range(0, len(pairs), 2)))
+
+
+def _angle(center, point) -> float:
+    return math.degrees(math.atan2(point[1] - center[1], point[0] - center[0])) % 360.0
+
@@ -1,109 +1,570 @@
-from xml.dom import minidom
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 import io
-from shapely.geometry import Polygon
-from shapely import affinity
+import os
+import numpy as np
+from shapely.geometry import LinearRing
 
-from linkage_graph.linkage_link import ConfigurationSpace
+from linkage_graph.linkage_link import ConfigurationSpace, LinkageLink
+from linkage_graph.linkage_hub import LinkageHub
 from linkage_graph.linkage_configuration import LinkageConfiguration
+from nesting import PACKERS, NestingResult
+from labels import LabelPlacement, place_labels
+import tiles as tiling
+import toolpath
+from toolpath import ToolpathReport
 import util.geometry as utils
-from util.custom_affinity import get_translate_matrix
+import util.link_geometry as link_geometry
+import util.profiling as profiling
+from svg_writer import Bounds, SvgWriter, open_svg_file
+from dxf_writer import DxfWriter
+from gcode_writer import GcodeWriter
 
 
-def render_fabrication_layout(linkage_configuration, output_file_name=None):
-    """Creates a svg representation of the given linkage configuration for fabrication. """
+# suffix of the assembly manual output, fabrication outputs are suffixed _sheet<n> if there are several sheets,
+# pages of a tiled manual _assembly_manual_r<row>c<column>
+ASSEMBLY_SUFFIX = "_assembly_manual"
 
+# the overview page of a tiled manual approximates (and simplifies) link outlines within this distance in mm
+# on paper, the hub holes are left out
+OVERVIEW_TOLERANCE = 0.2
+OVERVIEW_DECIMALS = 1
+# font size of the page names on the overview page, in mm on paper
+OVERVIEW_FONT_SIZE = 8
+
+# writer and file extensions (the first one being the default) of every fabrication output format,
+# the assembly manual is always written as svg
+OUTPUT_FORMATS = {
+    "svg": (SvgWriter, (".svg", ".svgz")),
+    "dxf": (DxfWriter, (".dxf",)),
+    "gcode": (GcodeWriter, (".gcode", ".nc", ".ngc")),
+}
+
+# counter clockwise rotation by 90 degrees around the origin
+QUARTER_TURN = np.array([[0.0, -1.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+
+
+class Precision:
+    """Export-wide geometric precision and output quantization, along with statistics of what was written.
+
+    chord_tolerance is the maximum distance (in mm) between arcs and their chords in polyline and Shapely geometry
+    (default: link_geometry.DEFAULT_CHORD_TOLERANCE, Shapely's buffer resolution for the 'shapely' kernel).
+    decimals rounds all coordinates (default: full precision for svg, see the dxf and G-code writers otherwise).
+    simplify removes polyline vertices which lie within this distance (in mm) of the simplified outline
+    (Douglas-Peucker), exact arcs aren't affected.
+    """
+
+    def __init__(self, chord_tolerance: float = None, decimals: int = None, simplify: float = None):
+        if chord_tolerance is not None and chord_tolerance <= 0:
+            raise ValueError("Chord tolerance must be positive, got {}".format(chord_tolerance))
+        if decimals is not None and decimals < 0:
+            raise ValueError("Decimals must not be negative, got {}".format(decimals))
+        if simplify is not None and simplify < 0:
+            raise ValueError("Simplification tolerance must not be negative, got {}".format(simplify))
+        self.chord_tolerance = chord_tolerance
+        self.decimals = decimals
+        self.simplify = simplify
+
+        # coordinate pairs of cut geometry written, removed by simplification and the output size
+        self.vertices = 0
+        self.removed_vertices = 0
+        self.saved_bytes = 0
+        self.bytes = 0
+
+    def is_default(self) -> bool:
+        return self.chord_tolerance is None and self.decimals is None and not self.simplify
+
+    def simplified_polygon(self, polygon):
+        """The (multi) polygon with vertices within the simplification tolerance removed. """
+        if not self.simplify:
+            return polygon
+        simplified = polygon.simplify(self.simplify, preserve_topology=True)
+        self.removed_vertices += _vertex_count(polygon) - _vertex_count(simplified)
+        return simplified
+
+    def simplified_rings(self, rings) -> list:
+        """Closed rings (point arrays, first point repeated at the end) with vertices within the simplification
+        tolerance removed. """
+        if not self.simplify:
+            return rings
+        simplified = [np.asarray(LinearRing(ring).simplify(self.simplify, preserve_topology=True).coords)
+                      for ring in rings]
+        self.removed_vertices += sum(len(ring) for ring in rings) - sum(len(ring) for ring in simplified)
+        return simplified
+
+    def settings(self) -> tuple:
+        return (self.chord_tolerance, self.decimals, self.simplify)
+
+    def merge(self, other: "Precision"):
+        """Adds the statistics of another output with the same settings, e.g. one rendered by a worker process. """
+        self.vertices += other.vertices
+        self.removed_vertices += other.removed_vertices
+        self.saved_bytes += other.saved_bytes
+        self.bytes += other.bytes
+
+    def add_writer(self, writer):
+        """Adds the statistics of a finished svg, dxf or G-code writer. """
+        self.vertices += writer.vertices
+        self.saved_bytes += writer.saved_bytes
+
+    def __str__(self):
+        text = "{} vertices written".format(self.vertices)
+        if self.simplify:
+            text += ", {} removed by simplification".format(self.removed_vertices)
+        if self.decimals is not None:
+            text += ", {} bytes saved by rounding to {} decimals".format(self.saved_bytes, self.decimals)
+        return text + ", {} bytes in total".format(self.bytes)
+
+
+def _vertex_count(geometry) -> int:
+    polygons = geometry.geoms if hasattr(geometry, "geoms") else [geometry]
+    return sum(len(ring.coords) for polygon in polygons for ring in [polygon.exterior] + list(polygon.interiors))
+
+
+class _CountingStream:
+    """Text stream wrapper counting the characters written. """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def write(self, text: str):
+        self.count += len(text)
+        return self.stream.write(text)
+
+
+class RenderReport:
+    """Statistics collected while rendering a linkage configuration. """
+
+    def __init__(self, nesting: NestingResult, precision: Precision = None):
+        self.nesting = nesting
+        self.precision = Precision() if precision is None else precision
+        # one report per sheet, if toolpath optimization is enabled
+        self.toolpaths = []
+        # output name suffixes in the order the outputs were written, fabrication sheets first
+        self.suffixes = []
+        self.files = []
+        # number of classes of congruent links written as svg symbols (if enabled) and, if they are only used by
+        # the assembly manual, why the fabrication output doesn't use them
+        self.symbol_classes = None
+        self.symbols_skipped = None
+        # hub labels of the assembly manual
+        self.labels = None
+        # page size and number of pages of a tiled assembly manual
+        self.manual_page = None
+        self.manual_tiles = 0
+
+    def __str__(self):
+        lines = [str(self.nesting)]
+        if self.labels is not None:
+            lines.append(str(self.labels))
+        if self.manual_page is not None:
+            lines.append("assembly manual split into {} pages of {}x{}mm".format(self.manual_tiles, *self.manual_page))
+        if self.symbol_classes is not None:
+            lines.append("{} classes of congruent links written as svg symbols".format(self.symbol_classes)
+                         + ("" if self.symbols_skipped is None else
+                            " in the assembly manual only, {} doesn't support them".format(self.symbols_skipped)))
+        if not self.precision.is_default():
+            lines.append(str(self.precision))
+        for sheet_index, toolpath in enumerate(self.toolpaths):
+            lines.append("sheet {}: {}".format(sheet_index + 1, toolpath))
+        return "\n".join(lines)
+
+
+@profiling.timed("export.render_fabrication_layout")
+def render_fabrication_layout(linkage_configuration, output_file_name=None, sheet: tuple = (1000, 1000),
+                              nesting: str = "skyline", allow_rotation: bool = False,
+                              optimize_toolpath: bool = False,
+                              geometry: str = link_geometry.DEFAULT_KERNEL,
+                              output_format: str = "svg", symbols: bool = False, chord_tolerance: float = None,
+                              decimals: int = None, simplify: float = None,
+                              manual_tiles: tuple = None, workers: int = 1) -> RenderReport:
+    """Creates a svg representation of the given linkage configuration for fabrication. 
+    A .svgz output file name produces gzip compressed output. When the links don't fit onto a single
+    sheet (width, height), one fabrication file per sheet is written, numbered by a _sheet<n> suffix.
+    optimize_toolpath removes duplicate cut segments and orders cut paths to reduce laser travel (see toolpath.py).
+    geometry selects the link geometry kernel (see util.link_geometry.KERNELS).
+    output_format writes the fabrication files as 'svg', 'dxf' or 'gcode' instead (see OUTPUT_FORMATS).
+    symbols writes every class of congruent links once as svg symbol, placed by use elements (see write_symbols),
+    in svg output without optimize_toolpath and the assembly manual.
+    chord_tolerance, decimals and simplify set the geometric precision and the rounding of coordinates (see Precision).
+    manual_tiles (width, height) splits the assembly manual into pages of that size plus an overview page
+    (see write_tiled_manual), the pages are rendered by workers processes.
+    """
     output_file_name = "linkage.svg" if output_file_name is None else output_file_name
+    report = render_layout(linkage_configuration,
+                           lambda suffix: open_svg_file(suffixed_file_name(output_file_name, suffix, output_format)),
+                           sheet, nesting, allow_rotation, optimize_toolpath, geometry, output_format, symbols,
+                           chord_tolerance, decimals, simplify, manual_tiles,
+                           lambda suffix: os.path.basename(suffixed_file_name(output_file_name, suffix, output_format)),
+                           workers)
+    report.files = [suffixed_file_name(output_file_name, suffix, output_format) for suffix in report.suffixes]
+    return report
+
+
+def suffixed_file_name(output_file_name: str, suffix: str, output_format: str = "svg") -> str:
+    """Name of the output with the given suffix (see render_layout), with an extension of the output format. """
+    base_name, extension = os.path.splitext(output_file_name)
+    if suffix.startswith(ASSEMBLY_SUFFIX):
+        output_format = "svg"
+    # Make sure we use a suffix of the output format
+    extensions = OUTPUT_FORMATS[output_format][1]
+    return base_name + suffix + (extension if extension.lower() in extensions else extensions[0])
+
+
+def sheet_suffix(sheet_index: int, sheet_count: int) -> str:
+    return "" if sheet_count == 1 else "_sheet{}".format(sheet_index + 1)
+
+
+def render_layout(linkage_configuration, open_output, sheet: tuple = (1000, 1000), nesting: str = "skyline",
+                  allow_rotation: bool = False, optimize_toolpath: bool = False,
+                  geometry: str = link_geometry.DEFAULT_KERNEL, output_format: str = "svg",
+                  symbols: bool = False, chord_tolerance: float = None, decimals: int = None,
+                  simplify: float = None, manual_tiles: tuple = None, file_name=None,
+                  workers: int = 1) -> RenderReport:
+    """Lays out the links on sheets and streams the fabrication files (in output_format) and the assembly svg
+    (see render_fabrication_layout) to the text streams provided by open_output(suffix), a context manager factory.
+    file_name(suffix) names the output files for the links between the pages of a tiled manual, which are
+    rendered by workers processes (serially by default, as render_layout may run within threads or worker processes
+    itself, see service.py and batch.py). """
+    if geometry not in link_geometry.KERNELS:
+        raise ValueError("Unknown geometry kernel '{}', expected one of: {}".format(
+            geometry, ", ".join(link_geometry.KERNELS)))
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format '{}', expected one of: {}".format(
+            output_format, ", ".join(OUTPUT_FORMATS)))
+    precision = Precision(chord_tolerance, decimals, simplify)
+
+    # compute all primitive transforms in one go, links reuse them from here on
+    linkage_configuration.primitive_transforms()
+
+    nesting_result = layout_links(linkage_configuration.links, sheet, nesting=nesting, allow_rotation=allow_rotation,
+                                  geometry=geometry, chord_tolerance=chord_tolerance)
+    report = RenderReport(nesting_result, precision)
+    if symbols:
+        lengths, classes = link_geometry.congruent_classes(linkage_configuration.hub_position_array())
+        report.symbol_classes = int((np.bincount(classes, minlength=len(lengths)) >= 2).sum())
+        if optimize_toolpath:
+            report.symbols_skipped = "toolpath optimized output"
+        elif output_format != "svg":
+            report.symbols_skipped = "{} output".format(output_format)
+
+    for sheet_index in range(nesting_result.sheet_count):
+        report.suffixes.append(sheet_suffix(sheet_index, nesting_result.sheet_count))
+        with open_output(report.suffixes[-1]) as output_file:
+            toolpath_report = write_layout(linkage_configuration, ConfigurationSpace.fabrication, output_file,
+                                           sheet=sheet_index, optimize_toolpath=optimize_toolpath, geometry=geometry,
+                                           output_format=output_format, symbols=symbols, precision=precision)
+        if toolpath_report is not None:
+            report.toolpaths.append(toolpath_report)
+
+    report.labels = place_labels(linkage_configuration)
+    if manual_tiles is not None:
+        write_tiled_manual(linkage_configuration, open_output, report, manual_tiles, geometry, symbols, precision,
+                           file_name, workers)
+        return report
+
+    report.suffixes.append(ASSEMBLY_SUFFIX)
+    with open_output(report.suffixes[-1]) as svg_file:
+        write_layout(linkage_configuration, ConfigurationSpace.assembled, svg_file, geometry=geometry, symbols=symbols,
+                     precision=precision, labels=report.labels)
+
+    return report
+
+
+@profiling.timed("export.write_tiled_manual")
+def write_tiled_manual(linkage_configuration: LinkageConfiguration, open_output, report: RenderReport,
+                       page: tuple = tiling.DEFAULT_PAGE, geometry: str = link_geometry.DEFAULT_KERNEL,
+                       symbols: bool = False, precision: Precision = None, file_name=None, workers: int = 1):
+    """Streams the assembly manual as pages of size (width, height) to open_output(suffix) (see render_layout),
+    each page (suffixed _r<row>c<column>) showing the links and labels (report.labels) within its part of the grid
+    at full detail. With more than one of workers, pages are rendered in parallel by a pool of worker processes.
+
+    The assembly manual itself becomes an overview page, scaled to fit onto a page, showing the whole linkage at
+    reduced detail (coarse simplified outlines without hub holes, no labels) with every page's area linking to
+    its file, named by file_name(suffix).
+    """
+    precision = Precision() if precision is None else precision
+    file_name = (lambda suffix: suffixed_file_name("linkage.svg", suffix)) if file_name is None else file_name
+    labels = place_labels(linkage_configuration) if report.labels is None else report.labels
+    links = linkage_configuration.links
+    hub_positions = linkage_configuration.hub_position_array()
+    bounds = link_bounds(links, ConfigurationSpace.assembled, hub_positions, geometry, precision.chord_tolerance)
+    overview_bounds = total_bounds(np.concatenate((bounds, labels.bounds())))
+    pages = tiling.assign_tiles(tiling.tile_grid(overview_bounds, page), bounds, labels.bounds())
+
+    tasks = [(hub_positions[tile.links], labels.subset(tile.labels), tile.bounds, geometry, symbols,
+              precision.settings()) for tile in pages]
+    if workers <= 1 or len(tasks) < 2:
+        results = [_render_tile(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_render_tile, *zip(*tasks)))
+    for tile, (text, tile_precision) in zip(pages, results):
+        report.suffixes.append(ASSEMBLY_SUFFIX + "_" + tile.name)
+        with open_output(report.suffixes[-1]) as stream:
+            stream.write(text)
+        precision.merge(tile_precision)
+    report.manual_page = tuple(page)
+    report.manual_tiles = len(pages)
+    profiling.count("manual pages", len(pages))
+
+    # the overview fits onto a single page
+    scale = max((overview_bounds[2] - overview_bounds[0]) / page[0],
+                (overview_bounds[3] - overview_bounds[1]) / page[1], 1e-9)
+    size = ((overview_bounds[2] - overview_bounds[0]) / scale, (overview_bounds[3] - overview_bounds[1]) / scale)
+    overview = Precision(OVERVIEW_TOLERANCE * scale, OVERVIEW_DECIMALS, OVERVIEW_TOLERANCE * scale)
+    report.suffixes.append(ASSEMBLY_SUFFIX)
+    with open_output(report.suffixes[-1]) as stream:
+        with SvgWriter(stream, overview_bounds, decimals=overview.decimals, size=size) as writer:
+            # a single path element, the outlines aren't filled
+            writer.rings(overview.simplified_rings(link_outlines(links, hub_positions, overview.chord_tolerance)))
+            for tile in pages:
+                writer.link_area(file_name(ASSEMBLY_SUFFIX + "_" + tile.name), tile.bounds, tile.name,
+                                 OVERVIEW_FONT_SIZE * scale)
+
+
+def link_outlines(links: List[LinkageLink], hub_positions: np.ndarray, chord_tolerance: float) -> list:
+    """Closed outline rings of the links in assembled space, without hub holes, given their hubs (N, 2, 2). """
+    outlines, _ = link_geometry.link_rings(hub_positions, link_geometry.LINKAGE_RADIUS, link_geometry.JOINT_RADIUS,
+                                           chord_tolerance)
+    analytic = link_geometry.is_simple(hub_positions, link_geometry.LINKAGE_RADIUS, link_geometry.JOINT_RADIUS)
+    return [outline if analytic[index] else
+            np.asarray(link.as_polygon(kernel="shapely", chord_tolerance=chord_tolerance).exterior.coords)
+            for index, (link, outline) in enumerate(zip(links, outlines))]
+
+
+def _render_tile(hub_positions: np.ndarray, labels: LabelPlacement, bounds: tuple, geometry: str, symbols: bool,
+                 precision_settings: tuple) -> (str, Precision):
+    """Renders a page of the tiled manual from the hubs of its links (N, 2, 2) and its labels, in a worker process.
+    Returns the svg and the precision statistics. """
+    configuration = LinkageConfiguration.from_arrays(hub_positions.reshape((-1, 2)),
+                                                     np.arange(2 * len(hub_positions)).reshape((-1, 2)))
+    precision = Precision(*precision_settings)
+    stream = io.StringIO()
+    with SvgWriter(stream, bounds, decimals=precision.decimals) as writer:
+        if symbols:
+            write_symbols(writer, configuration.links, hub_positions, None, geometry, precision)
+        else:
+            write_links(writer, ConfigurationSpace.assembled, configuration.links, hub_positions, None, geometry,
+                        precision)
+        write_hub_labels(writer, labels)
+    precision.add_writer(writer)
+    precision.bytes += len(stream.getvalue())
+    return stream.getvalue(), precision
+
+
+@profiling.timed("export.write_layout")
+def write_layout(linkage_configuration: LinkageConfiguration, space: ConfigurationSpace, stream, sheet: int = None,
+                 optimize_toolpath: bool = False, geometry: str = link_geometry.DEFAULT_KERNEL,
+                 output_format: str = "svg", symbols: bool = False, precision: Precision = None,
+                 labels: LabelPlacement = None) -> ToolpathReport:
+    """Streams the given configuration space as svg, dxf or G-code (output_format) to a text stream,
+    element by element. For fabrication space, sheet restricts the output to the links placed on that sheet.
+
+    geometry selects the link geometry kernel: 'arc' writes exact arcs, 'polyline' chords and 'shapely'
+    the buffered Shapely polygons. With optimize_toolpath, labels are written first (engraving before cutting)
+    followed by the optimized cut paths (always polylines), and the ToolpathReport is returned.
+    Otherwise symbols writes svg output as instances of one symbol per class of congruent links (see write_symbols).
+    precision sets the geometric precision and collects the statistics of the output (see Precision).
+    Links are labeled at both ends, unless placed hub labels (see labels.place_labels) are given.
+    """
+    precision = Precision() if precision is None else precision
+    links = linkage_configuration.links
+    hub_positions = linkage_configuration.hub_positions(space)
+    label_positions = linkage_configuration.label_positions(space) if labels is None else None
+    if sheet is not None and space is ConfigurationSpace.fabrication:
+        selection = [index for index, link in enumerate(links) if link.fabrication_sheet == sheet]
+        links = [links[index] for index in selection]
+        hub_positions = hub_positions[selection]
+        label_positions = None if label_positions is None else label_positions[selection]
+
+    bounds = total_bounds(link_bounds(links, space, hub_positions, geometry, precision.chord_tolerance))
+    stream = _CountingStream(stream)
+    toolpath_report = None
+    with OUTPUT_FORMATS[output_format][0](stream, bounds, decimals=precision.decimals) as writer:
+        if optimize_toolpath:
+            if labels is not None:
+                write_hub_labels(writer, labels)
+            for link, positions in zip(links, [] if label_positions is None else label_positions):
+                writer.text(positions[0][0], positions[0][1], link.hub_a.get_id())
+                writer.text(positions[1][0], positions[1][1], link.hub_b.get_id())
+
+            paths, toolpath_report = toolpath.optimize_toolpath(
+                [precision.simplified_polygon(link.as_polygon(space, kernel=geometry,
+                                                              chord_tolerance=precision.chord_tolerance))
+                 for link in links])
+            for path in paths:
+                writer.polyline(path.points, path.closed)
+        elif symbols and output_format == "svg":
+            write_symbols(writer, links, hub_positions, label_positions, geometry, precision, space)
+        else:
+            write_links(writer, space, links, hub_positions, label_positions, geometry, precision)
+        if labels is not None and not optimize_toolpath:
+            write_hub_labels(writer, labels)
+    precision.add_writer(writer)
+    precision.bytes += stream.count
+    return toolpath_report
+
+
+def write_symbols(writer: SvgWriter, links: List[LinkageLink], hub_positions: np.ndarray,
+                  label_positions: np.ndarray, geometry: str = link_geometry.DEFAULT_KERNEL, precision: Precision = None,
+                  space: ConfigurationSpace = ConfigurationSpace.assembled) -> int:
+    """Writes the links within space as instances of svg symbols, given the hub and label positions (N, 2, 2).
+    Every class of at least two congruent links (see util.link_geometry.congruent_classes) is built and written once,
+    in canonical position, and placed by a use element with a rotation and translation per link. Links without
+    a congruent partner are written as they are (see write_links), a symbol wouldn't save anything for them.
+    Returns the number of symbols written. """
+    lengths, classes = link_geometry.congruent_classes(hub_positions)
+    shared = np.bincount(classes, minlength=len(lengths)) >= 2
+    # symbol index of every shared class, -1 for the others
+    symbols = np.where(shared, np.cumsum(shared) - 1, -1)
+    single = np.flatnonzero(~shared[classes])
+    write_links(writer, space, [links[index] for index in single.tolist()], hub_positions[single],
+                None if label_positions is None else label_positions[single], geometry, precision)
+
+    if shared.any():
+        with writer.definitions():
+            for symbol_index, hubs in enumerate(link_geometry.canonical_hub_positions(lengths[shared])):
+                with writer.symbol(_symbol_id(symbol_index)):
+                    canonical_link = LinkageLink(LinkageHub(hubs[0]), LinkageHub(hubs[1]))
+                    write_links(writer, ConfigurationSpace.assembled, [canonical_link], hubs[None], None, geometry,
+                                precision)
+    profiling.count("svg symbols", int(shared.sum()))
+
+    instances = np.flatnonzero(shared[classes])
+    label_positions = [None] * len(instances) if label_positions is None else label_positions[instances]
+    for index, matrix, positions in zip(instances.tolist(),
+                                        link_geometry.canonical_transforms(hub_positions[instances]), label_positions):
+        writer.use(_symbol_id(int(symbols[classes[index]])), matrix)
+        if positions is None:
+            continue
+        writer.text(positions[0][0], positions[0][1], links[index].hub_a.get_id())
+        writer.text(positions[1][0], positions[1][1], links[index].hub_b.get_id())
+    return int(shared.sum())
+
+
+def write_hub_labels(writer, labels: LabelPlacement):
+    """Writes the placed hub labels (see labels.place_labels). """
+    for label, (x, y) in zip(labels.labels, labels.positions.tolist()):
+        writer.text(x, y, label)
+
+
+def _symbol_id(class_index: int) -> str:
+    return "link{}".format(class_index + 1)
+
+
+def write_links(writer, space: ConfigurationSpace, links: List[LinkageLink], hub_positions: np.ndarray,
+                label_positions: np.ndarray, geometry: str = link_geometry.DEFAULT_KERNEL, precision: Precision = None):
+    """Writes the outline, hub holes and labels of every link, given its hub and label positions (N, 2, 2)
+    within space, to a svg, dxf or G-code writer (see write_layout), or to a list of writers, one per link.
+    Without label_positions only the link geometry is written. precision sets the chord tolerance and
+    simplification of polylines (see Precision). """
+    precision = Precision() if precision is None else precision
+    chord_tolerance = precision.chord_tolerance
+    writers = writer if isinstance(writer, list) else [writer] * len(links)
+    # links too short for separate hub holes are written as Shapely polygons by every kernel
+    analytic = link_geometry.is_simple(hub_positions, link_geometry.LINKAGE_RADIUS, link_geometry.JOINT_RADIUS) \
+        & (geometry != "shapely")
+    if geometry == "arc":
+        tangents = link_geometry.tangent_points(hub_positions, link_geometry.LINKAGE_RADIUS)
+    elif geometry == "polyline":
+        outlines, holes = link_geometry.link_rings(
+            hub_positions, link_geometry.LINKAGE_RADIUS, link_geometry.JOINT_RADIUS,
+            link_geometry.DEFAULT_CHORD_TOLERANCE if chord_tolerance is None else chord_tolerance)
+
+    label_positions = [None] * len(links) if label_positions is None else label_positions
+    for index, (link, writer, positions) in enumerate(zip(links, writers, label_positions)):
+        if not analytic[index]:
+            writer.path(precision.simplified_polygon(link.as_polygon(space, kernel=geometry,
+                                                                     chord_tolerance=chord_tolerance)))
+        elif geometry == "arc":
+            writer.link_arcs(tangents[index], hub_positions[index], link_geometry.LINKAGE_RADIUS,
+                             link_geometry.JOINT_RADIUS)
+        else:
+            writer.rings(precision.simplified_rings([outlines[index], holes[index, 0], holes[index, 1]]))
+        if positions is not None:
+            writer.text(positions[0][0], positions[0][1], link.hub_a.get_id())
+            writer.text(positions[1][0], positions[1][1], link.hub_b.get_id())
+
+
+def link_bounds(links: List[LinkageLink], space: ConfigurationSpace, hub_positions: np.ndarray,
+                geometry: str = link_geometry.DEFAULT_KERNEL, chord_tolerance: float = None) -> np.ndarray:
+    """Bounds (min_x, min_y, max_x, max_y) of every link (N, 4) within space as written with the geometry kernel:
+    exact ones computed from the hub positions (N, 2, 2) for the analytic kernels, the Shapely polygons' otherwise. """
+    if geometry == "shapely":
+        bounds = [link.as_polygon(space, kernel=geometry, chord_tolerance=chord_tolerance).bounds for link in links]
+        return np.array(bounds, dtype=float).reshape((-1, 4))
+    return link_geometry.link_bounds(hub_positions, link_geometry.LINKAGE_RADIUS)
+
+
+def total_bounds(link_bounds: np.ndarray) -> tuple:
+    """Bounds enclosing all link bounds (N, 4), (0, 0, 0, 0) if there are none. """
+    bounds = Bounds()
+    if len(link_bounds):
+        bounds.add(tuple(link_bounds[:, :2].min(axis=0).tolist() + link_bounds[:, 2:].max(axis=0).tolist()))
+    return bounds.as_tuple()
+
+
+@profiling.timed("export.layout_links")
+def layout_links(links: List[LinkageLink], sheet: tuple = (1000, 1000), padding: float = 5,
+                 nesting: str = "skyline", allow_rotation: bool = False,
+                 geometry: str = link_geometry.DEFAULT_KERNEL, chord_tolerance: float = None) -> NestingResult:
+    """ Calculate transforms for every link to position them next to each other on sheets of size (width, height). 
+
+    nesting selects the engine (see nesting.PACKERS): 'skyline' (fast), 'maxrects' (tighter) or
+    'polygon' (interleaves the rounded link ends). Links keep at least padding distance to each other and the sheet border.
+    The analytic geometry kernels use exact link bounds and areas, 'shapely' those of the Shapely polygons
+    (at chord_tolerance, see Precision).
+    """
+    if nesting not in PACKERS:
+        raise ValueError("Unknown nesting engine '{}', expected one of: {}".format(nesting, ", ".join(PACKERS)))
+
+    part_bounds, areas = nesting_parts(links, geometry, chord_tolerance)
+    sizes = part_sizes(part_bounds, padding)
+
+    packer = PACKERS[nesting](sheet[0] - padding, sheet[1] - padding, allow_rotation)
+    with profiling.span("nesting." + nesting):
+        placements = packer.pack(sizes)
+    profiling.count("links laid out", len(links))
+
+    position_links(links, part_bounds, placements, padding)
+    return NestingResult(placements, sheet, areas)
+
+
+def nesting_parts(links: List[LinkageLink], geometry: str = link_geometry.DEFAULT_KERNEL,
+                  chord_tolerance: float = None) -> (list, list):
+    """Primitive space bounds and areas of the links nested by layout_links. """
+    if geometry == "shapely":
+        polygons = [link.as_polygon(space=ConfigurationSpace.primitive, kernel=geometry,
+                                    chord_tolerance=chord_tolerance) for link in links]
+        return [polygon.bounds for polygon in polygons], [polygon.area for polygon in polygons]
+
+    hub_positions = np.array([link.hub_positions(ConfigurationSpace.primitive) for link in links])
+    hub_positions = hub_positions.reshape((-1, 2, 2))
+    return (link_geometry.link_bounds(hub_positions, link_geometry.LINKAGE_RADIUS).tolist(),
+            link_geometry.link_areas(hub_positions, link_geometry.LINKAGE_RADIUS, link_geometry.JOINT_RADIUS).tolist())
+
+
+def part_sizes(part_bounds: list, padding: float) -> list:
+    """Padded (width, height) of every part, as packed by the nesting engines. """
+    return [(aabb[2] - aabb[0] + padding, aabb[3] - aabb[1] + padding) for aabb in part_bounds]
+
+
+def position_links(links: List[LinkageLink], part_bounds: list, placements: list, padding: float):
+    """Sets the fabrication transforms of links packed at placements (see nesting.Packer.pack),
+    given their primitive space bounds. """
+    sizes = part_sizes(part_bounds, padding)
+    for link, aabb, (width, height), (sheet_index, x, y, rotated) in zip(links, part_bounds, sizes, placements):
+        min_x, min_y, max_x, max_y = aabb
+        rotation = np.identity(4)
+        if rotated:
+            rotation = QUARTER_TURN
+            # bounds after rotating counter clockwise around the origin
+            min_x, min_y, max_x, max_y = -max_y, min_x, -min_y, max_x
+            width, height = height, width
 
-    layout_links(linkage_configuration.links)
-    
-    fabrication_layout = create_svg(linkage_configuration, ConfigurationSpace.fabrication)
-    styled_svg = style_svg(fabrication_layout)
-    # Make sure we use svg suffix
-    file_name = output_file_name.split(".")[0] + ".svg"
-    with open(output_file_name, "w") as svg_file:
-        styled_svg.writexml(svg_file)
-
-    assembly_manual = create_svg(
-        linkage_configuration, ConfigurationSpace.assembled)
-    styled_svg = style_svg(assembly_manual)
-    assembly_manual_output_file = output_file_name.split(".")[0] + "_assembly_manual.svg"
-    with open(assembly_manual_output_file, "w") as svg_file:
-        styled_svg.writexml(svg_file)
-
-
-def create_svg(linkage_configuration: LinkageConfiguration, space: ConfigurationSpace):
-    svg_string = ""
-    unionized_polygon = Polygon()
-    svg_string = ""
-    for link in linkage_configuration.links:
-        polygon = link.as_polygon(space)
-        unionized_polygon = unionized_polygon.union(polygon)
-
-        svg_string += polygon.svg()
-        svg_string += "\n"
-        positions = link.get_label_positions(space)
-        hub_a_label = '<text x="{}" y="{}" > {} </text>'.format(
-            positions[0].x, positions[0].y, link.hub_a.get_id())
-        svg_string += hub_a_label
-        svg_string += "\n"
-        hub_b_label = '<text x="{}" y="{}" > {} </text>'.format(
-            positions[1].x, positions[1].y, link.hub_b.get_id())
-        svg_string += hub_b_label
-        svg_string += "\n"
-
-    bounds = unionized_polygon.bounds
-    width = bounds[2] - bounds[0]
-    height = bounds[3] - bounds[1]
-    svg_string = '<svg width="{}mm" height="{}mm" viewBox="{} {} {} {}" > \n <g transform = "scale(1,1)">'.format(
-        width, height, bounds[0], bounds[1], width, height) + svg_string
-    svg_string += '</g>'
-    svg_string += "</svg>"
-    return svg_string
-
-def style_svg(svg: str) -> minidom.Document:
-    svg = minidom.parse(io.StringIO(svg))
-    paths = svg.getElementsByTagName("path")
-    for path in paths:
-        path.setAttribute("fill", "none")
-        path.setAttribute("stroke", "#FF0000")
-        path.setAttribute("stroke-width", "0.2")
-        path.setAttribute("opacity", "1.0")
-
-    labels = svg.getElementsByTagName("text")
-    for label in labels:
-        label.setAttribute("font-size", "5")
-        label.setAttribute("fill", "#0000FF")
-    return svg
-
-def layout_links(links: set[Polygon], sheet: tuple = (1000, 1000)):
-    """ Calculate transforms for every link to position them next to each other. """
-    width = 0
-    height = 0
-    maxHeight = 0
-    padding = 5
-    sheet_width = sheet[1]
-    sheet_padding = 10
-
-    # layout parts by moving them next to each other
-    for link in links:
-        polygon = link.as_polygon(space=ConfigurationSpace.primitive)
-
-        position = (0, 0)
-        aabb = polygon.bounds
-        aabbWidth = aabb[2] - aabb[0]
-        aabbHeight = aabb[3] - aabb[1]
-
-        position = (width + padding + aabbWidth / 2,
-                    height - padding - aabbHeight / 2)
-        maxHeight = max(aabbHeight + padding, maxHeight)
-        width += aabbWidth + padding
-
-        #  Overflow, go to next row
-        if width >= sheet_width:
-            width = sheet_padding - padding
-            height -= maxHeight
-
-        positioning_matrix = get_translate_matrix(
-            polygon, xoff=position[0], yoff=position[1])
-        link.set_fabrication_transform(
-            utils.shapely_to_4x4_matrix(positioning_matrix))
\ No newline at end of file
+        center_x, center_y = utils.center_for_bounds((min_x, min_y, max_x, max_y))
+        positioning_matrix = np.identity(4)
+        positioning_matrix[0:2, 3] = (padding / 2 + x + width / 2 - center_x, padding / 2 + y + height / 2 - center_y)
+        link.set_fabrication_transform(positioning_matrix @ rotation, sheet=sheet_index)
@@ -0,0 +1,210 @@
+"""Streaming G-code output for laser cutters and plotters with the same element interface as svg_writer.SvgWriter.
+
+Link outlines and hub holes are cut with G1 lines and G2/G3 arcs, other geometry with G1 polylines. Labels
+(blue in the svg) are engraved with a simple stroke font at engrave power and feed before the part they belong to
+is cut (red in the svg), within a part the hub holes are cut before the outline. The laser is switched with
+M3 S<power> / M5, travel moves use G0. G-code's y axis points up, so the layout is mirrored within its bounds.
+"""
+
+import util.geometry as utils
+from util.formatting import format_number
+import util.profiling as profiling
+
+# laser power (S word) and feed rate (mm/min) of the cut and the engrave layer
+CUT_POWER = 1000
+CUT_FEED = 600
+ENGRAVE_POWER = 300
+ENGRAVE_FEED = 1500
+# cap height of labels in mm, about the cap height of the svg's 5 unit font
+TEXT_HEIGHT = 3.5
+# coordinates are written with up to this many decimals by default
+DECIMALS = 4
+
+# single stroke glyphs (polylines) on a 4 x 6 grid with the baseline at y = 0, hub labels only use A-Z
+STROKE_FONT = {
+    "A": [[(0, 0), (0, 4), (2, 6), (4, 4), (4, 0)], [(0, 3), (4, 3)]],
+    "B": [[(0, 3), (3, 3), (4, 4), (4, 5), (3, 6), (0, 6), (0, 0), (3, 0), (4, 1), (4, 2), (3, 3)]],
+    "C": [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 1), (1, 0), (3, 0), (4, 1)]],
+    "D": [[(0, 0), (0, 6), (3, 6), (4, 5), (4, 1), (3, 0), (0, 0)]],
+    "E": [[(4, 6), (0, 6), (0, 0), (4, 0)], [(0, 3), (3, 3)]],
+    "F": [[(4, 6), (0, 6), (0, 0)], [(0, 3), (3, 3)]],
+    "G": [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 1), (1, 0), (3, 0), (4, 1), (4, 3), (2, 3)]],
+    "H": [[(0, 0), (0, 6)], [(4, 0), (4, 6)], [(0, 3), (4, 3)]],
+    "I": [[(1, 6), (3, 6)], [(2, 6), (2, 0)], [(1, 0), (3, 0)]],
+    "J": [[(4, 6), (4, 1), (3, 0), (1, 0), (0, 1)]],
+    "K": [[(0, 0), (0, 6)], [(4, 6), (0, 2)], [(1, 3), (4, 0)]],
+    "L": [[(0, 6), (0, 0), (4, 0)]],
+    "M": [[(0, 0), (0, 6), (2, 3), (4, 6), (4, 0)]],
+    "N": [[(0, 0), (0, 6), (4, 0), (4, 6)]],
+    "O": [[(1, 0), (0, 1), (0, 5), (1, 6), (3, 6), (4, 5), (4, 1), (3, 0), (1, 0)]],
+    "P": [[(0, 0), (0, 6), (3, 6), (4, 5), (4, 4), (3, 3), (0, 3)]],
+    "Q": [[(1, 0), (0, 1), (0, 5), (1, 6), (3, 6), (4, 5), (4, 1), (3, 0), (1, 0)], [(2, 2), (4, 0)]],
+    "R": [[(0, 0), (0, 6), (3, 6), (4, 5), (4, 4), (3, 3), (0, 3)], [(2, 3), (4, 0)]],
+    "S": [[(4, 5), (3, 6), (1, 6), (0, 5), (0, 4), (1, 3), (3, 3), (4, 2), (4, 1), (3, 0), (1, 0), (0, 1)]],
+    "T": [[(0, 6), (4, 6)], [(2, 6), (2, 0)]],
+    "U": [[(0, 6), (0, 1), (1, 0), (3, 0), (4, 1), (4, 6)]],
+    "V": [[(0, 6), (2, 0), (4, 6)]],
+    "W": [[(0, 6), (1, 0), (2, 4), (3, 0), (4, 6)]],
+    "X": [[(0, 0), (4, 6)], [(0, 6), (4, 0)]],
+    "Y": [[(0, 6), (2, 3), (4, 6)], [(2, 3), (2, 0)]],
+    "Z": [[(0, 6), (4, 6), (0, 0), (4, 0)]],
+}
+GLYPH_HEIGHT = 6
+GLYPH_ADVANCE = 5
+
+
+class GcodeWriter:
+    """Writes a G-code program move by move to a text stream.
+
+    The bounding box (in svg coordinates) has to be known upfront, it defines the mirror axis.
+    Cut geometry is held back until the next part starts, so the part's labels get engraved first.
+    Use as context manager or call close() to finish the program.
+    With document=False only the moves are written, without program start and end (fragments, see watch.py).
+    Such a fragment ends with the laser switched off, so fragments can be concatenated in any order.
+    Coordinates are rounded to decimals (default: DECIMALS).
+    """
+
+    def __init__(self, stream, bounds: tuple, cut_power: float = CUT_POWER, cut_feed: float = CUT_FEED,
+                 engrave_power: float = ENGRAVE_POWER, engrave_feed: float = ENGRAVE_FEED, document: bool = True,
+                 decimals: int = None):
+        self.stream = stream
+        self.closed = False
+        self.document = document
+        self.decimals = DECIMALS if decimals is None else decimals
+        # coordinate pairs of cut geometry written and bytes saved by rounding to fewer than DECIMALS
+        self.vertices = 0
+        self.saved_bytes = 0
+        self.mirror = bounds[1] + bounds[3]
+        self.layers = {"cut": (cut_power, cut_feed), "engrave": (engrave_power, engrave_feed)}
+
+        # cut shapes (start point, moves) of the current part
+        self._pending = []
+        self._position = None
+        self._power = None
+        self._feed = None
+        if not document:
+            return
+
+        stream.write("; LinkageFab fabrication layout: engrave S{} F{}, cut S{} F{}\n".format(
+            engrave_power, engrave_feed, cut_power, cut_feed))
+        stream.write("G21\nG90\nM5\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def path(self, geometry):
+        """Cuts the rings of a (multi) polygon as polylines, holes first. """
+        if geometry.is_empty:
+            return
+
+        polygons = geometry.geoms if hasattr(geometry, "geoms") else [geometry]
+        rings = [interior.coords for polygon in polygons for interior in polygon.interiors]
+        rings += [polygon.exterior.coords for polygon in polygons]
+        self._start_part([self._polyline_shape(ring) for ring in rings])
+
+    def rings(self, rings):
+        """Cuts closed rings (point arrays, first point repeated at the end): the outline (first ring)
+        after the holes. """
+        self._start_part([self._polyline_shape(ring) for ring in list(rings[1:]) + list(rings[:1])])
+
+    def link_arcs(self, tangents, hubs, linkage_radius: float, joint_radius: float):
+        """Cuts the hub holes as full circles, then the link outline as two lines and two arcs, from the tangent
+        end points (4, 2) (see util.link_geometry.tangent_points) and the hub positions (2, 2). """
+        a_left, b_left, b_right, a_right = (self._point(point) for point in tangents.tolist())
+        a, b = (self._point(point) for point in hubs.tolist())
+
+        shapes = []
+        for center in (a, b):
+            start = (center[0] + joint_radius, center[1])
+            position = (self._number(start[0]), self._number(start[1]))
+            shapes.append((start, [("G3 X{} Y{} I{} J0".format(*position, self._number(-joint_radius)), position)]))
+        shapes.append((a_left, [
+            self._line(b_left),
+            self._arc(b_left, b_right, b, utils.point_beyond(b, a, linkage_radius)),
+            self._line(a_right),
+            self._arc(a_right, a_left, a, utils.point_beyond(a, b, linkage_radius)),
+        ]))
+        self._start_part(shapes)
+        profiling.count("gcode arcs", 4)
+
+    def polyline(self, coords, closed: bool = True):
+        """Cuts a single (open or closed) polyline as its own part. """
+        self._start_part([self._polyline_shape(coords)])
+
+    def text(self, x: float, y: float, label: str):
+        """Engraves a label with its baseline starting at (x, y) right away. """
+        scale = TEXT_HEIGHT / GLYPH_HEIGHT
+        x, y = self._point((float(x), float(y)))
+        for index, character in enumerate(label.strip().upper()):
+            left = x + index * GLYPH_ADVANCE * scale
+            for stroke in STROKE_FONT.get(character, []):
+                points = [(left + glyph_x * scale, y + glyph_y * scale) for glyph_x, glyph_y in stroke]
+                self._emit("engrave", points[0], [self._line(point) for point in points[1:]])
+        profiling.count("gcode labels")
+
+    def close(self):
+        if self.closed:
+            return
+        self._flush()
+        if self._power is not None:
+            self.stream.write("M5\n")
+            self._power = None
+        if self.document:
+            self.stream.write("G0 X0 Y0\nM2\n")
+        self.closed = True
+
+    def _start_part(self, shapes):
+        self._flush()
+        self._pending = shapes
+
+    def _flush(self):
+        for start, moves in self._pending:
+            self._emit("cut", start, moves)
+            self.vertices += len(moves) + 1
+        self._pending = []
+
+    def _emit(self, layer: str, start, moves):
+        """Travels to start with the laser off unless already there, then runs moves at the layer's power and feed. """
+        power, feed = self.layers[layer]
+        start_position = (self._number(start[0]), self._number(start[1]))
+        if start_position != self._position or power != self._power:
+            if self._power is not None:
+                self.stream.write("M5\n")
+                self._power = None
+            self.stream.write("G0 X{} Y{}\n".format(*start_position))
+            self.stream.write("M3 S{}\n".format(power))
+            self._power = power
+        if feed != self._feed:
+            self.stream.write("F{}\n".format(feed))
+            self._feed = feed
+        self.stream.write("".join(move + "\n" for move, _ in moves))
+        self._position = moves[-1][1] if moves else start_position
+        profiling.count("gcode moves", len(moves) + 1)
+
+    def _polyline_shape(self, coords):
+        points = [self._point(coord) for coord in (coords.tolist() if hasattr(coords, "tolist") else coords)]
+        return (points[0], [self._line(point) for point in points[1:]])
+
+    def _point(self, point) -> tuple:
+        return (point[0], self.mirror - point[1])
+
+    def _number(self, value: float) -> str:
+        text = format_number(value, self.decimals)
+        if self.decimals != DECIMALS:
+            self.saved_bytes += len(format_number(value, DECIMALS)) - len(text)
+        return text
+
+    def _line(self, end) -> (str, tuple):
+        """A G1 move to end along with the formatted end position. """
+        position = (self._number(end[0]), self._number(end[1]))
+        return "G1 X{} Y{}".format(*position), position
+
+    def _arc(self, start, end, center, through) -> (str, tuple):
+        """A G2 (clockwise) or G3 (counter clockwise) move from start over through to end, around center. """
+        command = "G3" if utils.is_counter_clockwise(center, start, through) else "G2"
+        position = (self._number(end[0]), self._number(end[1]))
+        return "{} X{} Y{} I{} J{}".format(command, position[0], position[1], self._number(center[0] - start[0]),
+                                           self._number(center[1] - start[1])), position
@@ -0,0 +1,198 @@
+"""Interference detection between the physical links of a configuration and stacking layer assignment.
+
+Links are stadiums (the hub to hub segment buffered by the link radius), so two links overlap exactly
+when their segments come closer than twice the radius. The poses are checked in short windows of consecutive
+frames: candidate pairs are found with a Shapely STRtree over the links' bounding boxes swept over the window,
+afterwards every pose of the window only needs a vectorized segment distance test of the candidates. Boxes
+swept over a whole crank revolution would cover most of the mechanism, short windows keep them tight.
+Links sharing a hub always overlap at their common hub, they are stacked on the hub's pin and only conflict
+in the layer assignment.
+"""
+
+import heapq
+from typing import List
+
+import numpy as np
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+import util.geometry as utils
+import util.profiling as profiling
+
+# frames whose poses share the swept bounding boxes of the candidate search (and the (frames, pairs) distance
+# matrices), short enough for the boxes to stay close to the links while they move
+SWEEP_FRAMES = 16
+
+
+class InterferenceReport:
+    """Overlapping link pairs (as indices into links) and a layer for every link,
+    such that neither overlapping links nor links sharing a hub are on the same layer."""
+
+    def __init__(self, links: list, pairs: np.ndarray, frame_counts: np.ndarray, first_frames: np.ndarray,
+                 layers: List[int]):
+        self.links = links
+        self.pairs = pairs
+        self.frame_counts = frame_counts
+        self.first_frames = first_frames
+        self.layers = layers
+
+    @property
+    def layer_count(self) -> int:
+        return max(self.layers) + 1 if self.layers else 0
+
+    def __str__(self):
+        return self.format()
+
+    def format(self, max_pairs: int = 20) -> str:
+        """Summary listing up to max_pairs overlapping pairs and the links of every layer. """
+        lines = ["{} overlapping link pairs, {} layers".format(len(self.pairs), self.layer_count)]
+        for (a, b), count, first in zip(self.pairs[:max_pairs], self.frame_counts, self.first_frames):
+            lines.append("  {} overlaps {} in {} frame(s), first in frame {}".format(
+                self.links[a].get_id(), self.links[b].get_id(), count, first))
+        if len(self.pairs) > max_pairs:
+            lines.append("  ... {} more".format(len(self.pairs) - max_pairs))
+        for layer in range(self.layer_count):
+            lines.append("  layer {}: {}".format(layer + 1, " ".join(
+                link.get_id() for link, link_layer in zip(self.links, self.layers) if link_layer == layer)))
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "pairs": [{"links": [self.links[a].get_id(), self.links[b].get_id()], "frames": int(count),
+                       "first_frame": int(first)}
+                      for (a, b), count, first in zip(self.pairs, self.frame_counts, self.first_frames)],
+            "layers": {link.get_id(): layer + 1 for link, layer in zip(self.links, self.layers)},
+            "layer_count": self.layer_count,
+        }
+
+
+class InterferenceChecker:
+    """Checks the links of a configuration for overlaps in one or many poses.
+
+    Poses are given as hub positions (frames, hubs, 2) with hubs in the order of the configuration's hub array,
+    e.g. simulation.Simulation.positions.
+    """
+
+    def __init__(self, linkage_configuration: LinkageConfiguration, linkage_radius: float = 7.5,
+                 clearance: float = 0.0):
+        self.configuration = linkage_configuration
+        self.links = linkage_configuration.links
+        self.linkage_radius = linkage_radius
+        # links closer than clearance count as overlapping as well
+        self.clearance = clearance
+
+        self.ends = linkage_configuration.link_array.astype(np.int64)
+        self.assembled = linkage_configuration.hub_array[None]
+
+    def shared_hub_pairs(self) -> np.ndarray:
+        """Pairs (i < j) of links connected by a common hub. """
+        offsets, link_indices = self.configuration.adjacency()
+        pairs = set()
+        for hub in range(len(offsets) - 1):
+            links = sorted(set(link_indices[offsets[hub]:offsets[hub + 1]].tolist()))
+            pairs.update((a, b) for index, a in enumerate(links) for b in links[index + 1:])
+        return np.array(sorted(pairs), dtype=np.int64).reshape((-1, 2))
+
+    @profiling.timed("interference.candidate_pairs")
+    def candidate_pairs(self, positions: np.ndarray) -> np.ndarray:
+        """Pairs (i < j) of links without a common hub whose bounding boxes, swept over the given poses, intersect. """
+        if len(self.links) < 2:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        segments = positions[:, self.ends]
+        margin = self.linkage_radius + self.clearance / 2
+        bounds = np.concatenate((segments.min(axis=(0, 2)) - margin, segments.max(axis=(0, 2)) + margin), axis=1)
+
+        pairs = utils.intersecting_box_pairs(bounds)
+        pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+        shares_hub = (self.ends[pairs[:, 0]][:, :, None] == self.ends[pairs[:, 1]][:, None, :]).any(axis=(1, 2))
+        profiling.count("interference candidate pairs", int((~shares_hub).sum()))
+        return pairs[~shares_hub]
+
+    @profiling.timed("interference.check")
+    def check(self, positions: np.ndarray = None) -> InterferenceReport:
+        """Reports overlapping links over all given poses (default: the assembled pose)
+        and assigns stacking layers. """
+        positions = self.assembled if positions is None else np.asarray(positions, dtype=float)
+
+        # overlapping pairs, their number of overlapping frames and first frame per window of poses
+        window_pairs, window_counts, window_firsts = [np.zeros((0, 2), dtype=np.int64)], [], []
+        for start in range(0, len(positions), SWEEP_FRAMES):
+            window = positions[start:start + SWEEP_FRAMES]
+            candidates = self.candidate_pairs(window)
+            if not len(candidates):
+                continue
+            overlapping = self.overlaps(window, candidates)
+            colliding = overlapping.any(axis=0)
+            window_pairs.append(candidates[colliding])
+            window_counts.append(overlapping[:, colliding].sum(axis=0))
+            window_firsts.append(np.argmax(overlapping[:, colliding], axis=0) + start)
+
+        pairs, inverse = np.unique(np.concatenate(window_pairs), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        frame_counts = np.bincount(inverse, np.concatenate(window_counts or [[]]), len(pairs)).astype(np.int64)
+        first_frames = np.full(len(pairs), len(positions), dtype=np.int64)
+        np.minimum.at(first_frames, inverse, np.concatenate(window_firsts or [[]]).astype(np.int64))
+        layers = assign_layers(len(self.links), np.concatenate((pairs, self.shared_hub_pairs())))
+        return InterferenceReport(self.links, pairs, frame_counts, first_frames, layers)
+
+    def overlaps(self, positions: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+        """Whether the links of every pair overlap, per pose (frames, pairs). """
+        a = positions[:, self.ends[pairs[:, 0]]]
+        b = positions[:, self.ends[pairs[:, 1]]]
+        distances = segment_distances(a[:, :, 0], a[:, :, 1], b[:, :, 0], b[:, :, 1])
+        return distances < 2 * self.linkage_radius + self.clearance - 1e-9
+
+
+def segment_distances(a0: np.ndarray, a1: np.ndarray, b0: np.ndarray, b1: np.ndarray) -> np.ndarray:
+    """Distances between the 2d segments a0-a1 and b0-b1, element wise over arrays of shape (..., 2). """
+    def cross(u, v):
+        return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+    def point_distance(point, start, end):
+        direction = end - start
+        length = (direction ** 2).sum(axis=-1)
+        t = np.clip(((point - start) * direction).sum(axis=-1) / np.where(length > 0, length, 1.0), 0.0, 1.0)
+        return np.linalg.norm(start + t[..., None] * direction - point, axis=-1)
+
+    distances = np.minimum(np.minimum(point_distance(a0, b0, b1), point_distance(a1, b0, b1)),
+                           np.minimum(point_distance(b0, a0, a1), point_distance(b1, a0, a1)))
+
+    # properly crossing segments
+    d1 = cross(b1 - b0, a0 - b0)
+    d2 = cross(b1 - b0, a1 - b0)
+    d3 = cross(a1 - a0, b0 - a0)
+    d4 = cross(a1 - a0, b1 - a0)
+    crossing = (d1 * d2 < 0) & (d3 * d4 < 0)
+    return np.where(crossing, 0.0, distances)
+
+
+@profiling.timed("interference.assign_layers")
+def assign_layers(count: int, conflicts: np.ndarray) -> List[int]:
+    """Colours the conflict graph of count vertices with DSatur: the vertex with the most distinct
+    neighbour colours (ties broken by degree) gets the smallest colour not used by its neighbours.
+    Not guaranteed minimal, but optimal for bipartite graphs and close to it in general.
+    """
+    neighbours = [set() for _ in range(count)]
+    for a, b in np.asarray(conflicts, dtype=np.int64).reshape((-1, 2)).tolist():
+        if a != b:
+            neighbours[a].add(b)
+            neighbours[b].add(a)
+
+    colours = [-1] * count
+    neighbour_colours = [set() for _ in range(count)]
+    queue = [(0, -len(neighbours[vertex]), vertex) for vertex in range(count)]
+    heapq.heapify(queue)
+    while queue:
+        saturation, _, vertex = heapq.heappop(queue)
+        if colours[vertex] >= 0 or -saturation != len(neighbour_colours[vertex]):
+            # already coloured or a stale entry
+            continue
+        colour = 0
+        while colour in neighbour_colours[vertex]:
+            colour += 1
+        colours[vertex] = colour
+        for neighbour in neighbours[vertex]:
+            if colours[neighbour] < 0 and colour not in neighbour_colours[neighbour]:
+                neighbour_colours[neighbour].add(colour)
+                heapq.heappush(queue, (-len(neighbour_colours[neighbour]), -len(neighbours[neighbour]), neighbour))
+    return colours
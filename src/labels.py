@@ -0,0 +1,159 @@
+"""Hub label placement for the assembly manual.
+
+Every hub gets its label once, instead of once per link end. Candidate positions lie on rings around the hub,
+nearest first; a label takes the first candidate which neither crosses a link outline (or hub hole) nor overlaps
+a label placed before. Candidates are tested against a Shapely STRtree of the link outlines, in one bulk query
+per ring once the first label needs it, and against the placed labels via a SpatialHash, so placement stays
+O(n log n) for thousands of hubs.
+Labels without a clean candidate take the one with the fewest conflicts and are reported.
+"""
+
+import math
+from typing import List
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, box
+from shapely.strtree import STRtree
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from linkage_graph.linkage_link import ConfigurationSpace
+from svg_writer import LABEL_FONT_SIZE
+import util.link_geometry as link_geometry
+from util.spatial_hash import SpatialHash
+import util.profiling as profiling
+
+# approximate extent of a label: advance per character and height above the baseline, relative to the font size
+CHARACTER_WIDTH = 0.6
+CAP_HEIGHT = 0.75
+# distances (in mm) of the candidate label centers from their hub, within the link around the hub, just outside
+# and further out, each in CANDIDATE_DIRECTIONS directions starting to the right of the hub
+CANDIDATE_DISTANCES = (4.0, 10.0, 14.0)
+CANDIDATE_DIRECTIONS = 16
+# outlines are approximated this coarsely (in mm) for the collision tests
+OUTLINE_TOLERANCE = 0.1
+
+
+class LabelPlacement:
+    """Baseline positions (K, 2) of the labels of hubs (K,) (indices into the configuration's hubs) and
+    the hubs whose label crosses a link outline or another label, since no candidate position was free."""
+
+    def __init__(self, hubs: np.ndarray, labels: List[str], positions: np.ndarray, unplaced: List[int]):
+        self.hubs = hubs
+        self.labels = labels
+        self.positions = positions
+        self.unplaced = unplaced
+
+    def __len__(self):
+        return len(self.labels)
+
+    def bounds(self) -> np.ndarray:
+        """Approximate extent (min_x, min_y, max_x, max_y) of every label (K, 4). """
+        widths = np.array([len(label) for label in self.labels], dtype=float) * CHARACTER_WIDTH * LABEL_FONT_SIZE
+        positions = np.asarray(self.positions, dtype=float).reshape((-1, 2))
+        return np.stack((positions[:, 0], positions[:, 1] - CAP_HEIGHT * LABEL_FONT_SIZE,
+                         positions[:, 0] + widths, positions[:, 1]), axis=1)
+
+    def subset(self, indices) -> "LabelPlacement":
+        """The labels at indices, e.g. those on one page of a tiled manual. """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        unplaced = set(self.unplaced)
+        return LabelPlacement(self.hubs[indices], [self.labels[index] for index in indices.tolist()],
+                              self.positions[indices],
+                              [position for position, index in enumerate(indices.tolist()) if index in unplaced])
+
+    def __str__(self):
+        text = "{} hub labels placed".format(len(self.hubs))
+        if self.unplaced:
+            text += ", {} overlap link outlines or other labels: {}".format(
+                len(self.unplaced), ", ".join(self.labels[index] for index in self.unplaced))
+        return text
+
+
+@profiling.timed("labels.place_labels")
+def place_labels(configuration: LinkageConfiguration) -> LabelPlacement:
+    """Places the label of every hub connected to a link once in assembled space (see LabelPlacement).
+    Hubs connected to more links are placed first, as they have the least room. """
+    hubs = np.unique(configuration.link_array)
+    labels = [configuration.hubs[index].get_id() for index in hubs.tolist()]
+    link_offsets, _ = configuration.adjacency()
+    order = np.argsort(-np.diff(link_offsets)[hubs], kind="stable")
+
+    # label boxes (min_x, min_y, max_x, max_y) relative to their center, candidate centers (K, C, 2)
+    widths = np.array([len(label) for label in labels], dtype=float) * CHARACTER_WIDTH * LABEL_FONT_SIZE
+    height = CAP_HEIGHT * LABEL_FONT_SIZE
+    angles = np.arange(CANDIDATE_DIRECTIONS) * 2 * math.pi / CANDIDATE_DIRECTIONS
+    directions = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+    offsets = np.concatenate([distance * directions for distance in CANDIDATE_DISTANCES])
+    centers = configuration.hub_array[hubs][:, None] + offsets[None]
+    half_sizes = np.stack((widths / 2, np.full(len(hubs), height / 2)), axis=1)[:, None]
+    candidates = np.concatenate((centers - half_sizes, centers + half_sizes), axis=2)
+
+    tree = _outline_tree(configuration)
+    ring_size = CANDIDATE_DIRECTIONS
+    # outline crossings of every candidate, -1 until its ring is queried
+    crossings = np.full(candidates.shape[:2], -1, dtype=np.int64)
+    placed = SpatialHash(max(float(widths.max(initial=0)), height))
+    chosen = np.zeros(len(hubs), dtype=np.int64)
+    unplaced = []
+    for index in order.tolist():
+        best, best_conflicts = 0, math.inf
+        for candidate, aabb in enumerate(candidates[index].tolist()):
+            if crossings[index, candidate] < 0:
+                ring = slice(candidate - candidate % ring_size, candidate - candidate % ring_size + ring_size)
+                crossings[:, ring] = _crossings(tree, candidates[:, ring].reshape((-1, 4))).reshape((len(hubs), -1))
+            conflicts = crossings[index, candidate]
+            if conflicts >= best_conflicts:
+                continue
+            conflicts += sum(1 for other in placed.find_all(_center(aabb)) if _overlap(aabb, other))
+            if conflicts < best_conflicts:
+                best, best_conflicts = candidate, conflicts
+                if conflicts == 0:
+                    break
+        chosen[index] = best
+        aabb = candidates[index, best].tolist()
+        placed.insert(_center(aabb), aabb)
+        if best_conflicts:
+            unplaced.append(index)
+
+    # text is written from the baseline's start, the bottom left corner of the box
+    boxes = candidates[np.arange(len(hubs)), chosen]
+    profiling.count("hub labels", len(hubs))
+    return LabelPlacement(hubs, labels, boxes[:, [0, 3]], sorted(unplaced))
+
+
+def _outline_tree(configuration: LinkageConfiguration) -> STRtree:
+    """STRtree of the link outlines and hub holes as line strings, None without links. """
+    hub_positions = configuration.hub_position_array()
+    simple = link_geometry.is_simple(hub_positions)
+    outlines, holes = link_geometry.link_rings(hub_positions[simple], chord_tolerance=OUTLINE_TOLERANCE)
+    rings = [outlines, holes.reshape((-1,) + holes.shape[2:])]
+    if hasattr(shapely, "linestrings"):
+        # shapely 2: rings of the same length are created at once
+        geometries = [geometry for ring_array in rings for geometry in shapely.linestrings(ring_array)]
+    else:
+        geometries = [LineString(ring) for ring_array in rings for ring in ring_array]
+    geometries += [configuration.links[index].as_polygon(ConfigurationSpace.assembled, kernel="shapely").boundary
+                   for index in np.flatnonzero(~simple).tolist()]
+    return STRtree(geometries) if geometries else None
+
+
+def _crossings(tree: STRtree, boxes: np.ndarray) -> np.ndarray:
+    """Number of outlines in tree crossed by every box (K, 4). """
+    if tree is None:
+        return np.zeros(len(boxes), dtype=np.int64)
+    if hasattr(tree, "query_items"):
+        # shapely 1.8: query returns the geometries with intersecting envelopes
+        return np.array([sum(1 for geometry in tree.query(candidate) if geometry.intersects(candidate))
+                         for candidate in (box(*aabb) for aabb in boxes.tolist())], dtype=np.int64)
+    # shapely 2: bulk query of all boxes returning (box, geometry) index pairs
+    pairs = tree.query(shapely.box(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]), predicate="intersects")
+    return np.bincount(pairs[0], minlength=len(boxes))
+
+
+def _center(aabb) -> tuple:
+    return ((aabb[0] + aabb[2]) / 2, (aabb[1] + aabb[3]) / 2)
+
+
+def _overlap(aabb, other) -> bool:
+    return aabb[0] < other[2] and other[0] < aabb[2] and aabb[1] < other[3] and other[1] < aabb[3]
@@ -1,22 +1,329 @@
 import argparse
+import json
+import math
+import os
+import sys
 
-from parse import parse_solvespace_file
-from export import render_fabrication_layout
+from cache import LinkageCache, DEFAULT_MAX_BYTES, format_stats
+from conversion import convert_file
+from export import OUTPUT_FORMATS
+from nesting import PACKERS
+from parse import READERS
+import util.link_geometry as link_geometry
+import util.profiling as profiling
 
-parser = argparse.ArgumentParser(description='LinkageFab: Convert SolveSpace linkages for fabrication')
 
-parser.add_argument('input_file', type=str,
-                    help='A file containing a linkage representation. Currently supported: .slvs')
-parser.add_argument('--output', type=str,
-                    help='Output file name.')
+def size_argument(text: str) -> tuple:
+    """argparse type of sizes in mm given as WIDTHxHEIGHT, two positive numbers. """
+    try:
+        size = tuple(float(value) for value in text.lower().split('x'))
+    except ValueError:
+        size = ()
+    if len(size) != 2 or not all(value > 0 and math.isfinite(value) for value in size):
+        raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT with two positive numbers, got '{}'".format(text))
+    return size
 
-args = parser.parse_args()
 
-# Parse solve space file and create an intermediate linkage graph representation
-# linkage_configuration = parse_solvespace_file("sample/indepth_assignment_linkages_saxena.slvs")
-linkage_configuration = parse_solvespace_file(args.input_file)
+def add_parse_arguments(parser):
+    parser.add_argument('--reader', type=str, default='native', choices=READERS,
+                        help='Reader for .slvs files: the lightweight native reader or slvstopy (builds the solver system).')
+    parser.add_argument('--cross-check', action='store_true',
+                        help='Read input files with both readers and fail if they disagree.')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print the entities read from input files.')
 
-# Render linkage configuration as ready to cut svg file
-render_fabrication_layout(linkage_configuration, args.output)
 
+def add_render_arguments(parser):
+    add_parse_arguments(parser)
+    parser.add_argument('--sheet', type=size_argument, default='1000x1000', metavar='WIDTHxHEIGHT',
+                        help='Sheet size in mm as WIDTHxHEIGHT, links are split across several sheets if necessary.')
+    parser.add_argument('--nesting', type=str, default='skyline', choices=sorted(PACKERS),
+                        help='Nesting engine used for laying out links on sheets.')
+    parser.add_argument('--rotate', action='store_true',
+                        help='Allow rotating links by 90 degrees while nesting.')
+    parser.add_argument('--optimize-toolpath', action='store_true',
+                        help='Remove duplicate cut segments and order cut paths to minimize laser travel.')
+    parser.add_argument('--geometry', type=str, default=link_geometry.DEFAULT_KERNEL, choices=link_geometry.KERNELS,
+                        help='Link geometry: exact svg arcs, polylines or the Shapely buffered polygons (previous output).')
+    parser.add_argument('--format', type=str, default='svg', choices=sorted(OUTPUT_FORMATS),
+                        help='Format of the fabrication files, the assembly manual is always svg.')
+    parser.add_argument('--symbols', action='store_true',
+                        help='Write congruent links once as svg symbol and place them with use elements.')
+    parser.add_argument('--chord-tolerance', type=float, default=None,
+                        help='Maximum distance in mm between arcs and their chords in polyline and shapely geometry '
+                             '(default: {} for polylines, Shapely\'s default resolution).'.format(
+                                 link_geometry.DEFAULT_CHORD_TOLERANCE))
+    parser.add_argument('--decimals', type=int, default=None,
+                        help='Round coordinates to this many decimals (default: full precision for svg, '
+                             '6 for dxf, 4 for G-code).')
+    parser.add_argument('--simplify', type=float, default=None,
+                        help='Remove polyline vertices within this distance in mm of the simplified outline.')
+    parser.add_argument('--tile-manual', type=size_argument, default=None, const='297x210', nargs='?', metavar='WIDTHxHEIGHT',
+                        help='Split the assembly manual into pages of this size in mm (default: A4 landscape) '
+                             'with an overview page linking to them.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always parse and render, neither read nor write the cache.')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Cache directory (default: $XDG_CACHE_HOME/linkage_fab).')
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20,
+                        help='Maximum cache size in MB, least recently used entries are evicted beyond.')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='Print cache statistics after converting.')
 
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time spent per pipeline stage and counters like shapely operations and svg vertices.')
+    parser.add_argument('--profile-json', type=str, default=None,
+                        help='Write the recorded profile as json to this file (implies --profile without the table).')
+
+
+def render_options(args) -> dict:
+    return {
+        "sheet": args.sheet,
+        "nesting": args.nesting,
+        "allow_rotation": args.rotate,
+        "optimize_toolpath": args.optimize_toolpath,
+        "geometry": args.geometry,
+        "output_format": args.format,
+        "symbols": args.symbols,
+        "chord_tolerance": args.chord_tolerance,
+        "decimals": args.decimals,
+        "simplify": args.simplify,
+        "manual_tiles": args.tile_manual,
+    }
+
+
+def parse_options(args) -> dict:
+    return {
+        "reader": args.reader,
+        "cross_check": args.cross_check,
+        "verbose": args.verbose,
+    }
+
+
+def create_cache(args):
+    if args.no_cache:
+        return None
+    cache = LinkageCache(args.cache_dir, int(args.cache_size * 2 ** 20))
+    # the size limit may have been lowered since the last run
+    cache.evict()
+    return cache
+
+
+def report_profile(args, recorder):
+    if recorder is None:
+        return
+    data = recorder.as_dict()
+    if args.profile:
+        print(profiling.format_table(data))
+    if args.profile_json is not None:
+        with open(args.profile_json, "w") as profile_file:
+            json.dump(data, profile_file, indent=2)
+
+
+def print_cache_stats(args):
+    if args.cache_stats and not args.no_cache:
+        print(format_stats(LinkageCache(args.cache_dir, int(args.cache_size * 2 ** 20)).stats()))
+
+
+def convert(argv):
+    parser = argparse.ArgumentParser(description='LinkageFab: Convert SolveSpace linkages for fabrication',
+                                     epilog='Use "%(prog)s batch --help" for converting many files at once, '
+                                            '"%(prog)s simulate --help" for simulating the motion of a linkage and '
+                                            '"%(prog)s interference --help" for checking links for collisions.')
+
+    parser.add_argument('input_file', type=str,
+                        help='A file containing a linkage representation. Currently supported: .slvs')
+    parser.add_argument('--output', type=str,
+                        help='Output file name.')
+    add_render_arguments(parser)
+    add_profile_arguments(parser)
+    parser.add_argument('--cprofile', type=str, default=None,
+                        help='Run the conversion under cProfile and dump the statistics to this file (see pstats).')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and re-export only the changed links whenever the input file changes.')
+    parser.add_argument('--watch-interval', type=float, default=0.5,
+                        help='Seconds between checks of the input file in watch mode.')
+
+    args = parser.parse_args(argv)
+    if args.watch and (args.optimize_toolpath or args.symbols or args.tile_manual):
+        parser.error('--watch can\'t be combined with --optimize-toolpath, --symbols or --tile-manual')
+
+    if args.profile or args.profile_json is not None:
+        profiling.enable()
+    profiler = None
+    if args.cprofile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    cache = None
+    if args.watch:
+        # imported here, so single file conversions don't pay for it
+        from watch import watch_file
+        print("Watching {}, press Ctrl+C to stop".format(args.input_file))
+        watch_file(args.input_file, args.output, render_options(args), parse_options(args), args.watch_interval)
+    else:
+        # Parse solve space file into an intermediate linkage graph representation and render it
+        # as ready to cut svg file, unchanged inputs are served from the cache
+        cache = create_cache(args)
+        options = render_options(args)
+        if options["manual_tiles"] is not None:
+            # pages of a tiled manual are rendered by one process per cpu, batch conversions and the service
+            # render them serially as they run in parallel themselves
+            options["workers"] = os.cpu_count()
+        try:
+            result = convert_file(args.input_file, args.output, options, cache, parse_options(args))
+        except ValueError as error:
+            # malformed input or options it can't be rendered with, e.g. links longer than the sheet
+            parser.exit(2, "{}: error: {}\n".format(parser.prog, error))
+        print(result["report"] + (" (cached)" if result["cached"] else ""))
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+    report_profile(args, profiling.disable())
+
+    if cache is not None:
+        cache.flush_stats()
+    print_cache_stats(args)
+
+
+def batch(argv):
+    parser = argparse.ArgumentParser(prog='linkage_fab.py batch',
+                                     description='LinkageFab: Convert many SolveSpace linkages in parallel')
+
+    parser.add_argument('inputs', type=str, nargs='+',
+                        help='Directories (searched recursively) or glob patterns of input files.')
+    parser.add_argument('--output-dir', type=str, default='.',
+                        help='Directory the converted files are written to.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).')
+    parser.add_argument('--summary', type=str, default=None,
+                        help='File the json summary is written to (default: OUTPUT_DIR/batch_summary.json).')
+    add_render_arguments(parser)
+    add_profile_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    # imported here, so single file conversions don't pay for the process pool machinery
+    from batch import run_batch
+    results = run_batch(args.inputs, args.output_dir, render_options(args), args.workers, args.summary,
+                        create_cache(args), parse_options(args), args.profile or args.profile_json is not None)
+
+    if args.profile or args.profile_json is not None:
+        # the profiles of all files, recorded in the worker processes
+        recorder = profiling.Recorder()
+        for result in results:
+            if result.get("profile") is not None:
+                recorder.merge(result["profile"])
+        report_profile(args, recorder)
+    print_cache_stats(args)
+    return 1 if any(result["status"] != "ok" for result in results) else 0
+
+
+def add_simulation_arguments(parser, crank_required: bool):
+    parser.add_argument('--crank', type=str, nargs=2, required=crank_required, metavar=('PIVOT', 'HUB'),
+                        help='Ids of the crank pivot (fixed) and of the hub rotated around it, as shown in the assembly manual.')
+    parser.add_argument('--fixed', type=str, nargs='*', default=[],
+                        help='Ids of hubs keeping their position (the ground link).')
+    parser.add_argument('--frames', type=int, default=360,
+                        help='Number of simulated frames.')
+    parser.add_argument('--sweep', type=float, default=360.0,
+                        help='Crank rotation in degrees over all frames.')
+
+
+def simulate(argv):
+    parser = argparse.ArgumentParser(prog='linkage_fab.py simulate',
+                                     description='LinkageFab: Simulate the motion of a SolveSpace linkage driven by a crank')
+
+    parser.add_argument('input_file', type=str,
+                        help='A file containing a linkage representation. Currently supported: .slvs')
+    add_simulation_arguments(parser, crank_required=True)
+    parser.add_argument('--output', type=str, default='linkage_animation.svg',
+                        help='Animated svg of the assembly.')
+    parser.add_argument('--duration', type=float, default=4.0,
+                        help='Duration of one animation cycle in seconds.')
+    parser.add_argument('--trajectories', type=str, default=None,
+                        help='Write the hub positions of every frame as json to this file.')
+    add_parse_arguments(parser)
+    add_profile_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.profile or args.profile_json is not None:
+        profiling.enable()
+
+    from parse import parse_solvespace_file
+    from simulation import simulate as simulate_configuration, write_animation_svg
+    from svg_writer import open_svg_file
+
+    linkage_configuration = parse_solvespace_file(args.input_file, **parse_options(args))
+    simulation = simulate_configuration(linkage_configuration, args.fixed, tuple(args.crank), args.frames, args.sweep)
+    print(simulation)
+
+    with open_svg_file(args.output) as svg_file:
+        write_animation_svg(simulation, svg_file, args.duration)
+    if args.trajectories is not None:
+        with open(args.trajectories, "w") as trajectories_file:
+            json.dump(simulation.to_dict(), trajectories_file)
+
+    report_profile(args, profiling.disable())
+    return 0 if simulation.converged.all() else 1
+
+
+def interference(argv):
+    parser = argparse.ArgumentParser(prog='linkage_fab.py interference',
+                                     description='LinkageFab: Find overlapping links and assign them to stacking layers')
+
+    parser.add_argument('input_file', type=str,
+                        help='A file containing a linkage representation. Currently supported: .slvs')
+    add_simulation_arguments(parser, crank_required=False)
+    parser.add_argument('--clearance', type=float, default=0.0,
+                        help='Minimum distance in mm between links on the same layer.')
+    parser.add_argument('--report', type=str, default=None,
+                        help='Write overlapping pairs and the layer of every link as json to this file.')
+    add_parse_arguments(parser)
+    add_profile_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.profile or args.profile_json is not None:
+        profiling.enable()
+
+    from parse import parse_solvespace_file
+    from interference import InterferenceChecker
+
+    linkage_configuration = parse_solvespace_file(args.input_file, **parse_options(args))
+    positions = None
+    if args.crank is not None:
+        # check the whole range of motion instead of the assembled pose only
+        from simulation import simulate as simulate_configuration
+        simulation = simulate_configuration(linkage_configuration, args.fixed, tuple(args.crank), args.frames,
+                                            args.sweep)
+        print(simulation)
+        positions = simulation.positions
+
+    report = InterferenceChecker(linkage_configuration, clearance=args.clearance).check(positions)
+    print(report)
+    if args.report is not None:
+        with open(args.report, "w") as report_file:
+            json.dump(report.to_dict(), report_file, indent=2)
+
+    report_profile(args, profiling.disable())
+    return 0
+
+
+def main(argv):
+    if argv and argv[0] == 'batch':
+        return batch(argv[1:])
+    if argv and argv[0] == 'simulate':
+        return simulate(argv[1:])
+    if argv and argv[0] == 'interference':
+        return interference(argv[1:])
+    return convert(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,34 +1,174 @@
-from typing import Set, List
+from typing import Iterable, List
+import numpy as np
 
-from linkage_graph.linkage_link import LinkageLink
+from linkage_graph.linkage_link import LinkageLink, ConfigurationSpace
 from linkage_graph.linkage_hub import LinkageHub
+from util.spatial_hash import SpatialHash
 import util.geometry as utils
+import util.profiling as profiling
 
 class LinkageConfiguration:
-    """ ... """
+    """ A linkage stored as arrays: hub positions (H, 2), the hub indices of every link (L, 2),
+    the links' fabrication transforms (L, 4, 4) and sheets (L,). 
+    self.hubs (ordered by id) and self.links are LinkageHub and LinkageLink views on these arrays. """
 
-    def __init__(self, hubs: Set[LinkageHub], links: List[LinkageLink]):
-        """ ... """
+    def __init__(self, hubs: Iterable[LinkageHub], links: List[LinkageLink]):
+        """ Creates a configuration from hub and link objects, which become views on the configuration's arrays.
+        Hubs are numbered in order of their first appearance in links, unconnected hubs follow ordered by position. """
 
+        ordered = {}
+        for link in links:
+            ordered.setdefault(id(link.hub_a), link.hub_a)
+            ordered.setdefault(id(link.hub_b), link.hub_b)
+        unconnected = sorted((hub for hub in hubs if id(hub) not in ordered),
+                             key=lambda hub: (float(hub.position[0]), float(hub.position[1])))
+        hubs = list(ordered.values()) + unconnected
+        hub_indices = {id(hub): index for index, hub in enumerate(hubs)}
+
+        self._set_arrays(
+            [hub.position for hub in hubs],
+            [[hub_indices[id(link.hub_a)], hub_indices[id(link.hub_b)]] for link in links],
+            [link.fabrication_transform for link in links],
+            [link.fabrication_sheet for link in links])
+
+        for index, hub in enumerate(hubs):
+            hub._owner = self
+            hub.index = index
+        for index, link in enumerate(links):
+            link._owner = self
+            link.index = index
         self.hubs = hubs
-        self.links = links
+        self.links = list(links)
 
     @staticmethod
-    def from_line_segments(line_segments):
-        """ ... """
-        hubs = set([])
-        links = []
+    def from_arrays(hub_array, link_array, transform_array=None, sheet_array=None):
+        """ Creates a configuration from hub positions (H, 2) and the hub indices of every link (L, 2),
+        optionally with fabrication transforms (L, 4, 4) and sheets (L,). """
+        configuration = LinkageConfiguration.__new__(LinkageConfiguration)
+        configuration._set_arrays(hub_array, link_array, transform_array, sheet_array)
+        configuration.hubs = [LinkageHub._view(configuration, index) for index in range(len(configuration.hub_array))]
+        configuration.links = [LinkageLink._view(configuration, index) for index in range(len(configuration.link_array))]
+        return configuration
+
+    def _set_arrays(self, hub_array, link_array, transform_array=None, sheet_array=None):
+        self.hub_array = np.array(hub_array, dtype=float).reshape((-1, 2))
+        self.link_array = np.array(link_array, dtype=np.int32).reshape((-1, 2))
+        if transform_array is None:
+            transform_array = np.tile(np.identity(4), (len(self.link_array), 1, 1))
+        self.transform_array = np.array(transform_array, dtype=float).reshape((-1, 4, 4))
+        if sheet_array is None:
+            sheet_array = np.zeros(len(self.link_array))
+        self.sheet_array = np.array(sheet_array, dtype=np.int32).reshape(-1)
+        self._adjacency = None
+
+    def adjacency(self) -> (np.ndarray, np.ndarray):
+        """ Hub to link adjacency in CSR format (offsets (H + 1,), link indices (2L,)):
+        the links connected to hub i are link_indices[offsets[i]:offsets[i + 1]]. """
+        if self._adjacency is None:
+            link_hubs = self.link_array.ravel()
+            offsets = np.zeros(len(self.hub_array) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(link_hubs, minlength=len(self.hub_array)))
+            link_indices = (np.argsort(link_hubs, kind="stable") // 2).astype(np.int32)
+            self._adjacency = (offsets, link_indices)
+        return self._adjacency
+
+    def hub_links(self, hub_index: int) -> np.ndarray:
+        """ Indices of the links connected to the hub at hub_index. """
+        offsets, link_indices = self.adjacency()
+        return link_indices[offsets[hub_index]:offsets[hub_index + 1]]
+
+    def hub_position_array(self, indices=None) -> np.ndarray:
+        """ Returns the assembled hub positions of all links as (N, 2, 2) array, ordered like self.links.
+        indices restricts this (and the batched queries below) to the links at the given indices. """
+        return self.hub_array[self.link_array if indices is None else self.link_array[indices]]
+
+    @profiling.timed("configuration.primitive_transforms")
+    def primitive_transforms(self, indices=None) -> np.ndarray:
+        """Calculates the primitive space transforms of all links at once (N, 4, 4).
+        The results are handed to the links, so subsequent per link queries reuse them.
+        """
+        links = self.links if indices is None else [self.links[index] for index in indices]
+        transforms = utils.primitive_transforms(self.hub_position_array(indices))
+        for link, transform in zip(links, transforms):
+            link._set_primitive_transform(transform)
+        return transforms
+
+    def fabrication_transforms(self, indices=None) -> np.ndarray:
+        """ Returns the transforms from assembled into fabrication space of all links (N, 4, 4). """
+        transform_array = self.transform_array if indices is None else self.transform_array[indices]
+        return transform_array @ self.primitive_transforms(indices)
+
+    def transforms(self, space: ConfigurationSpace, indices=None) -> np.ndarray:
+        """ Returns the transforms from assembled into the given space of all links (N, 4, 4). """
+        if space is ConfigurationSpace.assembled:
+            return np.tile(np.identity(4), (len(self.links) if indices is None else len(indices), 1, 1))
+        elif space is ConfigurationSpace.primitive:
+            return self.primitive_transforms(indices)
+        return self.fabrication_transforms(indices)
+
+    def hub_positions(self, space=ConfigurationSpace.assembled, indices=None) -> np.ndarray:
+        """ Returns the hub positions of all links within the given space as (N, 2, 2) array. """
+        return utils.transform_points(self.transforms(space, indices), self.hub_position_array(indices))
+
+    def label_positions(self, space: ConfigurationSpace, margin=2.5, indices=None) -> np.ndarray:
+        """ Batched version of LinkageLink.get_label_positions, returns a (N, 2, 2) array. """
+        return self.hub_positions(space, indices) + margin
+
+    def cache_info(self) -> dict:
+        """ Sums up the geometry cache hit and miss counts of all links (see LinkageLink.cache_info). """
+        totals = {}
+        for link in self.links:
+            for kind, (hits, misses) in link.cache_info().items():
+                total_hits, total_misses = totals.get(kind, (0, 0))
+                totals[kind] = (total_hits + hits, total_misses + misses)
+        return totals
+
+    def to_dict(self) -> dict:
+        """ Serializes hubs (with their ids), links and fabrication layout into json compatible data. """
+        return {
+            "hubs": [{"id": index + 1, "position": position} for index, position in enumerate(self.hub_array.tolist())],
+            "links": [{
+                "hubs": hubs,
+                "fabrication_transform": transform,
+                "fabrication_sheet": sheet,
+            } for hubs, transform, sheet in zip(self.link_array.tolist(), self.transform_array.tolist(),
+                                                self.sheet_array.tolist())],
+        }
+
+    @staticmethod
+    def from_dict(data: dict):
+        """ Restores a configuration serialized with to_dict. """
+        links = data["links"]
+        return LinkageConfiguration.from_arrays(
+            [hub_data["position"] for hub_data in data["hubs"]],
+            [link_data["hubs"] for link_data in links],
+            [link_data.get("fabrication_transform", np.identity(4)) for link_data in links],
+            [link_data.get("fabrication_sheet", 0) for link_data in links])
+
+    @staticmethod
+    @profiling.timed("configuration.from_line_segments")
+    def from_line_segments(line_segments, tolerance: float = utils.DEFAULT_TOLERANCE):
+        """Creates a configuration from a list of line segments ([[x1, y1], [x2, y2]]).
+        Segment endpoints closer than tolerance (on both axes) are joined into a single hub.
+        """
+        hub_positions = []
+        link_hubs = []
+        hub_index = SpatialHash(tolerance)
+
+        def find_or_create_hub(point):
+            index = hub_index.find(point)
+            if index is None:
+                index = len(hub_positions)
+                hub_index.insert(point, index)
+                hub_positions.append(point)
+            return index
 
         for line_segment in line_segments:
             pointA = [line_segment[0][0], line_segment[0][1]]
             pointB = [line_segment[1][0], line_segment[1][1]]
 
-            hubA = next((h for h in hubs if utils.pointsEqual(h.position, pointA)), LinkageHub(pointA))
-            hubB = next((h for h in hubs if utils.pointsEqual(h.position, pointB)), LinkageHub(pointB))
-            hubs.add(hubA)
-            hubs.add(hubB)
-
-            link = LinkageLink(hubA, hubB)
-            links.append(link)
+            link_hubs.append((find_or_create_hub(pointA), find_or_create_hub(pointB)))
 
-        return LinkageConfiguration(hubs, links)
+        profiling.count("hubs created", len(hub_positions))
+        profiling.count("links created", len(link_hubs))
+        return LinkageConfiguration.from_arrays(hub_positions, link_hubs)
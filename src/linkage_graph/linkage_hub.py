@@ -1,29 +1,69 @@
 from typing import List
-import math
+import numpy as np
+
+
+class _HubStorage:
+    """ Backing storage of a hub created on its own, until a LinkageConfiguration adopts it. """
+
+    __slots__ = ("hub_array",)
+
+    def __init__(self, position):
+        self.hub_array = np.array([[position[0], position[1]]], dtype=float)
+
 
 class LinkageHub:
-    """ ... """
+    """ View on a row of a configuration's (H, 2) hub array.
+    Its id is the row index + 1, so ids only depend on the configuration itself. """
+
+    __slots__ = ("_owner", "index")
 
-    id = 1
+    def __init__(self, position: List[float]):
+        """ Creates a hub on its own, it moves into a configuration's hub array once the configuration is created. """
 
-    def __init__(self, position: List[int]):
-        """ ... """
+        self._owner = _HubStorage(position)
+        self.index = 0
 
-        self.position = position
-        self.id = LinkageHub.id
-        LinkageHub.id = LinkageHub.id + 1
+    @staticmethod
+    def _view(owner, index: int) -> "LinkageHub":
+        """ Creates a hub viewing row index of owner's hub array (see LinkageConfiguration.from_arrays). """
+        hub = LinkageHub.__new__(LinkageHub)
+        hub._owner = owner
+        hub.index = index
+        return hub
+
+    @property
+    def id(self) -> int:
+        return self.index + 1
+
+    @property
+    def position(self) -> np.ndarray:
+        return self._owner.hub_array[self.index]
+
+    @position.setter
+    def position(self, position):
+        self._owner.hub_array[self.index] = position[:2]
 
     def __eq__(self, other):
-        """Overrides the default implementation"""
+        """Hubs are equal when they view the same row of the same hub array. Points within the snapping
+        tolerance are already joined into one hub by from_line_segments (see util.spatial_hash.SpatialHash). """
         if isinstance(other, LinkageHub):
-            return math.isclose(self.position[0], other.position[0]) and math.isclose(self.position[1], other.position[1])
+            return self._owner is other._owner and self.index == other.index
         return False
 
     def __hash__(self):
-        return int(self.position[0] + self.position[1])
+        return hash((id(self._owner), self.index))
 
     def __str__(self):
         return '[{}, {}]'.format(self.position[0], self.position[1])
 
     def get_id(self) -> str:
-        return chr(ord('@') + self.id)
+        return hub_label(self.id)
+
+
+def hub_label(id: int) -> str:
+    """ Spreadsheet style label of a hub id: 1 -> A, 26 -> Z, 27 -> AA, ... """
+    label = ""
+    while id > 0:
+        id, remainder = divmod(id - 1, 26)
+        label = chr(ord('A') + remainder) + label
+    return label
@@ -1,112 +1,254 @@
 from shapely.geometry import LineString, Polygon, Point
+from collections import Counter
 from enum import Enum
 from shapely import affinity
 import numpy as np
 
 from linkage_graph.linkage_hub import LinkageHub
 import util.geometry as utils
+import util.link_geometry as link_geometry
+import util.profiling as profiling
 from util.custom_affinity import get_rotate_matrix, get_translate_matrix, get_scale_matrix
 
 ConfigurationSpace = Enum('ConfigurationSpace', 'assembled primitive fabrication')
 
-class LinkageLink:
-    """ Representing a rigid link as part of a linkage system """
+class _LinkStorage:
+    """ Backing storage of a link created on its own, until a LinkageConfiguration adopts it. """
+
+    __slots__ = ("hubs", "link_array", "transform_array", "sheet_array")
 
     def __init__(self, hub_a: LinkageHub, hub_b: LinkageHub):
-        """ Creat a new link by specifying its two hubs (coordinates in assembled space). """
+        self.hubs = [hub_a, hub_b]
+        self.link_array = np.array([[0, 1]], dtype=np.int32)
+        self.transform_array = np.identity(4)[None].copy()
+        self.sheet_array = np.zeros(1, dtype=np.int32)
 
-        self.hub_a = hub_a
-        self.hub_b = hub_b
-        
-        self.fabrication_transform = np.identity(4)
 
+class LinkageLink:
+    """ Representing a rigid link as part of a linkage system.
+    A view on a row of its configuration's (L, 2) link array and (L, 4, 4) fabrication transform stack. """
+
+    __slots__ = ("_owner", "index", "_cache", "_cached_hub_positions", "cache_hits", "cache_misses")
 
-    def set_fabrication_transform(self, transform_matrix: np.ndarray):
-        """ Set the links transform for the fabrication state. Matrix should assume link being in primitive space. """
+    def __init__(self, hub_a: LinkageHub, hub_b: LinkageHub):
+        """ Creat a new link by specifying its two hubs (coordinates in assembled space). """
+
+        self._owner = _LinkStorage(hub_a, hub_b)
+        self.index = 0
+        self._init_cache()
+
+    @staticmethod
+    def _view(owner, index: int) -> "LinkageLink":
+        """ Creates a link viewing row index of owner's arrays (see LinkageConfiguration.from_arrays). """
+        link = LinkageLink.__new__(LinkageLink)
+        link._owner = owner
+        link.index = index
+        link._init_cache()
+        return link
+
+    def _init_cache(self):
+        # memoized geometry and transforms, valid as long as the hub positions don't change
+        self._cache = {}
+        self._cached_hub_positions = None
+        self.cache_hits = Counter()
+        self.cache_misses = Counter()
+
+    @property
+    def hub_a(self) -> LinkageHub:
+        return self._owner.hubs[self._owner.link_array[self.index, 0]]
+
+    @property
+    def hub_b(self) -> LinkageHub:
+        return self._owner.hubs[self._owner.link_array[self.index, 1]]
+
+    @property
+    def fabrication_transform(self) -> np.ndarray:
+        return self._owner.transform_array[self.index]
+
+    @property
+    def fabrication_sheet(self) -> int:
+        return int(self._owner.sheet_array[self.index])
+
+    def set_fabrication_transform(self, transform_matrix: np.ndarray, sheet: int = 0):
+        """ Set the links transform for the fabrication state. Matrix should assume link being in primitive space. 
+        sheet is the index of the sheet the link is placed on.
+        """
         
         if transform_matrix.shape != (4,4):
             raise ValueError("Expected transforms format: 4x4 matrix")
 
-        self.fabrication_transform = transform_matrix
+        self._owner.transform_array[self.index] = transform_matrix
+        self._owner.sheet_array[self.index] = sheet
+        self._invalidate(ConfigurationSpace.fabrication)
+
+    def cache_info(self) -> dict:
+        """ Returns hit and miss counts of the geometry cache per cached kind, e.g. {'geometry': (hits, misses)}. """
+        kinds = set(self.cache_hits) | set(self.cache_misses)
+        return {kind: (self.cache_hits[kind], self.cache_misses[kind]) for kind in sorted(kinds)}
+
+    def clear_cache(self):
+        """ Drops all memoized geometry and resets the hit and miss counters. """
+        self._cache.clear()
+        self._cached_hub_positions = None
+        self.cache_hits.clear()
+        self.cache_misses.clear()
 
     def get_hub_a_position(self, space=ConfigurationSpace.assembled):
-        assembled_position = self.hub_a.position
-        
         if space is ConfigurationSpace.assembled:
-            return assembled_position
-        
-        primitive_transform = self._get_primitive_transform()
+            return self.hub_a.position
 
-        if space is ConfigurationSpace.primitive:
-            return affinity.affine_transform(Point(self.hub_a.position), utils.matrix_to_shapely(primitive_transform))
-        elif space is ConfigurationSpace.fabrication:
-            transform = self.fabrication_transform @ primitive_transform
-            return affinity.affine_transform(Point(self.hub_a.position), utils.matrix_to_shapely(transform))
+        return Point(self._transform_position(self.hub_a.position, space))
 
     def get_hub_b_position(self, space=ConfigurationSpace.assembled):
-        assembled_position = self.hub_b.position
-
         if space is ConfigurationSpace.assembled:
-            return assembled_position
+            return self.hub_b.position
 
-        primitive_transform = self._get_primitive_transform()
-
-        if space is ConfigurationSpace.primitive:
-            return affinity.affine_transform(Point(self.hub_b.position), utils.matrix_to_shapely(primitive_transform))
-        elif space is ConfigurationSpace.fabrication:
-            transform = self.fabrication_transform @ primitive_transform
-            return affinity.affine_transform(Point(self.hub_b.position), utils.matrix_to_shapely(transform))
+        return Point(self._transform_position(self.hub_b.position, space))
 
     def get_label_positions(self, space: ConfigurationSpace, margin=2.5):
-        translated_hub_a_position = affinity.translate(
-            Point(self.get_hub_a_position(space)), margin, margin)
-        translated_hub_b_position = affinity.translate(
-            Point(self.get_hub_b_position(space)), margin, margin)
-        return (translated_hub_a_position, translated_hub_b_position)
+        positions = self.hub_positions(space) + margin
+        return (Point(positions[0]), Point(positions[1]))
 
+    def hub_positions(self, space=ConfigurationSpace.assembled) -> np.ndarray:
+        """ Returns the positions of hub a and b within the given space as (2, 2) array. """
+        if space is ConfigurationSpace.assembled:
+            return np.array((self.hub_a.position[:2], self.hub_b.position[:2]))
+        return utils.transform_points(self._get_transform(space), [self.hub_a.position[:2], self.hub_b.position[:2]])
 
-    def as_polygon(self, space=ConfigurationSpace.assembled, linkage_radius=7.5, joint_radius = 1) -> Polygon:
+
+    def as_polygon(self, space=ConfigurationSpace.assembled, linkage_radius=7.5, joint_radius = 1,
+                   kernel=link_geometry.DEFAULT_KERNEL, chord_tolerance: float = None) -> Polygon:
         """Creates a polygon representation of this link.
         
         Different spaces are supported, either:
          assembled space: where links are rendered as they were created, within a connected configuration
          primitive space: where links are consistenlty aligned with the y-axis and centered within the origin
          fabrication space: where links are positioned according to a fabrication transform (see set_fabrication_transform)
+
+        kernel selects how the geometry is built (see util.link_geometry.KERNELS): 'shapely' buffers and subtracts
+        Shapely geometry, the analytic kernels ('arc' and 'polyline') approximate arcs within chord_tolerance.
+        Without chord_tolerance the analytic kernels use link_geometry.DEFAULT_CHORD_TOLERANCE and Shapely
+        its default buffer resolution.
         """
-        link_polygon = self._create_geometry(linkage_radius, joint_radius)
+        if kernel != "shapely":
+            kernel = "polyline"
+        return self._cached(("polygon", space, linkage_radius, joint_radius, kernel, chord_tolerance),
+                            lambda: self._create_polygon(space, linkage_radius, joint_radius, kernel, chord_tolerance))
+
+    def get_id(self) -> str:
+        return '{}|{}'.format(self.hub_a.get_id(), self.hub_b.get_id())
+
+    @profiling.timed("link.create_polygon")
+    def _create_polygon(self, space, linkage_radius, joint_radius, kernel, chord_tolerance) -> Polygon:
+        if space is not ConfigurationSpace.assembled and self._is_analytic(kernel, linkage_radius, joint_radius):
+            # the outline is symmetric to the link axis, building it from the transformed hubs equals transforming it
+            return self._analytic_polygon(self.hub_positions(space), linkage_radius, joint_radius, chord_tolerance)
+
+        link_polygon = self._get_geometry(linkage_radius, joint_radius, kernel, chord_tolerance)
 
         if space is ConfigurationSpace.assembled:
             return link_polygon
 
+        profiling.count("shapely operations")
+        return affinity.affine_transform(link_polygon, utils.matrix_to_shapely(self._get_transform(space)))
+
+    def _get_transform(self, space: ConfigurationSpace) -> np.ndarray:
+        """ Returns the transform from assembled into the given space. """
+        if space is ConfigurationSpace.assembled:
+            return np.identity(4)
+
         primitive_transform = self._get_primitive_transform()
         if space is ConfigurationSpace.primitive:
-            return affinity.affine_transform(link_polygon, utils.matrix_to_shapely(primitive_transform))
-        elif space is ConfigurationSpace.fabrication:
-            transform = self.fabrication_transform @ primitive_transform
-            return affinity.affine_transform(link_polygon, utils.matrix_to_shapely(transform))
+            return primitive_transform
+        return self.fabrication_transform @ primitive_transform
 
+    def _transform_position(self, position, space: ConfigurationSpace) -> np.ndarray:
+        return utils.transform_points(self._get_transform(space), [position[:2]])[0]
 
-        return link_polygon
-
-    def get_id(self) -> str:
-        return '{}|{}'.format(self.hub_a.get_id(), self.hub_b.get_id())
+    def _cached(self, key, create):
+        """Returns the memoized value for key, calling create on a miss. 
+        The first element of key names the kind of cached value (used for the hit/miss counters),
+        the second one may be a ConfigurationSpace (used for invalidation).
+        """
+        self._sync_cache()
+        if key in self._cache:
+            self.cache_hits[key[0]] += 1
+            return self._cache[key]
+
+        self.cache_misses[key[0]] += 1
+        value = create()
+        self._cache[key] = value
+        return value
+
+    def _sync_cache(self):
+        """ Drops all memoized values if the hubs moved since the cache was filled. """
+        hub_positions = (self.hub_a.position[0], self.hub_a.position[1],
+                         self.hub_b.position[0], self.hub_b.position[1])
+        if hub_positions != self._cached_hub_positions:
+            self._cache.clear()
+            self._cached_hub_positions = hub_positions
+
+    def _invalidate(self, space: ConfigurationSpace):
+        for key in [key for key in self._cache if len(key) > 1 and key[1] is space]:
+            del self._cache[key]
+
+    def _get_geometry(self, linkage_radius=7.5, joint_radius=1, kernel=link_geometry.DEFAULT_KERNEL,
+                      chord_tolerance=None):
+        if kernel != "shapely":
+            kernel = "polyline"
+        return self._cached(("geometry", linkage_radius, joint_radius, kernel, chord_tolerance),
+                            lambda: self._create_geometry(linkage_radius, joint_radius, kernel, chord_tolerance))
+
+    @profiling.timed("link.create_geometry")
+    def _create_geometry(self, linkage_radius=7.5, joint_radius= 1, kernel=link_geometry.DEFAULT_KERNEL,
+                         chord_tolerance=None):
+        if self._is_analytic(kernel, linkage_radius, joint_radius):
+            return self._analytic_polygon(self.hub_positions(), linkage_radius, joint_radius, chord_tolerance)
 
-    def _create_geometry(self, linkage_radius=7.5, joint_radius= 1):
         line = LineString([self.hub_a.position, self.hub_b.position])
 
-        hub_a_polygon = Point(self.hub_a.position).buffer(joint_radius)
-        hub_b_polygon = Point(self.hub_b.position).buffer(joint_radius)
-        link_polygon = line.buffer(linkage_radius)
+        hub_a_polygon = Point(self.hub_a.position).buffer(joint_radius, _resolution(joint_radius, chord_tolerance))
+        hub_b_polygon = Point(self.hub_b.position).buffer(joint_radius, _resolution(joint_radius, chord_tolerance))
+        link_polygon = line.buffer(linkage_radius, _resolution(linkage_radius, chord_tolerance))
         link_polygon = link_polygon.difference(hub_a_polygon)
         link_polygon = link_polygon.difference(hub_b_polygon)
+        profiling.count("shapely operations", 5)
         return link_polygon
 
+    def _is_analytic(self, kernel, linkage_radius, joint_radius) -> bool:
+        """ Whether the analytic kernel applies, links too short for separate holes fall back to Shapely. """
+        if kernel == "shapely":
+            return False
+        return bool(link_geometry.is_simple(self.hub_positions(), linkage_radius, joint_radius)[0])
+
+    @staticmethod
+    def _analytic_polygon(hub_positions, linkage_radius, joint_radius, chord_tolerance) -> Polygon:
+        if chord_tolerance is None:
+            chord_tolerance = link_geometry.DEFAULT_CHORD_TOLERANCE
+        outlines, holes = link_geometry.link_rings(hub_positions, linkage_radius, joint_radius, chord_tolerance)
+        return Polygon(outlines[0], list(holes[0]))
+
     def _get_primitive_transform(self) -> np.ndarray:
+        return self._cached(("primitive_transform",), self._create_primitive_transform)
+
+    def _set_primitive_transform(self, transform: np.ndarray):
+        """ Stores an externally computed primitive transform (see LinkageConfiguration.primitive_transforms). """
+        self._sync_cache()
+        key = ("primitive_transform",)
+        if key in self._cache and np.array_equal(self._cache[key], transform):
+            return
+
+        self._cache[key] = transform
+        self._invalidate(ConfigurationSpace.primitive)
+        self._invalidate(ConfigurationSpace.fabrication)
+
+    @profiling.timed("link.create_primitive_transform")
+    def _create_primitive_transform(self) -> np.ndarray:
         """Calculates a transform matrix moving this links polygon into primitive space, 
         i.e. centers it within the origin, aligns the rotated bounding box 
         with the coordinate axis and rotates the longest side to be parallel with the y axis.
         """
-        original_polygon = self._create_geometry()
+        original_polygon = self._get_geometry()
         # 1. Mirror y axis
         # y axis in svg space is mirrored
         mirror_matrix = get_scale_matrix(
@@ -162,6 +304,24 @@ class LinkageLink:
                 polygon, orientation_matrix)
             orientation_transforms = utils.shapely_to_4x4_matrix(
                 orientation_matrix)
+            profiling.count("shapely operations")
+
+        transform = orientation_transforms @ centering_rotation_transforms @ centering_transforms @ mirror_transforms
+
+        # 5. The first edge of the rotated rectangle decides which end points up, its vertex order depends on the
+        # outline and the Shapely version. Turn the link so the first hub ends up where utils.first_hub_up says.
+        hub_positions = np.array([self.hub_a.position[:2], self.hub_b.position[:2]], dtype=float)
+        hub_a_up = utils.transform_points(transform, hub_positions[:1])[0][1] > 0
+        if hub_a_up != utils.first_hub_up(hub_positions)[0]:
+            transform = np.diag([-1.0, -1.0, 1.0, 1.0]) @ transform
+
+        profiling.count("shapely operations", 5)
+        return transform
+
 
-        return orientation_transforms @ centering_rotation_transforms @ centering_transforms @ mirror_transforms
 
+def _resolution(radius: float, chord_tolerance: float = None) -> int:
+    """ Segments per quarter circle of a Shapely buffer, Shapely's default of 16 without chord_tolerance. """
+    if chord_tolerance is None:
+        return 16
+    return link_geometry.arc_segment_count(radius, np.pi / 2, chord_tolerance)
@@ -0,0 +1,350 @@
+"""Nesting engines used to lay out links on sheets for fabrication.
+
+All engines pack axis aligned rectangles (the padded primitive space bounds of links) into
+sheets of a fixed size, opening new sheets when a part doesn't fit anymore.
+"""
+
+import math
+import numpy as np
+
+EPSILON = 1e-9
+
+
+class Packer:
+    """Base class of nesting engines. Subclasses implement _new_sheet and _insert."""
+
+    def __init__(self, width: float, height: float, allow_rotation: bool = False, open_sheets: int = 2):
+        self.width = width
+        self.height = height
+        self.allow_rotation = allow_rotation
+        # only the most recent sheets are considered for new parts, which bounds the placement cost
+        # on large jobs. Earlier sheets only have small gaps left since parts are placed by decreasing size.
+        self.open_sheets = open_sheets
+
+    def pack(self, sizes, sheets: list = None) -> list:
+        """Packs rectangles given as (width, height) tuples.
+
+        Returns a (sheet, x, y, rotated) tuple for every rectangle, in input order, where (x, y) is
+        the rectangle's corner with the smallest coordinates and rotated tells whether it was turned by 90°.
+        sheets continues filling already used sheets (states as left by earlier packing, see
+        MaxRectsPacker.used_sheet), it is updated in place and new sheets are appended to it.
+        """
+        placements = [None] * len(sizes)
+        sheets = [] if sheets is None else sheets
+        # per sheet the sizes of parts that didn't fit anymore, sheets only get fuller
+        # so any part at least as large won't fit either
+        failed_sizes = [[] for _ in sheets]
+        # large parts first, small ones fill the gaps
+        order = sorted(range(len(sizes)), key=lambda i: (-max(sizes[i]), -min(sizes[i]), i))
+        for index in order:
+            width, height = sizes[index]
+            if not self._fits_empty_sheet(width, height):
+                raise ValueError("Part of size {:g}x{:g} doesn't fit onto a {:g}x{:g} sheet".format(
+                    width, height, self.width, self.height))
+
+            first_open_sheet = max(len(sheets) - self.open_sheets, 0) if self.open_sheets else 0
+            for sheet_index in range(first_open_sheet, len(sheets)):
+                sheet = sheets[sheet_index]
+                if any(self._at_least_as_large(width, height, *failed) for failed in failed_sizes[sheet_index]):
+                    continue
+                placement = self._insert(sheet, width, height)
+                if placement is not None:
+                    break
+                failed_sizes[sheet_index] = [failed for failed in failed_sizes[sheet_index]
+                                             if not self._at_least_as_large(*failed, width, height)]
+                failed_sizes[sheet_index].append((width, height))
+            else:
+                sheets.append(self._new_sheet())
+                failed_sizes.append([])
+                sheet_index = len(sheets) - 1
+                placement = self._insert(sheets[-1], width, height)
+
+            placements[index] = (sheet_index,) + placement
+        return placements
+
+    def _fits_empty_sheet(self, width, height) -> bool:
+        if width <= self.width + EPSILON and height <= self.height + EPSILON:
+            return True
+        return self.allow_rotation and height <= self.width + EPSILON and width <= self.height + EPSILON
+
+    def _at_least_as_large(self, width, height, other_width, other_height) -> bool:
+        if width >= other_width and height >= other_height:
+            return True
+        return self.allow_rotation and height >= other_width and width >= other_height
+
+    def _orientations(self, width, height):
+        yield width, height, False
+        if self.allow_rotation and not math.isclose(width, height):
+            yield height, width, True
+
+    def _new_sheet(self):
+        raise NotImplementedError
+
+    def _insert(self, sheet, width, height):
+        """Places a rectangle on the given sheet, returns (x, y, rotated) or None if it doesn't fit."""
+        raise NotImplementedError
+
+
+class SkylinePacker(Packer):
+    """Bottom-left skyline packing: a sheet is represented by the upper contour of the placed parts."""
+
+    def _new_sheet(self):
+        # skyline segments [x, y, width]
+        return [[0.0, 0.0, self.width]]
+
+    def _insert(self, skyline, width, height):
+        best = None
+        for part_width, part_height, rotated in self._orientations(width, height):
+            for index in range(len(skyline)):
+                y = self._fit(skyline, index, part_width, part_height)
+                if y is None:
+                    continue
+                score = (y + part_height, skyline[index][0])
+                if best is None or score < best[0]:
+                    best = (score, index, y, part_width, part_height, rotated)
+
+        if best is None:
+            return None
+
+        _, index, y, part_width, part_height, rotated = best
+        x = skyline[index][0]
+        self._add_segment(skyline, index, x, y + part_height, part_width)
+        return (x, y, rotated)
+
+    def _fit(self, skyline, index, width, height):
+        x = skyline[index][0]
+        if x + width > self.width + EPSILON:
+            return None
+
+        y = 0.0
+        remaining = width
+        while remaining > EPSILON:
+            y = max(y, skyline[index][1])
+            remaining -= skyline[index][2]
+            index += 1
+
+        if y + height > self.height + EPSILON:
+            return None
+        return y
+
+    @staticmethod
+    def _add_segment(skyline, index, x, y, width):
+        skyline.insert(index, [x, y, width])
+
+        # shrink or drop the segments now covered by the new one
+        next_index = index + 1
+        while next_index < len(skyline):
+            segment = skyline[next_index]
+            covered = x + width - segment[0]
+            if covered <= EPSILON:
+                break
+            if covered < segment[2] - EPSILON:
+                segment[0] += covered
+                segment[2] -= covered
+                break
+            del skyline[next_index]
+
+        # merge neighbours of equal height
+        index = 0
+        while index < len(skyline) - 1:
+            if math.isclose(skyline[index][1], skyline[index + 1][1]):
+                skyline[index][2] += skyline[index + 1][2]
+                del skyline[index + 1]
+            else:
+                index += 1
+
+
+class MaxRectsPacker(Packer):
+    """MaxRects packing with the best short side fit heuristic.
+    Tracks all maximal free rectangles per sheet, packs tighter than the skyline but is slower.
+    """
+
+    def _new_sheet(self):
+        # free rectangles (x, y, width, height)
+        return [(0.0, 0.0, self.width, self.height)]
+
+    def used_sheet(self, used_rectangles) -> list:
+        """State of a sheet whose given rectangles (x, y, width, height) are taken already, e.g. by parts
+        placed with another engine, for packing further parts into the remaining space (see pack). """
+        free_rectangles = self._new_sheet()
+        for used in used_rectangles:
+            self._split(free_rectangles, used)
+        return free_rectangles
+
+    def _insert(self, free_rectangles, width, height):
+        best = None
+        for part_width, part_height, rotated in self._orientations(width, height):
+            for free_x, free_y, free_width, free_height in free_rectangles:
+                if part_width > free_width + EPSILON or part_height > free_height + EPSILON:
+                    continue
+                leftover_horizontal = free_width - part_width
+                leftover_vertical = free_height - part_height
+                score = (min(leftover_horizontal, leftover_vertical), max(leftover_horizontal, leftover_vertical))
+                if best is None or score < best[0]:
+                    best = (score, free_x, free_y, part_width, part_height, rotated)
+
+        if best is None:
+            return None
+
+        _, x, y, part_width, part_height, rotated = best
+        self._split(free_rectangles, (x, y, part_width, part_height))
+        return (x, y, rotated)
+
+    @staticmethod
+    def _split(free_rectangles, used):
+        used_x, used_y, used_width, used_height = used
+        used_right = used_x + used_width
+        used_bottom = used_y + used_height
+
+        new_rectangles = []
+        index = 0
+        while index < len(free_rectangles):
+            x, y, width, height = free_rectangles[index]
+            right = x + width
+            bottom = y + height
+            if used_x >= right - EPSILON or used_right <= x + EPSILON or \
+                    used_y >= bottom - EPSILON or used_bottom <= y + EPSILON:
+                index += 1
+                continue
+
+            del free_rectangles[index]
+            if used_x > x + EPSILON:
+                new_rectangles.append((x, y, used_x - x, height))
+            if used_right < right - EPSILON:
+                new_rectangles.append((used_right, y, right - used_right, height))
+            if used_y > y + EPSILON:
+                new_rectangles.append((x, y, width, used_y - y))
+            if used_bottom < bottom - EPSILON:
+                new_rectangles.append((x, used_bottom, width, bottom - used_bottom))
+
+        # only keep maximal rectangles, the remaining old ones are maximal among themselves already
+        maximal_new = []
+        for index, rectangle in enumerate(new_rectangles):
+            contained = any(MaxRectsPacker._contains(other, rectangle) for other in free_rectangles) or \
+                any(MaxRectsPacker._contains(other, rectangle) and (other != rectangle or other_index < index)
+                    for other_index, other in enumerate(new_rectangles) if other_index != index)
+            if not contained:
+                maximal_new.append(rectangle)
+
+        free_rectangles[:] = [rectangle for rectangle in free_rectangles
+                              if not any(MaxRectsPacker._contains(other, rectangle) for other in maximal_new)]
+        free_rectangles.extend(maximal_new)
+
+    @staticmethod
+    def _contains(outer, inner) -> bool:
+        return inner[0] >= outer[0] - EPSILON and inner[1] >= outer[1] - EPSILON and \
+            inner[0] + inner[2] <= outer[0] + outer[2] + EPSILON and \
+            inner[1] + inner[3] <= outer[1] + outer[3] + EPSILON
+
+
+class ProfilePacker(Packer):
+    """Polygon aware skyline packing for stadium shaped links.
+
+    The sheet is sampled into columns of the given resolution. Parts are dropped onto the height map
+    using the exact profile of their rounded ends, so the ends of neighbouring links interleave.
+    """
+
+    def __init__(self, width: float, height: float, allow_rotation: bool = False, open_sheets: int = 2,
+                 resolution: float = 0.5):
+        super().__init__(width, height, allow_rotation, open_sheets)
+        self.resolution = resolution
+        self.columns = int(math.floor(width / resolution + EPSILON))
+        self._profiles = {}
+
+    def _new_sheet(self):
+        return np.zeros(self.columns)
+
+    def _insert(self, height_map, width, height):
+        if height_map.min() + min(width, height) > self.height + EPSILON:
+            # sheet is full
+            return None
+
+        best = None
+        for part_width, part_height, rotated in self._orientations(width, height):
+            bottom, top = self._profile(part_width, part_height)
+            if len(bottom) > self.columns:
+                continue
+            landing = self._landing(height_map, bottom)
+            column = int(np.argmin(landing))
+            y = max(landing[column], 0.0)
+            if y + part_height > self.height + EPSILON:
+                continue
+            score = (y + part_height, column)
+            if best is None or score < best[0]:
+                best = (score, column, y, top, rotated)
+
+        if best is None:
+            return None
+
+        _, column, y, top, rotated = best
+        height_map[column:column + len(top)] = y + top
+        return (column * self.resolution, y, rotated)
+
+    @staticmethod
+    def _landing(height_map, bottom):
+        """Returns the height at which a part with the given lower contour comes to rest, for every column. """
+        positions = len(height_map) - len(bottom) + 1
+        flat = np.flatnonzero(bottom <= EPSILON)
+        landing = np.zeros(positions)
+        if flat.size:
+            # the contour is flat between the rounded ends, a sliding maximum covers that section
+            start, end = flat[0], flat[-1] + 1
+            landing = ProfilePacker._sliding_max(height_map[start:start + positions + end - start - 1], end - start)
+        for index in np.flatnonzero(bottom > EPSILON):
+            landing = np.maximum(landing, height_map[index:index + positions] - bottom[index])
+        return landing
+
+    @staticmethod
+    def _sliding_max(values, window):
+        """Maximum of every window of the given size, by doubling the covered span (O(n log window)). """
+        result = values
+        span = 1
+        while span * 2 <= window:
+            result = np.maximum(result[:-span], result[span:])
+            span *= 2
+        positions = len(values) - window + 1
+        return np.maximum(result[:positions], result[window - span:window - span + positions])
+
+    def _profile(self, width, height):
+        """Returns the lower and upper contour of a stadium part per column, relative to its bounding box. """
+        key = (width, height)
+        if key not in self._profiles:
+            columns = int(math.ceil(width / self.resolution - EPSILON))
+            left = np.arange(columns) * self.resolution
+            right = np.minimum(left + self.resolution, width)
+
+            # the rounded ends are centered on the part's axis, between them the contour is flat.
+            # Use the column point closest to the flat section, so the contour encloses the part over the whole column
+            radius = min(width, height) / 2
+            distance = np.maximum(np.maximum(radius - right, left - (width - radius)), 0.0)
+            offset = radius - np.sqrt(np.clip(radius ** 2 - distance ** 2, 0.0, None))
+            self._profiles[key] = (offset, height - offset)
+        return self._profiles[key]
+
+
+PACKERS = {
+    "skyline": SkylinePacker,
+    "maxrects": MaxRectsPacker,
+    "polygon": ProfilePacker,
+}
+
+
+class NestingResult:
+    """Outcome of a nesting run: the placement of every part and material usage statistics."""
+
+    def __init__(self, placements: list, sheet_size: tuple, part_areas: list):
+        self.placements = placements
+        self.sheet_size = sheet_size
+        self.sheet_count = 1 + max((placement[0] for placement in placements), default=-1)
+
+        sheet_area = sheet_size[0] * sheet_size[1]
+        used_areas = [0.0] * self.sheet_count
+        for placement, area in zip(placements, part_areas):
+            used_areas[placement[0]] += area
+        self.sheet_utilization = [used_area / sheet_area for used_area in used_areas]
+        self.utilization = sum(used_areas) / (sheet_area * self.sheet_count) if self.sheet_count else 0.0
+
+    def __str__(self):
+        return "{} parts on {} sheet(s) of {}x{}, material utilization {:.1%} (per sheet: {})".format(
+            len(self.placements), self.sheet_count, self.sheet_size[0], self.sheet_size[1], self.utilization,
+            ", ".join("{:.1%}".format(utilization) for utilization in self.sheet_utilization))
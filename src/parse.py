@@ -1,16 +1,106 @@
+import io
+import math
+import os
+from typing import List
+
 from linkage_graph.linkage_configuration import LinkageConfiguration
-from slvstopy import Slvstopy
+import util.profiling as profiling
+
+# SolveSpace entity types (see SolveSpace's sketch.h)
+POINT_TYPES = ("2000", "2001")
+LINE_SEGMENT_TYPE = "11000"
+# handle of the "free in 3d" pseudo workplane, lines within a workplane are 2d lines
+FREE_IN_3D = 0
+
+READERS = ("native", "slvstopy")
+
 
-def parse_solvespace_file(file_name: str) -> LinkageConfiguration:
+@profiling.timed("parse")
+def parse_solvespace_file(file_name, reader: str = "native", cross_check: bool = False,
+                          verbose: bool = False) -> LinkageConfiguration:
     """Reads a solve space file containing a linkage and creates a
     LinkageConfiguration according to the contained graph structure.
+
+    reader selects between the lightweight native reader and slvstopy (builds the full solver system).
+    cross_check reads the file with both and raises a ValueError if they disagree.
+    verbose prints the line segments (and for slvstopy all entities) that were read.
+    """
+    if reader not in READERS:
+        raise ValueError("Unknown reader '{}', expected one of: {}".format(reader, ", ".join(READERS)))
+
+    if reader == "native":
+        line_segments = read_line_segments(file_name)
+        if verbose:
+            for line_segment in line_segments:
+                print("line {} -> {}".format(line_segment[0], line_segment[1]))
+    else:
+        line_segments = read_line_segments_slvstopy(file_name, verbose)
+
+    if cross_check:
+        with profiling.span("parse.cross_check"):
+            other_segments = (read_line_segments_slvstopy(file_name) if reader == "native"
+                              else read_line_segments(file_name))
+            compare_line_segments(line_segments, other_segments)
+
+    return LinkageConfiguration.from_line_segments(line_segments)
+
+
+@profiling.timed("parse.read_line_segments")
+def read_line_segments(source) -> List[list]:
+    """Extracts all 2d line segments ([[x1, y1], [x2, y2]]) from a solve space file without building a solver system.
+
+    source may be a file name, the file content as bytes or a (binary or text) file object.
+    The file is read line by line, only params and entities are kept. Malformed files raise a ValueError.
     """
+    params = {}
+    points = {}
+    lines = []
+    block = {}
+
+    for line_number, line in enumerate(_text_lines(source), 1):
+        line = line.strip()
+        if line.startswith(("Param.", "Entity.")):
+            key, _, value = line.partition("=")
+            block[key] = value
+        elif line in ("AddParam", "AddEntity"):
+            try:
+                _add_block(line, block, params, points, lines)
+            except (KeyError, ValueError) as error:
+                raise ValueError("Malformed {} in line {}: {}".format(line[3:].lower(), line_number, error))
+            block = {}
+        elif line.startswith("Add"):
+            # other sections (groups, requests, constraints, styles) aren't needed
+            block = {}
+
+    profiling.count("line segments read", len(lines))
+    return [[_point_position(handle, params, points) for handle in line] for line in lines]
+
+
+def _add_block(kind: str, block: dict, params: dict, points: dict, lines: list):
+    """Adds a param or entity block (key -> value) read by read_line_segments. """
+    if kind == "AddParam":
+        params[int(block["Param.h.v."], 16)] = float(block.get("Param.val", 0.0))
+        return
+    entity_type = block.get("Entity.type")
+    if entity_type == LINE_SEGMENT_TYPE and int(block.get("Entity.workplane.v", "0"), 16) != FREE_IN_3D:
+        lines.append((int(block["Entity.point[0].v"], 16), int(block["Entity.point[1].v"], 16)))
+    elif entity_type in POINT_TYPES:
+        points[int(block["Entity.h.v"], 16)] = (float(block.get("Entity.actPoint.x", 0.0)),
+                                                float(block.get("Entity.actPoint.y", 0.0)))
+
+
+@profiling.timed("parse.read_line_segments_slvstopy")
+def read_line_segments_slvstopy(file_name: str, verbose: bool = False) -> List[list]:
+    """Extracts all 2d line segments by building the full solver system with slvstopy. """
+    from slvstopy import Slvstopy
+
     system_factory = Slvstopy(file_name)
     system, entities = system_factory.generate_system()
 
-    for key, entity in entities.items():
-        print(entity)
-        print(system.params(entity.params))
+    if verbose:
+        for key, entity in entities.items():
+            print(entity)
+            print(system.params(entity.params))
 
     entity_list = list(entities.values())
 
@@ -23,5 +113,45 @@ def parse_solvespace_file(file_name: str) -> LinkageConfiguration:
             p2 = system.params(entity_list[index-1].params)
             line_segments.append([p1, p2])
 
-    return LinkageConfiguration.from_line_segments(line_segments)
-    
+    return line_segments
+
+
+def compare_line_segments(line_segments: List[list], other_segments: List[list], tolerance: float = 1e-6):
+    """Raises a ValueError unless both lists contain the same segments (in any order and direction). """
+    def normalized(segments):
+        result = []
+        for segment in segments:
+            a = (float(segment[0][0]), float(segment[0][1]))
+            b = (float(segment[1][0]), float(segment[1][1]))
+            result.append(min(a, b) + max(a, b))
+        return sorted(result)
+
+    if len(line_segments) != len(other_segments):
+        raise ValueError("Readers disagree: {} vs {} line segments".format(len(line_segments), len(other_segments)))
+    for segment, other in zip(normalized(line_segments), normalized(other_segments)):
+        if not all(math.isclose(value, other_value, abs_tol=tolerance) for value, other_value in zip(segment, other)):
+            raise ValueError("Readers disagree on line segment {} vs {}".format(segment, other))
+
+
+def _point_position(handle: int, params: dict, points: dict) -> list:
+    # points generated by a request store their coordinates in the request's params
+    # 16 + 3 * i (+ 0, 1, 2 for x, y, z), where i + 1 is the low word of the point's handle
+    request = handle >> 16
+    param = (request << 16) | (16 + 3 * ((handle & 0xFFFF) - 1))
+    if param in params and param + 1 in params:
+        return [params[param], params[param + 1]]
+    if handle in points:
+        return list(points[handle])
+    raise ValueError("Point entity {:08x} not found".format(handle))
+
+
+def _text_lines(source):
+    # the file starts with a binary magic, latin-1 decodes any byte
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="latin-1") as file:
+            yield from file
+        return
+    for line in source:
+        yield line.decode("latin-1") if isinstance(line, bytes) else line
@@ -0,0 +1,233 @@
+"""In-memory rendering API for long running processes, plus a small http front end for testing.
+
+render() takes an input file name or the file content as bytes and returns all rendered svgs as bytes,
+nothing is written to disk. Every call works on its own freshly parsed configuration and there is no shared
+mutable state between calls, so render() may run concurrently in a thread pool or via render_async()
+from asyncio.
+
+Run the http front end with:
+    python3 src/service.py --port 8000
+    curl --data-binary @sample/saxena.slvs "http://localhost:8000/render?sheet=500x500"
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from parse import parse_solvespace_file
+from export import render_layout, ASSEMBLY_SUFFIX, OUTPUT_FORMATS
+from nesting import PACKERS
+import util.link_geometry as link_geometry
+
+
+# content types of the fabrication output formats
+CONTENT_TYPES = {"svg": "image/svg+xml", "dxf": "image/vnd.dxf", "gcode": "text/x-gcode"}
+
+
+class RenderResult:
+    """Rendered outputs (bytes) of a linkage: one fabrication svg (or dxf, G-code) per sheet and the assembly manual,
+    which is an overview of the manual's pages if it is tiled. compressed tells whether the outputs are gzipped."""
+
+    def __init__(self, fabrication: list, assembly: bytes, report, link_count: int, pages: list = None,
+                 compressed: bool = False):
+        self.fabrication = fabrication
+        self.assembly = assembly
+        self.report = report
+        self.link_count = link_count
+        self.pages = [] if pages is None else pages
+        self.compressed = compressed
+
+    def outputs(self) -> dict:
+        """All svgs keyed by the file name suffix render_fabrication_layout would use. """
+        return dict(zip(self.report.suffixes, self.fabrication + self.pages + [self.assembly]))
+
+    def to_dict(self) -> dict:
+        """Json compatible summary including the (uncompressed) svgs as text. """
+        return {
+            "links": self.link_count,
+            "sheets": len(self.fabrication),
+            "report": str(self.report),
+            "fabrication": [self._text(svg) for svg in self.fabrication],
+            "assembly": self._text(self.assembly),
+            "pages": [self._text(svg) for svg in self.pages],
+        }
+
+    def _text(self, output: bytes) -> str:
+        return (gzip.decompress(output) if self.compressed else output).decode("utf-8")
+
+
+def render(source, render_options: dict = None, parse_options: dict = None, compress: bool = False) -> RenderResult:
+    """Parses source (a .slvs file name or its content as bytes) and renders it in memory.
+
+    render_options and parse_options are passed on to render_layout and parse_solvespace_file,
+    compress gzips the svgs (as written to .svgz files).
+    """
+    render_options = {} if render_options is None else render_options
+    parse_options = {} if parse_options is None else parse_options
+    if isinstance(source, (bytes, bytearray)) and (parse_options.get("reader", "native") != "native"
+                                                   or parse_options.get("cross_check")):
+        raise ValueError("Only the native reader supports rendering from bytes")
+
+    linkage_configuration = parse_solvespace_file(source, **parse_options)
+
+    outputs = {}
+
+    @contextlib.contextmanager
+    def open_output(suffix):
+        stream = io.StringIO()
+        yield stream
+        outputs[suffix] = stream.getvalue().encode("utf-8")
+
+    report = render_layout(linkage_configuration, open_output, **render_options)
+    svgs = [_compressed(outputs[suffix]) if compress else outputs[suffix] for suffix in report.suffixes]
+    sheet_count = report.nesting.sheet_count
+    return RenderResult(svgs[:sheet_count], svgs[-1], report, len(linkage_configuration.links),
+                        svgs[sheet_count:-1], compress)
+
+
+async def render_async(source, render_options: dict = None, parse_options: dict = None, compress: bool = False,
+                       executor=None) -> RenderResult:
+    """render() run in executor (default: the event loop's default thread pool). """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, render, source, render_options, parse_options, compress)
+
+
+def _compressed(data: bytes) -> bytes:
+    # fixed mtime keeps the output byte-for-byte stable, like svg_writer.open_svg_file
+    return gzip.compress(data, mtime=0)
+
+
+def render_options_from_query(query: dict) -> dict:
+    """Render options from url query parameters: sheet=WxH, nesting=NAME, rotate=1, optimize_toolpath=1,
+    geometry=KERNEL, format=svg|dxf|gcode, symbols=1, chord_tolerance=MM, decimals=N, simplify=MM,
+    manual_tiles=WxH. """
+    def flag(name):
+        return query.get(name, ["0"])[0].lower() in ("1", "true", "yes")
+
+    def number(name, convert):
+        return convert(query[name][0]) if name in query else None
+
+    options = {
+        "sheet": tuple(float(size) for size in query.get("sheet", ["1000x1000"])[0].lower().split("x")),
+        "nesting": query.get("nesting", ["skyline"])[0],
+        "allow_rotation": flag("rotate"),
+        "optimize_toolpath": flag("optimize_toolpath"),
+        "geometry": query.get("geometry", [link_geometry.DEFAULT_KERNEL])[0],
+        "output_format": query.get("format", ["svg"])[0],
+        "symbols": flag("symbols"),
+        "chord_tolerance": number("chord_tolerance", float),
+        "decimals": number("decimals", int),
+        "simplify": number("simplify", float),
+        "manual_tiles": tuple(float(size) for size in query["manual_tiles"][0].lower().split("x"))
+        if "manual_tiles" in query else None,
+    }
+    if len(options["sheet"]) != 2 or min(options["sheet"]) <= 0:
+        raise ValueError("Expected sheet size as WIDTHxHEIGHT of two positive numbers")
+    if options["manual_tiles"] is not None and (len(options["manual_tiles"]) != 2 or min(options["manual_tiles"]) <= 0):
+        raise ValueError("Expected manual page size as WIDTHxHEIGHT of two positive numbers")
+    if options["nesting"] not in PACKERS:
+        raise ValueError("Unknown nesting engine '{}'".format(options["nesting"]))
+    if options["geometry"] not in link_geometry.KERNELS:
+        raise ValueError("Unknown geometry kernel '{}'".format(options["geometry"]))
+    if options["output_format"] not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format '{}'".format(options["output_format"]))
+    return options
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """POST /render with the .slvs file as request body, render options as query parameters.
+
+    Responds with a json summary of all svgs, or a single svg with output=assembly (and page=N for page N
+    of a tiled manual, starting at 1) or output=fabrication (and page=N for sheet N, starting at 1).
+    """
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._respond(200, "text/plain", b"ok")
+        else:
+            self._respond(404, "text/plain", b"not found")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/render":
+            self._respond(404, "text/plain", b"not found")
+            return
+
+        query = parse_qs(url.query)
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            result = render(body, render_options_from_query(query))
+        except ValueError as error:
+            # invalid options or input files
+            self._respond(400, "text/plain", "{}: {}".format(type(error).__name__, error).encode("utf-8"))
+            return
+        except Exception as error:
+            self._respond(500, "text/plain", "{}: {}".format(type(error).__name__, error).encode("utf-8"))
+            return
+
+        output = query.get("output", [None])[0]
+        if output == "assembly" and "page" in query:
+            page = int(query["page"][0])
+            if not 1 <= page <= len(result.pages):
+                self._respond(404, "text/plain", b"no such page")
+                return
+            self._respond(200, "image/svg+xml", result.pages[page - 1])
+        elif output == "assembly":
+            self._respond(200, "image/svg+xml", result.assembly)
+        elif output == "fabrication":
+            page = int(query.get("page", ["1"])[0])
+            if not 1 <= page <= len(result.fabrication):
+                self._respond(404, "text/plain", b"no such page")
+                return
+            content_type = CONTENT_TYPES[query.get("format", ["svg"])[0]]
+            self._respond(200, content_type, result.fabrication[page - 1])
+        else:
+            self._respond(200, "application/json", json.dumps(result.to_dict()).encode("utf-8"))
+
+    def _respond(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8000, verbose: bool = False) -> ThreadingHTTPServer:
+    """Creates a threaded http server handling every request in its own thread (see RenderRequestHandler). """
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.verbose = verbose
+    return server
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='LinkageFab: Local http front end rendering SolveSpace linkages')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address to listen on.')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='Port to listen on.')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log every request.')
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, args.verbose)
+    print("serving on http://{}:{}/render".format(*server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,267 @@
+"""Kinematic simulation of a linkage configuration over the motion range of a crank.
+
+Hubs are the variables, every link constrains the distance between its two hubs. Fixed hubs keep their
+assembled position, the crank hub is rotated around its pivot. All other hubs are solved with Gauss-Newton
+using minimum norm steps, so under-constrained hubs move as little as possible and redundant links
+(e.g. in parallelograms) don't harm. The steps' normal equations are solved by conjugate gradients on the
+sparse Jacobians (two hubs per link), an iteration costs time linear in the number of links.
+Frames are solved in chunks: a chunk's initial guesses are extrapolated from the previously solved frames
+and refined together in one batched solve. Frames failing to converge that way are solved again one by one,
+warm started from their predecessor. Frames beyond the motion range keep the last reachable pose and are
+reported as not converged.
+"""
+
+from typing import List
+
+import numpy as np
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from svg_writer import Bounds, SvgWriter
+import util.profiling as profiling
+
+# maximum deviation from the link lengths (in mm) accepted as solution
+DEFAULT_TOLERANCE = 1e-7
+
+
+class ConstraintSystem:
+    """Distance constraints of a configuration with its hubs split into prescribed (fixed or driven)
+    and free hubs. The Jacobian is sparse: the row of a link holds d r / d p_a = 2 (p_a - p_b) and
+    d r / d p_b = -2 (p_a - p_b) at its free hubs, nothing else. It is kept as the link deltas (M, B, 2) on the
+    links' hub variables and only applied through products, its transpose sums over a CSR ordering
+    of the links at every free hub."""
+
+    def __init__(self, hub_array: np.ndarray, link_array: np.ndarray, prescribed: set):
+        self.free = np.array([index for index in range(len(hub_array)) if index not in prescribed], dtype=np.int64)
+        # prescribed hubs map onto an extra variable which always stays 0
+        variable_of_hub = np.full(len(hub_array), len(self.free), dtype=np.int64)
+        variable_of_hub[self.free] = np.arange(len(self.free))
+
+        # links between two prescribed hubs are satisfied by construction (or can't be influenced)
+        ends = np.asarray(link_array, dtype=np.int64).reshape((-1, 2))
+        ends = ends[(variable_of_hub[ends] < len(self.free)).any(axis=1)]
+        self.ends = ends
+        self.lengths = np.linalg.norm(hub_array[ends[:, 0]] - hub_array[ends[:, 1]], axis=1)
+        self.variables = variable_of_hub[ends]
+        self.free_ends = (self.variables < len(self.free)).sum(axis=1)
+
+        # CSR ordering of the Jacobian's columns: the entries (link, side) of every free hub variable are consecutive
+        incidences = self.variables.T.ravel()
+        order = np.argsort(incidences, kind="stable")
+        order = order[incidences[order] < len(self.free)]
+        self.incidence_order = order
+        self.incidence_variables, self.incidence_starts = np.unique(incidences[order], return_index=True)
+
+    def residuals(self, positions: np.ndarray) -> np.ndarray:
+        """Squared distance residuals (B, M) for hub positions (B, H, 2). """
+        deltas = positions[:, self.ends[:, 0]] - positions[:, self.ends[:, 1]]
+        return (deltas ** 2).sum(axis=2) - self.lengths ** 2
+
+    def errors(self, positions: np.ndarray) -> np.ndarray:
+        """Maximum deviation from the link lengths per frame (B,). """
+        if len(self.ends) == 0:
+            return np.zeros(len(positions))
+        deltas = positions[:, self.ends[:, 0]] - positions[:, self.ends[:, 1]]
+        return np.abs(np.linalg.norm(deltas, axis=2) - self.lengths).max(axis=1)
+
+    def multiply(self, deltas: np.ndarray, steps: np.ndarray) -> np.ndarray:
+        """J x for every frame, link major: steps of the free hubs (F, B, 2) give (M, B).
+        deltas are the link deltas p_a - p_b (M, B, 2), the values of the sparse Jacobians. """
+        padded = np.concatenate((steps, np.zeros((1,) + steps.shape[1:])))
+        return 2 * (deltas * (padded[self.variables[:, 0]] - padded[self.variables[:, 1]])).sum(axis=2)
+
+    def multiply_transposed(self, deltas: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """J^T y for every frame, link major: vectors (M, B) give steps of the free hubs (F, B, 2). """
+        weighted = 2 * vectors[:, :, None] * deltas
+        entries = np.concatenate((weighted, -weighted))[self.incidence_order]
+        steps = np.zeros((len(self.free),) + deltas.shape[1:])
+        if len(entries):
+            steps[self.incidence_variables] = np.add.reduceat(entries, self.incidence_starts)
+        return steps
+
+    def solve(self, positions: np.ndarray, tolerance: float, max_iterations: int) -> np.ndarray:
+        """Refines the free hubs of a batch of frames (B, H, 2) in place by Gauss-Newton
+        with minimum norm steps. Returns the remaining error per frame. """
+        if len(self.free) == 0 or len(self.ends) == 0:
+            return self.errors(positions)
+
+        # damping keeps J J^T invertible for redundant constraints, scaled to the problem size
+        damping = 1e-12 * max(float(self.lengths.max()) ** 2, 1.0)
+        active = np.arange(len(positions))
+        for _ in range(max_iterations):
+            current = positions[active]
+            errors = self.errors(current)
+            active = active[errors > tolerance]
+            if len(active) == 0:
+                break
+
+            # link major layout (hubs or links first, frames second), so the sparse products gather whole rows
+            current = np.ascontiguousarray(positions[active].transpose(1, 0, 2))
+            deltas = current[self.ends[:, 0]] - current[self.ends[:, 1]]
+            residuals = (deltas ** 2).sum(axis=2) - self.lengths[:, None] ** 2
+            # minimum norm step: dx = -J^T (J J^T)^-1 r
+            steps = -self.multiply_transposed(deltas, self.solve_normal(deltas, residuals, damping))
+            positions[active[:, None], self.free] += steps.transpose(1, 0, 2)
+        return self.errors(positions)
+
+    def solve_normal(self, deltas: np.ndarray, residuals: np.ndarray, damping: float,
+                     relative_tolerance: float = 1e-6) -> np.ndarray:
+        """Solves (J J^T + damping I) z = r for every frame (residuals (M, B)) with Jacobi preconditioned
+        conjugate gradients. J J^T is only applied as J (J^T z), so an iteration costs time linear in the links. """
+        diagonal = 4 * (deltas ** 2).sum(axis=2) * self.free_ends[:, None] + damping
+        solution = np.zeros_like(residuals)
+        remainder = residuals.copy()
+        preconditioned = remainder / diagonal
+        direction = preconditioned.copy()
+        product = (remainder * preconditioned).sum(axis=0)
+        limits = (relative_tolerance * np.linalg.norm(residuals, axis=0)) ** 2
+        # exact after M steps in exact arithmetic, the margin covers rounding
+        for _ in range(2 * len(self.ends) + 10):
+            pending = (remainder ** 2).sum(axis=0) > limits
+            if not pending.any():
+                break
+            applied = self.multiply(deltas, self.multiply_transposed(deltas, direction)) + damping * direction
+            curvature = (direction * applied).sum(axis=0)
+            step = np.where(pending, product / np.where(curvature > 0, curvature, 1.0), 0.0)
+            solution += step * direction
+            remainder -= step * applied
+            preconditioned = remainder / diagonal
+            next_product = (remainder * preconditioned).sum(axis=0)
+            direction = preconditioned + next_product / np.where(product > 0, product, 1.0) * direction
+            product = next_product
+        return solution
+
+
+class Simulation:
+    """Result of simulate: hub positions for every frame and whether the frame's solve converged."""
+
+    def __init__(self, hubs: list, links: list, angles: np.ndarray, positions: np.ndarray, errors: np.ndarray,
+                 converged: np.ndarray):
+        self.hubs = hubs
+        self.links = links
+        self.angles = angles
+        self.positions = positions
+        # maximum link length deviation of every frame's pose
+        self.errors = errors
+        self.converged = converged
+
+    def __str__(self):
+        return "{} frames, {} hubs, {} converged, max link length error {:.2e}mm".format(
+            len(self.angles), len(self.hubs), int(self.converged.sum()),
+            float(self.errors.max()) if len(self.errors) else 0.0)
+
+    def trajectories(self) -> dict:
+        """Hub trajectories keyed by hub id, as list of [x, y] per frame. """
+        return {hub.get_id(): self.positions[:, index].tolist() for index, hub in enumerate(self.hubs)}
+
+    def to_dict(self) -> dict:
+        return {
+            "angles": np.degrees(self.angles).tolist(),
+            "converged": self.converged.tolist(),
+            "errors": self.errors.tolist(),
+            "trajectories": self.trajectories(),
+        }
+
+
+def find_hub(hubs: list, hub_id: str):
+    for hub in hubs:
+        if hub.get_id() == hub_id:
+            return hub
+    raise ValueError("Unknown hub '{}', expected one of: {}".format(hub_id, ", ".join(hub.get_id() for hub in hubs)))
+
+
+@profiling.timed("simulation.simulate")
+def simulate(linkage_configuration: LinkageConfiguration, fixed: List[str], crank: tuple, frames: int = 360,
+             sweep: float = 360.0, tolerance: float = DEFAULT_TOLERANCE, max_iterations: int = 20,
+             chunk_size: int = 32) -> Simulation:
+    """Simulates the configuration while the crank (pivot hub id, driven hub id) turns by sweep degrees.
+
+    fixed are the ids of hubs keeping their position, the crank's pivot is always fixed.
+    Frame 0 is the assembled configuration, the remaining frames are spread evenly over the sweep.
+    """
+    if frames < 1:
+        raise ValueError("Expected at least one frame")
+
+    hubs = linkage_configuration.hubs
+    pivot = find_hub(hubs, crank[0]).index
+    driven = find_hub(hubs, crank[1]).index
+    prescribed = {find_hub(hubs, hub_id).index for hub_id in fixed} | {pivot, driven}
+
+    system = ConstraintSystem(linkage_configuration.hub_array, linkage_configuration.link_array, prescribed)
+    initial = linkage_configuration.hub_array.copy()
+    angles = np.radians(np.linspace(0.0, sweep, frames, endpoint=abs(sweep) < 360.0))
+    crank_positions = _crank_positions(initial[pivot], initial[driven], angles)
+
+    positions = np.empty((frames, len(hubs), 2))
+    errors = np.empty(frames)
+    positions[0] = initial
+    positions[0, driven] = crank_positions[0]
+    errors[0:1] = system.solve(positions[0:1], tolerance, max_iterations)
+    converged = np.ones(frames, dtype=bool)
+    converged[0] = errors[0] <= tolerance
+    profiling.count("simulation frames", frames)
+
+    for start in range(1, frames, chunk_size):
+        end = min(start + chunk_size, frames)
+        # predict from the motion between the last two frames, then refine the whole chunk at once
+        velocity = positions[start - 1] - positions[start - 2] if start > 1 else np.zeros_like(initial)
+        steps = np.arange(1, end - start + 1)[:, None, None]
+        chunk = positions[start:end]
+        chunk[:] = positions[start - 1] + steps * velocity
+        chunk[:, driven] = crank_positions[start:end]
+        errors[start:end] = system.solve(chunk, tolerance, max_iterations)
+
+        failed = np.nonzero(errors[start:end] > tolerance)[0]
+        if len(failed) > 0:
+            profiling.count("simulation sequential fallbacks", len(failed))
+            # continuation frame by frame, from the first frame that went astray
+            for frame in range(start + failed[0], end):
+                positions[frame] = positions[frame - 1]
+                positions[frame, driven] = crank_positions[frame]
+                errors[frame:frame + 1] = system.solve(positions[frame:frame + 1], tolerance, max_iterations)
+                if errors[frame] > tolerance:
+                    # beyond the linkage's motion range: it locks up in the last reachable pose
+                    converged[frame] = False
+                    positions[frame] = positions[frame - 1]
+                    errors[frame] = errors[frame - 1]
+
+    return Simulation(hubs, linkage_configuration.links, angles, positions, errors, converged)
+
+
+def _crank_positions(pivot: np.ndarray, driven: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    offset = driven - pivot
+    cos, sin = np.cos(angles), np.sin(angles)
+    return pivot + np.stack((cos * offset[0] - sin * offset[1], sin * offset[0] + cos * offset[1]), axis=1)
+
+
+@profiling.timed("simulation.write_animation_svg")
+def write_animation_svg(simulation: Simulation, stream, duration: float = 4.0, max_frames: int = 360,
+                        linkage_radius: float = 7.5, joint_radius: float = 1):
+    """Streams an animated (SMIL) svg of the assembly over all frames to a text stream.
+
+    Links are drawn as round capped strokes of the link width, labels follow their hubs.
+    At most max_frames evenly spaced frames are used to keep the file size bounded.
+    """
+    frames = np.unique(np.linspace(0, len(simulation.angles) - 1, min(max_frames, len(simulation.angles)))
+                       .round().astype(np.int64))
+    positions = simulation.positions[frames]
+
+    bounds = Bounds()
+    if positions.size:
+        minimum = positions.reshape((-1, 2)).min(axis=0) - linkage_radius
+        maximum = positions.reshape((-1, 2)).max(axis=0) + linkage_radius
+        bounds.add((minimum[0], minimum[1], maximum[0], maximum[1]))
+
+    def values(coordinates):
+        return ";".join("{:.4f}".format(value) for value in coordinates)
+
+    with SvgWriter(stream, bounds.as_tuple()) as writer:
+        for link in simulation.links:
+            a = positions[:, link.hub_a.index]
+            b = positions[:, link.hub_b.index]
+            writer.animated_link(values(a[:, 0]), values(a[:, 1]), values(b[:, 0]), values(b[:, 1]),
+                                 2 * linkage_radius, duration)
+        for index, hub in enumerate(simulation.hubs):
+            hub_positions = positions[:, index]
+            writer.animated_hub(values(hub_positions[:, 0]), values(hub_positions[:, 1]), joint_radius, duration)
+            writer.animated_text(values(hub_positions[:, 0] + 2.5), values(hub_positions[:, 1] + 2.5),
+                                 hub.get_id(), duration)
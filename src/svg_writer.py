@@ -0,0 +1,253 @@
+"""Streaming svg output: styled elements are written straight to a text stream instead of
+building the document in memory and re-parsing it for styling.
+"""
+
+import contextlib
+import gzip
+import io
+import os
+from xml.sax.saxutils import escape
+
+from util.formatting import format_number
+import util.profiling as profiling
+
+# styling of cut geometry (red) and engraved labels (blue), see README
+PATH_STYLE = 'fill="none" stroke="#FF0000" stroke-width="0.2" opacity="1.0"'
+LABEL_FONT_SIZE = 5
+LABEL_STYLE = 'font-size="{}" fill="#0000FF"'.format(LABEL_FONT_SIZE)
+# linked areas of overview pages (see SvgWriter.link_area)
+AREA_STYLE = 'fill="#0000FF" fill-opacity="0.05" stroke="#0000FF"'
+# decimals of the rotation of symbol instances, which moves the ends of a 1m link by less than a micrometre
+ROTATION_DECIMALS = 9
+
+
+@contextlib.contextmanager
+def open_svg_file(file_name: str, compress: bool = None):
+    """Opens file_name as text stream for writing svg. Output is gzip compressed
+    when compress is set or, if compress is None, when the file name ends with .svgz.
+    """
+    if compress is None:
+        compress = os.path.splitext(file_name)[1].lower() == ".svgz"
+
+    if not compress:
+        with open(file_name, "w", encoding="utf-8", newline="\n") as stream:
+            yield stream
+        return
+
+    # fixed mtime and no embedded file name keep the compressed output byte-for-byte stable
+    with open(file_name, "wb") as raw_file, \
+            gzip.GzipFile(filename="", mode="wb", fileobj=raw_file, mtime=0) as compressed_file, \
+            io.TextIOWrapper(compressed_file, encoding="utf-8", newline="\n") as stream:
+        yield stream
+
+
+class Bounds:
+    """Running axis aligned bounding box (min_x, min_y, max_x, max_y)."""
+
+    def __init__(self):
+        self.min_x = float("inf")
+        self.min_y = float("inf")
+        self.max_x = float("-inf")
+        self.max_y = float("-inf")
+
+    def add(self, bounds):
+        if not bounds:
+            return
+        self.min_x = min(self.min_x, bounds[0])
+        self.min_y = min(self.min_y, bounds[1])
+        self.max_x = max(self.max_x, bounds[2])
+        self.max_y = max(self.max_y, bounds[3])
+
+    def is_empty(self) -> bool:
+        return self.min_x > self.max_x
+
+    def as_tuple(self) -> tuple:
+        if self.is_empty():
+            return (0.0, 0.0, 0.0, 0.0)
+        return (self.min_x, self.min_y, self.max_x, self.max_y)
+
+
+class SvgWriter:
+    """Writes a styled svg document element by element to a text stream.
+
+    The bounding box has to be known upfront since it goes into the svg header.
+    Use as context manager or call close() to finish the document.
+    With document=False only the elements are written, without header and footer (fragments, see watch.py).
+    Coordinates are written at full precision or rounded to decimals, consecutive points which become equal
+    by rounding are dropped. size (width, height) in mm scales the drawing, it defaults to the size of bounds.
+    """
+
+    def __init__(self, stream, bounds: tuple, document: bool = True, decimals: int = None, size: tuple = None):
+        self.stream = stream
+        self.closed = not document
+        self.decimals = decimals
+        # coordinate pairs of cut geometry written and bytes saved by rounding
+        self.vertices = 0
+        self.saved_bytes = 0
+        if not document:
+            return
+
+        width = bounds[2] - bounds[0]
+        height = bounds[3] - bounds[1]
+        size = (width, height) if size is None else size
+        stream.write('<?xml version="1.0" ?>\n')
+        stream.write('<svg width="{}mm" height="{}mm" viewBox="{} {} {} {}">\n'.format(
+            size[0], size[1], bounds[0], bounds[1], width, height))
+        stream.write('<g transform="scale(1,1)">\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def path(self, geometry):
+        """Writes a (multi) polygon as styled path element. """
+        if geometry.is_empty:
+            return
+
+        polygons = geometry.geoms if hasattr(geometry, "geoms") else [geometry]
+        rings = [ring for polygon in polygons for ring in [polygon.exterior] + list(polygon.interiors)]
+        profiling.count("svg paths")
+        self.stream.write('<path fill-rule="evenodd" {} d="{}"/>\n'.format(
+            PATH_STYLE, " ".join(self._ring_path(ring.coords) for ring in rings)))
+
+    def rings(self, rings):
+        """Writes closed rings (point arrays, first point repeated at the end) as one styled path element. """
+        profiling.count("svg paths")
+        self.stream.write('<path fill-rule="evenodd" {} d="{}"/>\n'.format(
+            PATH_STYLE, " ".join(self._ring_path(ring.tolist()) for ring in rings)))
+
+    def link_arcs(self, tangents, hubs, linkage_radius: float, joint_radius: float):
+        """Writes a link outline with exact arcs as styled path element: the tangent end points (4, 2)
+        (see util.link_geometry.tangent_points) joined by semicircles, and a circular hole around both hubs (2, 2). """
+        number = self._number
+        (a_left, b_left, b_right, a_right), radius = tangents.tolist(), number(linkage_radius)
+        path = "M {},{} L {},{} A {r},{r} 0 0 0 {},{} L {},{} A {r},{r} 0 0 0 {},{} z".format(
+            *map(number, a_left + b_left + b_right + a_right + a_left), r=radius)
+        radius = number(joint_radius)
+        for x, y in hubs.tolist():
+            path += " M {},{} A {r},{r} 0 0 1 {},{} A {r},{r} 0 0 1 {},{} z".format(
+                number(x + joint_radius), number(y), number(x - joint_radius), number(y), number(x + joint_radius),
+                number(y), r=radius)
+        profiling.count("svg paths")
+        profiling.count("svg arcs", 6)
+        self.vertices += 6
+        self.stream.write('<path fill-rule="evenodd" {} d="{}"/>\n'.format(PATH_STYLE, path))
+
+    def polyline(self, coords, closed: bool = True):
+        """Writes a single (open or closed) polyline as styled path element. """
+        if closed:
+            path = self._ring_path(coords)
+        else:
+            points = self._points(coords)
+            profiling.count("svg vertices", len(points))
+            self.vertices += len(points)
+            path = "M " + " L ".join(points)
+        profiling.count("svg paths")
+        self.stream.write('<path {} d="{}"/>\n'.format(PATH_STYLE, path))
+
+    @contextlib.contextmanager
+    def definitions(self):
+        """Context for elements which aren't rendered themselves, like symbols. """
+        self.stream.write('<defs>\n')
+        yield self
+        self.stream.write('</defs>\n')
+
+    @contextlib.contextmanager
+    def symbol(self, symbol_id: str):
+        """Context grouping the elements written within into a symbol, to be placed by use elements. """
+        self.stream.write('<g id="{}">\n'.format(escape(symbol_id)))
+        yield self
+        self.stream.write('</g>\n')
+
+    def use(self, symbol_id: str, matrix):
+        """Places an instance of a symbol with an affine transform matrix (2, 3). """
+        (a, c, e), (b, d, f) = matrix.tolist()
+        profiling.count("svg uses")
+        # the rotation isn't rounded to decimals, that would move the far ends of long links
+        self.stream.write('<use href="#{}" transform="matrix({} {} {} {} {} {})"/>\n'.format(
+            escape(symbol_id), *(format_number(value, ROTATION_DECIMALS) for value in (a, b, c, d)),
+            self._number(e), self._number(f)))
+
+    def link_area(self, href: str, bounds: tuple, label: str, font_size: float):
+        """Writes a rectangle (min_x, min_y, max_x, max_y) with a centered label, linking to href. """
+        x, y = self._number(bounds[0]), self._number(bounds[1])
+        width, height = self._number(bounds[2] - bounds[0]), self._number(bounds[3] - bounds[1])
+        center_x, center_y = self._number((bounds[0] + bounds[2]) / 2), self._number((bounds[1] + bounds[3]) / 2)
+        self.stream.write('<a href="{}"><rect x="{}" y="{}" width="{}" height="{}" stroke-width="{}" {}/>'
+                          '<text x="{}" y="{}" font-size="{}" fill="#0000FF" text-anchor="middle"> {} </text></a>\n'
+                          .format(escape(href, {'"': "&quot;"}), x, y, width, height, self._number(font_size / 10),
+                                  AREA_STYLE, center_x, center_y, self._number(font_size), escape(label)))
+
+    def text(self, x: float, y: float, label: str):
+        """Writes a styled label. """
+        profiling.count("svg labels")
+        self.stream.write('<text x="{}" y="{}" {}> {} </text>\n'.format(
+            self._number(float(x)), self._number(float(y)), LABEL_STYLE, escape(label)))
+
+    def animated_link(self, x1: str, y1: str, x2: str, y2: str, width: float, duration: float):
+        """Writes a link as round capped stroke, its end points animated through the given
+        semicolon separated values (see svg's animate element). """
+        self.stream.write('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="#FF0000" stroke-opacity="0.25" '
+                          'stroke-width="{}" stroke-linecap="round">\n'.format(
+                              _first(x1), _first(y1), _first(x2), _first(y2), width))
+        for attribute, values in (("x1", x1), ("y1", y1), ("x2", x2), ("y2", y2)):
+            self._animate(attribute, values, duration)
+        self.stream.write('</line>\n')
+
+    def animated_hub(self, cx: str, cy: str, radius: float, duration: float):
+        """Writes a hub hole as circle moving through the given values. """
+        self.stream.write('<circle cx="{}" cy="{}" r="{}" {}>\n'.format(_first(cx), _first(cy), radius, PATH_STYLE))
+        self._animate("cx", cx, duration)
+        self._animate("cy", cy, duration)
+        self.stream.write('</circle>\n')
+
+    def animated_text(self, x: str, y: str, label: str, duration: float):
+        """Writes a styled label moving through the given values. """
+        self.stream.write('<text x="{}" y="{}" {}> {} \n'.format(_first(x), _first(y), LABEL_STYLE, escape(label)))
+        self._animate("x", x, duration)
+        self._animate("y", y, duration)
+        self.stream.write('</text>\n')
+
+    def _animate(self, attribute: str, values: str, duration: float):
+        self.stream.write('<animate attributeName="{}" values="{}" dur="{}s" repeatCount="indefinite"/>\n'.format(
+            attribute, values, duration))
+
+    def close(self):
+        if self.closed:
+            return
+        self.stream.write('</g>\n</svg>\n')
+        self.closed = True
+
+    def _ring_path(self, coords) -> str:
+        points = self._points(coords)
+        profiling.count("svg vertices", len(points))
+        self.vertices += len(points)
+        return "M " + " L ".join(points) + " z"
+
+    def _points(self, coords) -> list:
+        """Formatted "x,y" of every point, without repeated points after rounding. """
+        if self.decimals is None:
+            return ["{},{}".format(coord[0], coord[1]) for coord in coords]
+
+        points = []
+        for coord in coords:
+            point = "{},{}".format(self._number(coord[0]), self._number(coord[1]))
+            if points and point == points[-1]:
+                self.saved_bytes += len(point) + 3
+                continue
+            points.append(point)
+        return points
+
+    def _number(self, value: float) -> str:
+        if self.decimals is None:
+            return "{}".format(value)
+        text = format_number(value, self.decimals)
+        self.saved_bytes += len("{}".format(value)) - len(text)
+        return text
+
+
+def _first(values: str) -> str:
+    """The first of semicolon separated animation values, used as static attribute value. """
+    return values.split(";", 1)[0]
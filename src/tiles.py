@@ -0,0 +1,79 @@
+"""Page tiling of the assembly manual for very large linkages.
+
+The assembled view is split into a grid of page sized tiles. Links and labels are assigned to every tile their
+bounds intersect via a Shapely STRtree, so links crossing a tile border show up on both tiles (each clipped by
+its tile's view box). See export.write_tiled_manual for rendering the tiles and the overview page.
+"""
+
+import math
+from typing import List
+
+import numpy as np
+import shapely
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+import util.profiling as profiling
+
+# A4 landscape in mm
+DEFAULT_PAGE = (297.0, 210.0)
+
+
+class Tile:
+    """A page of the tiled manual: its position in the grid, its bounds and the indices of the links and labels
+    on it. """
+
+    def __init__(self, row: int, column: int, bounds: tuple):
+        self.row = row
+        self.column = column
+        self.bounds = bounds
+        self.links = np.zeros(0, dtype=np.int64)
+        self.labels = np.zeros(0, dtype=np.int64)
+
+    @property
+    def name(self) -> str:
+        return "r{}c{}".format(self.row + 1, self.column + 1)
+
+    def is_empty(self) -> bool:
+        return not len(self.links) and not len(self.labels)
+
+
+def tile_grid(bounds: tuple, page: tuple = DEFAULT_PAGE) -> List[Tile]:
+    """Tiles of page size (width, height) covering bounds (min_x, min_y, max_x, max_y), row by row. """
+    if page[0] <= 0 or page[1] <= 0:
+        raise ValueError("Expected a positive page size, got {}x{}".format(*page))
+    columns = max(int(math.ceil((bounds[2] - bounds[0]) / page[0])), 1)
+    rows = max(int(math.ceil((bounds[3] - bounds[1]) / page[1])), 1)
+    return [Tile(row, column, (bounds[0] + column * page[0], bounds[1] + row * page[1],
+                               bounds[0] + (column + 1) * page[0], bounds[1] + (row + 1) * page[1]))
+            for row in range(rows) for column in range(columns)]
+
+
+@profiling.timed("tiles.assign_tiles")
+def assign_tiles(tiles: List[Tile], link_bounds: np.ndarray, label_bounds: np.ndarray) -> List[Tile]:
+    """Assigns the links and labels given by their bounds (N, 4) to the tiles they intersect,
+    returns the tiles which aren't empty. """
+    tile_bounds = np.array([tile.bounds for tile in tiles], dtype=float).reshape((-1, 4))
+    for attribute, item_bounds in (("links", link_bounds), ("labels", label_bounds)):
+        for tile, indices in zip(tiles, _intersecting(tile_bounds, item_bounds)):
+            setattr(tile, attribute, indices)
+    return [tile for tile in tiles if not tile.is_empty()]
+
+
+def _intersecting(query_bounds: np.ndarray, item_bounds: np.ndarray) -> List[np.ndarray]:
+    """Indices (ascending) of the items whose bounds (N, 4) intersect each of the query bounds (Q, 4). """
+    item_bounds = np.asarray(item_bounds, dtype=float).reshape((-1, 4))
+    if not len(item_bounds):
+        return [np.zeros(0, dtype=np.int64) for _ in query_bounds]
+
+    if not hasattr(shapely, "box"):
+        # shapely 1.8: query_items returns the indices of the items with intersecting envelopes
+        tree = STRtree([box(*aabb) for aabb in item_bounds.tolist()])
+        return [np.sort(np.asarray(tree.query_items(box(*aabb)), dtype=np.int64)) for aabb in query_bounds.tolist()]
+    # shapely 2: boxes created at once and a bulk query returning (query, item) index pairs
+    tree = STRtree(shapely.box(item_bounds[:, 0], item_bounds[:, 1], item_bounds[:, 2], item_bounds[:, 3]))
+    pairs = tree.query(shapely.box(query_bounds[:, 0], query_bounds[:, 1], query_bounds[:, 2], query_bounds[:, 3]),
+                       predicate="intersects")
+    pairs = pairs[:, np.lexsort((pairs[1], pairs[0]))]
+    splits = np.searchsorted(pairs[0], np.arange(1, len(query_bounds)))
+    return np.split(pairs[1].astype(np.int64), splits)
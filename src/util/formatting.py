@@ -0,0 +1,4 @@
+def format_number(value: float, decimals: int) -> str:
+    """Fixed point with up to the given number of decimals, without trailing zeros. """
+    text = "{:.{}f}".format(value, decimals).rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
@@ -1,5 +1,11 @@
 import math
 import numpy as np
+import shapely
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+# Absolute distance (in mm) below which two points are treated as the same hub
+DEFAULT_TOLERANCE = 1e-6
 
 
 def center_for_bounds(aabb):
@@ -19,10 +25,78 @@ def matrix_to_shapely(matrix):
     return tuple(matrix[:-1].flatten(order="F"))
 
 
+def transform_points(matrices: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Applies a stack of 4x4 matrices (N, 4, 4) to a stack of 2d points (N, K, 2) in a single matrix multiply. """
+    points = np.asarray(points, dtype=float)
+    homogeneous = np.concatenate(
+        (points, np.zeros(points.shape[:-1] + (1,)), np.ones(points.shape[:-1] + (1,))), axis=-1)
+    return (homogeneous @ np.swapaxes(matrices, -1, -2))[..., :2]
+
+
+def primitive_transforms(hub_positions: np.ndarray) -> np.ndarray:
+    """Calculates the primitive space transforms for a stack of links given by their hub positions (N, 2, 2).
+
+    Closed form of LinkageLink._create_primitive_transform for the stadium shaped link geometry:
+    mirrors the y axis, moves the link center into the origin and rotates the link axis onto the y axis.
+    The ends are oriented like the per-link transform does (see first_hub_up).
+    Returns a stack of 4x4 matrices (N, 4, 4).
+    """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    count = hub_positions.shape[0]
+
+    mirrored = hub_positions * np.array([1.0, -1.0])
+    center = mirrored.mean(axis=1)
+    axis = mirrored[:, 0] - center
+    length = np.linalg.norm(axis, axis=1)
+
+    hub_a_up = first_hub_up(hub_positions)
+    unit_axis = np.divide(axis, length[:, None], out=np.tile([0.0, 1.0], (count, 1)), where=length[:, None] > 0)
+    unit_axis[~hub_a_up] *= -1
+
+    # rotation mapping the unit axis onto (0, 1)
+    rotations = np.tile(np.identity(4), (count, 1, 1))
+    rotations[:, 0, 0] = unit_axis[:, 1]
+    rotations[:, 0, 1] = -unit_axis[:, 0]
+    rotations[:, 1, 0] = unit_axis[:, 0]
+    rotations[:, 1, 1] = unit_axis[:, 1]
+
+    translations = np.tile(np.identity(4), (count, 1, 1))
+    translations[:, 0:2, 3] = -center
+
+    mirror = np.diag([1.0, -1.0, 1.0, 1.0])
+    return rotations @ translations @ mirror
+
+
+def first_hub_up(hub_positions: np.ndarray) -> np.ndarray:
+    """Whether the first hub of each link (N, 2, 2) ends up on the positive y axis of primitive space:
+    the hub pointing to +x in assembled space, or the lower one of vertical links. """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    direction = hub_positions[:, 1] - hub_positions[:, 0]
+    vertical = np.abs(direction[:, 0]) <= 1e-9 * np.maximum(np.linalg.norm(direction, axis=1) / 2, 1.0)
+    return np.where(vertical, direction[:, 1] < 0, direction[:, 0] > 0)
+
+
+def is_counter_clockwise(center, start, through) -> bool:
+    """Whether the arc around center from start passes through (less than half a turn away) counter clockwise. """
+    return (start[0] - center[0]) * (through[1] - center[1]) - (start[1] - center[1]) * (through[0] - center[0]) > 0
+
+
+def point_beyond(center, other, distance: float) -> tuple:
+    """The point distance away from center, on the side opposite to other. """
+    direction = np.subtract(center, other, dtype=float)
+    direction /= np.linalg.norm(direction)
+    return (center[0] + direction[0] * distance, center[1] + direction[1] * distance)
+
+
 def pointsEqual(pointA: list[int], pointB: list[int]):
     return math.isclose(pointA[0], pointB[0]) and math.isclose(pointA[1], pointB[1])
 
 
+def quantize_point(point, tolerance: float = DEFAULT_TOLERANCE):
+    """Returns the integer cell of a grid with the given spacing that contains point. """
+    return (math.floor(point[0] / tolerance), math.floor(point[1] / tolerance))
+
+
 def angle_between(vector_1, vector_2):
     """
     Calculates the angle between two vectors in degrees, taken from https://www.adamsmith.haus/python/answers/how-to-get-the-angle-between-two-vectors-in-python.
@@ -34,3 +108,16 @@ def angle_between(vector_1, vector_2):
     angle = np.arccos(dot_product)
 
     return np.degrees(angle)
+
+
+def intersecting_box_pairs(bounds: np.ndarray) -> np.ndarray:
+    """All index pairs (both orders, including (i, i)) of intersecting boxes (min_x, min_y, max_x, max_y) (N, 4). """
+    if not hasattr(shapely, "box"):
+        # shapely 1.8: query returns geometries, query_items their indices
+        boxes = [box(*aabb) for aabb in bounds.tolist()]
+        tree = STRtree(boxes)
+        pairs = [(index, other) for index, geometry in enumerate(boxes) for other in tree.query_items(geometry)]
+        return np.array(pairs, dtype=np.int64).reshape((-1, 2))
+    # shapely 2: boxes created at once and a bulk query returning indices
+    boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+    return np.asarray(STRtree(boxes).query(boxes), dtype=np.int64).T.reshape((-1, 2))
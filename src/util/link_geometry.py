@@ -0,0 +1,141 @@
+"""Analytic geometry of the stadium shaped links: two semicircles of the link radius around the hubs joined by
+their tangents, with a circular hole of the joint radius at every hub.
+
+Rings are computed directly from the hub positions, batched over many links, instead of buffering and
+subtracting Shapely geometry. The shape is symmetric to its axis, so it is the same in every configuration
+space: transforming the hubs (rotations, translations and the primitive space mirror) and building the
+outline from the transformed hubs gives the transformed outline.
+"""
+
+import functools
+import math
+import numpy as np
+
+# default link width (as radius) and hub hole radius in mm
+LINKAGE_RADIUS = 7.5
+JOINT_RADIUS = 1
+
+# link geometry kernels: exact svg arcs, polylines at a chord tolerance or the Shapely buffer/difference geometry
+KERNELS = ("arc", "polyline", "shapely")
+DEFAULT_KERNEL = "arc"
+# maximum distance (in mm) between an arc and the chords approximating it
+DEFAULT_CHORD_TOLERANCE = 0.01
+# links whose lengths round to the same multiple of this (in mm) are considered congruent
+CONGRUENCE_TOLERANCE = 1e-6
+
+
+def arc_segment_count(radius: float, angle: float, chord_tolerance: float = DEFAULT_CHORD_TOLERANCE) -> int:
+    """Number of chords needed to approximate an arc of radius and angle (radians) within chord_tolerance,
+    at least one per quarter circle. """
+    if chord_tolerance >= radius:
+        step = math.pi / 2
+    else:
+        step = min(2 * math.acos(1 - chord_tolerance / radius), math.pi / 2)
+    return max(int(math.ceil(angle / step - 1e-9)), 1)
+
+
+def link_frames(hub_positions: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Unit directions from hub a to hub b and their left normals (N, 2) of links given by their hubs (N, 2, 2).
+    Links of zero length get the x axis as direction. """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    direction = hub_positions[:, 1] - hub_positions[:, 0]
+    length = np.linalg.norm(direction, axis=1)
+    direction = np.divide(direction, length[:, None], out=np.tile([1.0, 0.0], (len(direction), 1)),
+                          where=length[:, None] > 0)
+    normal = np.stack((-direction[:, 1], direction[:, 0]), axis=1)
+    return direction, normal
+
+
+def tangent_points(hub_positions: np.ndarray, linkage_radius: float = LINKAGE_RADIUS) -> np.ndarray:
+    """End points of the two tangents of every link (N, 4, 2), in outline order: a + n r, b + n r, b - n r, a - n r
+    (n being the left normal), the outline turns around hub b between the 2nd and 3rd point. """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    _, normal = link_frames(hub_positions)
+    offset = normal * linkage_radius
+    a, b = hub_positions[:, 0], hub_positions[:, 1]
+    return np.stack((a + offset, b + offset, b - offset, a - offset), axis=1)
+
+
+def link_rings(hub_positions: np.ndarray, linkage_radius: float = LINKAGE_RADIUS, joint_radius: float = JOINT_RADIUS,
+               chord_tolerance: float = DEFAULT_CHORD_TOLERANCE) -> (np.ndarray, np.ndarray):
+    """Closed polyline rings of links given by their hubs (N, 2, 2), all arc vertices lie on the arcs.
+    Returns the outlines (N, K, 2) and the hub holes (N, 2, M, 2), first and last point of every ring are equal. """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    direction, normal = link_frames(hub_positions)
+
+    # clockwise around hub b from +n over +d to -n, then around hub a from -n over -d back to +n
+    cos, sin = _arc_template(linkage_radius, chord_tolerance)
+    offsets = cos[None, :, None] * normal[:, None] + sin[None, :, None] * direction[:, None]
+    outlines = np.concatenate((hub_positions[:, 1:2] + offsets, hub_positions[:, 0:1] - offsets,
+                               hub_positions[:, 1:2] + offsets[:, :1]), axis=1)
+
+    # counter clockwise, opposite to the outline
+    holes = hub_positions[:, :, None, :] + _circle_template(joint_radius, chord_tolerance)
+    return outlines, holes
+
+
+@functools.lru_cache(maxsize=32)
+def _arc_template(radius: float, chord_tolerance: float) -> (np.ndarray, np.ndarray):
+    """Scaled cosines and sines of a semicircle's vertex angles, counted from the normal towards the direction. """
+    angles = np.linspace(0.0, math.pi, arc_segment_count(radius, math.pi, chord_tolerance) + 1)
+    return radius * np.cos(angles), radius * np.sin(angles)
+
+
+@functools.lru_cache(maxsize=32)
+def _circle_template(radius: float, chord_tolerance: float) -> np.ndarray:
+    angles = np.linspace(0.0, 2 * math.pi, arc_segment_count(radius, 2 * math.pi, chord_tolerance) + 1)
+    circle = radius * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+    circle[-1] = circle[0]
+    return circle
+
+
+def link_bounds(hub_positions: np.ndarray, linkage_radius: float = LINKAGE_RADIUS) -> np.ndarray:
+    """Exact axis aligned bounds (min_x, min_y, max_x, max_y) of links given by their hubs (N, 2, 2) as (N, 4). """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    return np.concatenate((hub_positions.min(axis=1) - linkage_radius,
+                           hub_positions.max(axis=1) + linkage_radius), axis=1)
+
+
+def link_areas(hub_positions: np.ndarray, linkage_radius: float = LINKAGE_RADIUS,
+               joint_radius: float = JOINT_RADIUS) -> np.ndarray:
+    """Exact areas (N,) of links given by their hubs (N, 2, 2). """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    lengths = np.linalg.norm(hub_positions[:, 1] - hub_positions[:, 0], axis=1)
+    return 2 * linkage_radius * lengths + math.pi * (linkage_radius ** 2 - 2 * joint_radius ** 2)
+
+
+def is_simple(hub_positions: np.ndarray, linkage_radius: float = LINKAGE_RADIUS,
+              joint_radius: float = JOINT_RADIUS) -> np.ndarray:
+    """Whether the analytic rings of every link (N, 2, 2) form a valid polygon, i.e. the holes lie inside
+    the outline and don't overlap. Other links need the Shapely kernel. """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    lengths = np.linalg.norm(hub_positions[:, 1] - hub_positions[:, 0], axis=1)
+    return (lengths > 2 * joint_radius) & (joint_radius < linkage_radius)
+
+
+def congruent_classes(hub_positions: np.ndarray,
+                      tolerance: float = CONGRUENCE_TOLERANCE) -> (np.ndarray, np.ndarray):
+    """Groups links given by their hubs (N, 2, 2) into classes of congruent links: all links share their radii,
+    so links of the same length (rounded to a multiple of tolerance) have the same shape.
+    Returns the length of every class (C,), ascending, and the class index of every link (N,). """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    lengths = np.linalg.norm(hub_positions[:, 1] - hub_positions[:, 0], axis=1)
+    keys, classes = np.unique(np.round(lengths / tolerance).astype(np.int64), return_inverse=True)
+    return keys * tolerance, classes.reshape(-1)
+
+
+def canonical_hub_positions(lengths: np.ndarray) -> np.ndarray:
+    """Hubs (C, 2, 2) of links of the given lengths in canonical position: centered on the origin along the y axis. """
+    half = np.asarray(lengths, dtype=float).reshape(-1) / 2
+    zeros = np.zeros_like(half)
+    return np.stack((np.stack((zeros, -half), axis=1), np.stack((zeros, half), axis=1)), axis=1)
+
+
+def canonical_transforms(hub_positions: np.ndarray) -> np.ndarray:
+    """Affine transforms (N, 2, 3) moving a link in canonical position (see canonical_hub_positions) onto every link
+    given by its hubs (N, 2, 2): a rotation turning the y axis into the link's direction and a translation
+    to the link's center. """
+    hub_positions = np.asarray(hub_positions, dtype=float).reshape((-1, 2, 2))
+    direction, normal = link_frames(hub_positions)
+    center = hub_positions.mean(axis=1)
+    return np.stack((-normal, direction, center), axis=2)
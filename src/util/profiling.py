@@ -0,0 +1,129 @@
+"""Lightweight instrumentation: named timing spans and counters collected while profiling is enabled.
+
+Instrumented code calls span(name) / count(name) or decorates functions with @timed(name).
+While profiling is disabled these cost a single global lookup, enabling it installs a
+thread safe Recorder that accumulates calls, total and maximum time per span.
+"""
+
+import contextlib
+import functools
+import threading
+import time
+from collections import Counter
+
+_recorder = None
+
+
+class Recorder:
+    """Accumulates span timings and counters, safe to use from several threads."""
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float, calls: int = 1, maximum: float = None):
+        maximum = seconds if maximum is None else maximum
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [calls, seconds, maximum]
+            else:
+                span[0] += calls
+                span[1] += seconds
+                span[2] = max(span[2], maximum)
+
+    def add_count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def merge(self, data: dict):
+        """Adds the spans and counters of another recorder's as_dict() (e.g. from a worker process). """
+        for name, span in data["spans"].items():
+            self.add_span(name, span["seconds"], span["calls"], span["max_seconds"])
+        for name, amount in data["counters"].items():
+            self.add_count(name, amount)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {name: {"calls": calls, "seconds": seconds, "max_seconds": maximum}
+                          for name, (calls, seconds, maximum) in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder: Recorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.add_span(self.name, time.perf_counter() - self.start)
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def enable() -> Recorder:
+    """Starts recording into a fresh Recorder, which is returned. """
+    global _recorder
+    _recorder = Recorder()
+    return _recorder
+
+
+def disable() -> Recorder:
+    """Stops recording, returns the recorder holding everything recorded since enable() (or None). """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def recorder() -> Recorder:
+    """The active recorder or None if profiling is disabled. """
+    return _recorder
+
+
+def span(name: str):
+    """Context manager timing the enclosed block under name. """
+    if _recorder is None:
+        return _NO_SPAN
+    return _Span(_recorder, name)
+
+
+def count(name: str, amount: int = 1):
+    if _recorder is not None:
+        _recorder.add_count(name, amount)
+
+
+def timed(name: str):
+    """Decorator timing every call of the decorated function under name. """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _Span(_recorder, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_table(data: dict) -> str:
+    """Formats a Recorder.as_dict() as text table, spans sorted by total time. """
+    lines = ["{:<40} {:>8} {:>11} {:>11} {:>11}".format("span", "calls", "total [s]", "mean [ms]", "max [ms]")]
+    for name, span in sorted(data["spans"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append("{:<40} {:>8} {:>11.4f} {:>11.3f} {:>11.3f}".format(
+            name, span["calls"], span["seconds"], 1000 * span["seconds"] / span["calls"], 1000 * span["max_seconds"]))
+    if data["counters"]:
+        lines.append("")
+        lines.append("{:<40} {:>8}".format("counter", "value"))
+        for name, value in data["counters"].items():
+            lines.append("{:<40} {:>8}".format(name, value))
+    return "\n".join(lines)
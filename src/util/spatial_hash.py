@@ -0,0 +1,54 @@
+import math
+
+import util.geometry as utils
+
+
+class SpatialHash:
+    """Uniform grid hash for looking up previously inserted points within a snapping tolerance.
+
+    The grid spacing equals the tolerance, so every point within tolerance of a query
+    lies in the query's cell or one of its eight neighbours. Lookups are O(1) on average.
+    """
+
+    def __init__(self, tolerance: float = utils.DEFAULT_TOLERANCE):
+        if tolerance <= 0:
+            raise ValueError("Expected a positive snapping tolerance")
+
+        self.tolerance = tolerance
+        self._cells = {}
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._cells.values())
+
+    def insert(self, point, item):
+        """Stores item at the given point. """
+        self._cells.setdefault(self._cell(point), []).append((point[0], point[1], item))
+
+    def find(self, point):
+        """Returns the item stored closest to point if it lies within tolerance on both axes, otherwise None. """
+        cell_x, cell_y = self._cell(point)
+        best_item = None
+        best_distance = math.inf
+        for offset_x in (-1, 0, 1):
+            for offset_y in (-1, 0, 1):
+                for x, y, item in self._cells.get((cell_x + offset_x, cell_y + offset_y), ()):
+                    dx = abs(x - point[0])
+                    dy = abs(y - point[1])
+                    if dx <= self.tolerance and dy <= self.tolerance and dx + dy < best_distance:
+                        best_item = item
+                        best_distance = dx + dy
+        return best_item
+
+    def find_all(self, point) -> list:
+        """Returns all items stored within tolerance of point on both axes. """
+        cell_x, cell_y = self._cell(point)
+        items = []
+        for offset_x in (-1, 0, 1):
+            for offset_y in (-1, 0, 1):
+                for x, y, item in self._cells.get((cell_x + offset_x, cell_y + offset_y), ()):
+                    if abs(x - point[0]) <= self.tolerance and abs(y - point[1]) <= self.tolerance:
+                        items.append(item)
+        return items
+
+    def _cell(self, point):
+        return utils.quantize_point(point, self.tolerance)
@@ -0,0 +1,308 @@
+"""Watch mode: re-exports a linkage incrementally whenever its input file changes.
+
+The previous configuration stays in memory and every new parse is matched against it by hub positions and
+link end points. Unchanged links keep their hub ids, their place on the sheets and their already rendered output
+fragments. Only added links (a moved link counts as removed and added) get a primitive transform, a spot in the
+free space left on the sheets and newly rendered fragments, and only the files whose content changed are
+rewritten. So the cutting plan stays stable while editing and the export cost follows the size of the edit.
+"""
+
+import io
+import os
+import time
+import numpy as np
+
+import export
+from export import OUTPUT_FORMATS, ASSEMBLY_SUFFIX
+from labels import place_labels
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from linkage_graph.linkage_link import ConfigurationSpace
+from nesting import MaxRectsPacker
+from parse import parse_solvespace_file
+from svg_writer import SvgWriter, open_svg_file
+from util.spatial_hash import SpatialHash
+import util.geometry as utils
+import util.link_geometry as link_geometry
+import util.profiling as profiling
+
+
+def match_configuration(previous: LinkageConfiguration, current: LinkageConfiguration,
+                        tolerance: float = utils.DEFAULT_TOLERANCE) -> (LinkageConfiguration, np.ndarray, np.ndarray):
+    """Matches a new parse against the previous configuration by hub positions and link end points.
+
+    Returns the new configuration with stable hub ids, along with the previous indices of its unchanged links
+    and the indices of the removed links. Hubs found in the previous configuration (within tolerance) keep their
+    index and position, new hubs take over the indices of removed ones before being appended. Unchanged links come
+    first, in their previous order and with their fabrication transform and sheet, the added links follow.
+    """
+    hub_index = SpatialHash(tolerance)
+    for index, position in enumerate(previous.hub_array.tolist()):
+        hub_index.insert(position, index)
+
+    hub_slots = np.full(len(current.hub_array), -1, dtype=np.int64)
+    used = np.zeros(len(previous.hub_array), dtype=bool)
+    for index, position in enumerate(current.hub_array.tolist()):
+        match = hub_index.find(position)
+        if match is not None and not used[match]:
+            hub_slots[index] = match
+            used[match] = True
+
+    # links between known hubs are matched before new hubs take over the slots of removed ones
+    previous_links = {}
+    for index, (hub_a, hub_b) in enumerate(previous.link_array.tolist()):
+        previous_links.setdefault((min(hub_a, hub_b), max(hub_a, hub_b)), []).append(index)
+    kept = []
+    added = []
+    for index, (hub_a, hub_b) in enumerate(current.link_array.tolist()):
+        slot_a, slot_b = hub_slots[hub_a], hub_slots[hub_b]
+        candidates = None
+        if slot_a >= 0 and slot_b >= 0:
+            candidates = previous_links.get((min(slot_a, slot_b), max(slot_a, slot_b)))
+        if candidates:
+            kept.append(candidates.pop(0))
+        else:
+            added.append(index)
+    kept = np.array(sorted(kept), dtype=np.int64)
+    removed = np.setdiff1d(np.arange(len(previous.link_array)), kept)
+
+    free_slots = np.flatnonzero(~used).tolist()[::-1]
+    hub_array = previous.hub_array.tolist()
+    for index in np.flatnonzero(hub_slots < 0).tolist():
+        hub_slots[index] = free_slots.pop() if free_slots else len(hub_array)
+        if hub_slots[index] == len(hub_array):
+            hub_array.append(None)
+        hub_array[hub_slots[index]] = current.hub_array[index].tolist()
+    # removed hubs keep their slot (as unconnected hub) as long as a later hub has an id, trailing ones are dropped
+    hub_count = int(hub_slots.max()) + 1 if len(hub_slots) else 0
+
+    configuration = LinkageConfiguration.from_arrays(
+        hub_array[:hub_count],
+        np.concatenate((previous.link_array[kept], hub_slots[current.link_array[added]].reshape((-1, 2)))),
+        np.concatenate((previous.transform_array[kept], np.tile(np.identity(4), (len(added), 1, 1)))),
+        np.concatenate((previous.sheet_array[kept], np.zeros(len(added), dtype=np.int32))))
+    return configuration, kept, removed
+
+
+class WatchReport:
+    """Outcome of an incremental re-export. """
+
+    def __init__(self, links: int, added: int, removed: int, sheet_count: int, files: list, seconds: float):
+        self.links = links
+        self.added = added
+        self.removed = removed
+        self.sheet_count = sheet_count
+        # the rewritten files
+        self.files = files
+        self.seconds = seconds
+
+    def __str__(self):
+        return "{} links ({} added, {} removed, {} unchanged) on {} sheet(s), rewrote {} in {:.3f}s".format(
+            self.links, self.added, self.removed, self.links - self.added, self.sheet_count,
+            ", ".join(self.files) if self.files else "no files", self.seconds)
+
+
+class IncrementalRenderer:
+    """Renders successive versions of a linkage to the same output files, reusing the layout and the
+    rendered fragments of unchanged links (see render_fabrication_layout for the options).
+
+    The first version is laid out by the nesting engine, links added later are packed into the free space
+    left on the sheets (MaxRects) or onto new sheets. Toolpath optimization orders all cut paths of a sheet
+    at once and svg symbols are shared by all links of a file, so neither can be combined with incremental output,
+    nor can a tiled assembly manual.
+    """
+
+    def __init__(self, output_file_name: str = None, sheet: tuple = (1000, 1000), nesting: str = "skyline",
+                 allow_rotation: bool = False, optimize_toolpath: bool = False,
+                 geometry: str = link_geometry.DEFAULT_KERNEL, output_format: str = "svg", symbols: bool = False,
+                 chord_tolerance: float = None, decimals: int = None, simplify: float = None,
+                 manual_tiles: tuple = None, padding: float = 5):
+        if optimize_toolpath or symbols or manual_tiles is not None:
+            raise ValueError("Toolpath optimization, svg symbols and a tiled assembly manual can't be combined with "
+                             "incremental output")
+        if geometry not in link_geometry.KERNELS:
+            raise ValueError("Unknown geometry kernel '{}', expected one of: {}".format(
+                geometry, ", ".join(link_geometry.KERNELS)))
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unknown output format '{}', expected one of: {}".format(
+                output_format, ", ".join(OUTPUT_FORMATS)))
+
+        self.output_file_name = "linkage.svg" if output_file_name is None else output_file_name
+        self.sheet = sheet
+        self.nesting = nesting
+        self.allow_rotation = allow_rotation
+        self.geometry = geometry
+        self.output_format = output_format
+        self.precision = export.Precision(chord_tolerance, decimals, simplify)
+        self.padding = padding
+
+        self.configuration = None
+        # per link (ordered like the configuration's links): rendered fragments and bounds of both outputs,
+        # dxf and G-code fragments depend on the mirror axis of their sheet (see DxfWriter)
+        self._fabrication = []
+        self._assembly = []
+        self._fabrication_bounds = np.zeros((0, 4))
+        self._assembly_bounds = np.zeros((0, 4))
+        self._mirrors = np.zeros(0)
+        # MaxRects state of every sheet, None if it has to be rebuilt from the links on the sheet
+        self._sheet_states = []
+        # suffixes of the fabrication files written last, None if they have to be rewritten
+        self._suffixes = None
+
+    @profiling.timed("watch.update")
+    def update(self, configuration: LinkageConfiguration) -> WatchReport:
+        """Renders a new version of the linkage, returns which links changed and which files were rewritten. """
+        start = time.perf_counter()
+        first = self.configuration is None
+        if first:
+            kept, removed = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            configuration.primitive_transforms()
+            nesting_result = export.layout_links(configuration.links, self.sheet, self.padding, self.nesting,
+                                                 self.allow_rotation, self.geometry, self.precision.chord_tolerance)
+            sheet_states = [None] * nesting_result.sheet_count
+        else:
+            configuration, kept, removed = match_configuration(self.configuration, configuration)
+            sheet_states = [None if state is None else list(state) for state in self._sheet_states]
+            for sheet_index in set(self.configuration.sheet_array[removed].tolist()):
+                sheet_states[sheet_index] = None
+        added = np.arange(len(kept), len(configuration.links))
+
+        fabrication_bounds = self._fabrication_bounds[kept]
+        if len(added) and not first:
+            # place the new links around the unchanged ones
+            configuration.primitive_transforms(added)
+            links = [configuration.links[index] for index in added]
+            part_bounds, _ = export.nesting_parts(links, self.geometry, self.precision.chord_tolerance)
+            packer = MaxRectsPacker(self.sheet[0] - self.padding, self.sheet[1] - self.padding, self.allow_rotation,
+                                    open_sheets=0)
+            for sheet_index, state in enumerate(sheet_states):
+                if state is None:
+                    sheet_states[sheet_index] = packer.used_sheet(self._used_rectangles(
+                        fabrication_bounds[configuration.sheet_array[:len(kept)] == sheet_index]))
+            with profiling.span("nesting.maxrects"):
+                placements = packer.pack(export.part_sizes(part_bounds, self.padding), sheet_states)
+            export.position_links(links, part_bounds, placements, self.padding)
+
+        # bounds and fragments of the new links
+        fabrication_hubs = configuration.hub_positions(ConfigurationSpace.fabrication, added)
+        assembly_hubs = configuration.hub_position_array(added)
+        fabrication_bounds = np.concatenate((fabrication_bounds, export.link_bounds(
+            [configuration.links[index] for index in added], ConfigurationSpace.fabrication, fabrication_hubs,
+            self.geometry, self.precision.chord_tolerance)))
+        assembly_bounds = np.concatenate((self._assembly_bounds[kept], export.link_bounds(
+            [configuration.links[index] for index in added], ConfigurationSpace.assembled, assembly_hubs,
+            self.geometry, self.precision.chord_tolerance)))
+        assembly = [self._assembly[index] for index in kept] + self._render(
+            configuration, added, ConfigurationSpace.assembled, assembly_hubs, (0.0, 0.0, 0.0, 0.0))
+        fabrication = [self._fabrication[index] for index in kept] + [None] * len(added)
+        mirrors = np.concatenate((self._mirrors[kept], np.full(len(added), np.nan)))
+
+        sheets = configuration.sheet_array
+        sheet_count = int(sheets.max()) + 1 if len(sheets) else 0
+        changed_sheets = set(sheets[added].tolist()) | set([] if first else
+                                                            self.configuration.sheet_array[removed].tolist())
+        sheet_bounds = [export.total_bounds(fabrication_bounds[sheets == sheet_index])
+                        for sheet_index in range(sheet_count)]
+        # the svg doesn't depend on the sheet bounds, dxf and G-code are mirrored within them
+        sheet_mirrors = np.array([0.0 if self.output_format == "svg" else bounds[1] + bounds[3]
+                                  for bounds in sheet_bounds])
+        stale = np.flatnonzero(mirrors != sheet_mirrors[sheets]) if len(sheets) else np.zeros(0, dtype=np.int64)
+        changed_sheets |= set(sheets[stale].tolist())
+        for sheet_index in sorted(set(sheets[stale].tolist())):
+            indices = stale[sheets[stale] == sheet_index]
+            for index, fragment in zip(indices, self._render(
+                    configuration, indices, ConfigurationSpace.fabrication,
+                    configuration.hub_positions(ConfigurationSpace.fabrication, indices), sheet_bounds[sheet_index])):
+                fabrication[index] = fragment
+        mirrors = sheet_mirrors[sheets] if len(sheets) else mirrors
+
+        # commit before writing, a failed write leaves all files to be rewritten next time
+        suffixes = [export.sheet_suffix(sheet_index, sheet_count) for sheet_index in range(sheet_count)]
+        if suffixes != self._suffixes:
+            changed_sheets = set(range(sheet_count))
+        self._suffixes = None
+        self.configuration = configuration
+        self._fabrication, self._assembly = fabrication, assembly
+        self._fabrication_bounds, self._assembly_bounds, self._mirrors = fabrication_bounds, assembly_bounds, mirrors
+        self._sheet_states = sheet_states + [None] * (sheet_count - len(sheet_states))
+
+        files = []
+        writer_class = OUTPUT_FORMATS[self.output_format][0]
+        for sheet_index in sorted(changed_sheets):
+            if sheet_index >= sheet_count:
+                continue
+            files.append(export.suffixed_file_name(self.output_file_name, suffixes[sheet_index], self.output_format))
+            self._write(files[-1], writer_class, sheet_bounds[sheet_index],
+                        [fabrication[index] for index in np.flatnonzero(sheets == sheet_index)])
+        if first or len(added) or len(removed):
+            files.append(export.suffixed_file_name(self.output_file_name, ASSEMBLY_SUFFIX))
+            labels = SvgWriter(io.StringIO(), (0.0, 0.0, 0.0, 0.0), document=False, decimals=self.precision.decimals)
+            export.write_hub_labels(labels, place_labels(configuration))
+            self._write(files[-1], SvgWriter, export.total_bounds(assembly_bounds),
+                        assembly + [labels.stream.getvalue()])
+        self._suffixes = suffixes
+
+        return WatchReport(len(configuration.links), len(added), len(removed), sheet_count, files,
+                           time.perf_counter() - start)
+
+    def _used_rectangles(self, fabrication_bounds: np.ndarray) -> list:
+        """Padded rectangles (x, y, width, height) the nesting engines reserved for links with the given
+        fabrication bounds (N, 4), in packer coordinates (see export.position_links). """
+        return [(min_x - self.padding, min_y - self.padding, max_x - min_x + self.padding,
+                 max_y - min_y + self.padding) for min_x, min_y, max_x, max_y in fabrication_bounds.tolist()]
+
+    def _render(self, configuration: LinkageConfiguration, indices, space: ConfigurationSpace,
+                hub_positions: np.ndarray, bounds: tuple) -> list:
+        """Renders every link at indices into a fragment of its own, given its hub positions (N, 2, 2) in space. """
+        writer_class = SvgWriter if space is ConfigurationSpace.assembled else OUTPUT_FORMATS[self.output_format][0]
+        # the assembly manual's hub labels are placed for the whole linkage (see update)
+        label_positions = None if space is ConfigurationSpace.assembled else \
+            configuration.label_positions(space, indices=indices)
+        writers = [writer_class(io.StringIO(), bounds, document=False, decimals=self.precision.decimals)
+                   for _ in indices]
+        export.write_links(writers, space, [configuration.links[index] for index in indices], hub_positions,
+                           label_positions, self.geometry, self.precision)
+        fragments = []
+        for writer in writers:
+            writer.close()
+            fragments.append(writer.stream.getvalue())
+        profiling.count("watch fragments", len(fragments))
+        return fragments
+
+    def _write(self, file_name: str, writer_class, bounds: tuple, fragments: list):
+        with open_svg_file(file_name) as stream:
+            with writer_class(stream, bounds, decimals=self.precision.decimals):
+                stream.write("".join(fragments))
+
+
+def watch_file(input_file: str, output_file: str = None, render_options: dict = None, parse_options: dict = None,
+               interval: float = 0.5, max_updates: int = None):
+    """Renders input_file (see IncrementalRenderer for render_options, parse_solvespace_file for parse_options)
+    and re-renders it whenever its modification time or size changes, polling every interval seconds.
+
+    Runs until interrupted or, if given, until max_updates versions were rendered. Errors (like parsing a file
+    the editor is still writing) are reported and the last good output is kept.
+    """
+    renderer = IncrementalRenderer(output_file, **(render_options or {}))
+    parse_options = {} if parse_options is None else parse_options
+    signature = None
+    updates = 0
+    try:
+        while max_updates is None or updates < max_updates:
+            try:
+                stat = os.stat(input_file)
+                current = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                # editors may replace the file on save
+                current = signature
+            if current != signature:
+                signature = current
+                updates += 1
+                try:
+                    print(renderer.update(parse_solvespace_file(input_file, **parse_options)), flush=True)
+                except Exception as error:
+                    print("{}: {}".format(input_file, error), flush=True)
+                continue
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return renderer
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# the modules in src are imported flat, as by linkage_fab.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+SAMPLE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample")
+
+
+def sample_file(name: str) -> str:
+    return os.path.join(SAMPLE_DIRECTORY, name + ".slvs")
@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+
+import batch
+from cache import LinkageCache
+from conftest import SAMPLE_DIRECTORY
+
+KEYS = {"input", "output", "status", "error", "traceback", "links", "sheets", "cached", "parse_seconds",
+        "render_seconds", "seconds"}
+
+
+def exit_worker(*args, **kwargs):
+    os._exit(1)
+
+
+def inputs_with_malformed_file(directory) -> str:
+    inputs = os.path.join(str(directory), "inputs")
+    shutil.copytree(SAMPLE_DIRECTORY, inputs)
+    with open(os.path.join(inputs, "malformed.slvs"), "wb") as file:
+        file.write(b"Param.h.v.=zz\nAddParam\n")
+    return inputs
+
+
+def test_run_batch(tmp_path):
+    output_directory = str(tmp_path / "out")
+    results = batch.run_batch([inputs_with_malformed_file(tmp_path)], output_directory, workers=1)
+    assert [result["status"] for result in results] == ["failed", "ok", "ok", "ok"]
+    for result in results:
+        assert set(result) == KEYS
+    failed, converted = results[0], results[1:]
+    assert "Malformed param" in failed["error"] and "Traceback" in failed["traceback"]
+    assert failed["parse_seconds"] is None and failed["render_seconds"] is None
+    for result in converted:
+        assert os.path.isfile(result["output"])
+        assert result["parse_seconds"] > 0 and result["render_seconds"] > 0
+        assert result["seconds"] >= result["parse_seconds"] + result["render_seconds"]
+    with open(os.path.join(output_directory, "batch_summary.json")) as file:
+        summary = json.load(file)
+    assert (summary["succeeded"], summary["failed"]) == (3, 1)
+
+
+def test_cached_stages(tmp_path):
+    cache = LinkageCache(str(tmp_path / "cache"))
+    batch.run_batch([SAMPLE_DIRECTORY], str(tmp_path / "out"), workers=1, cache=cache)
+    # the graphs are cached, only rendering runs again with other options
+    results = batch.run_batch([SAMPLE_DIRECTORY], str(tmp_path / "out"), {"symbols": True}, workers=1, cache=cache)
+    assert all(result["parse_seconds"] is None and result["render_seconds"] > 0 for result in results)
+    results = batch.run_batch([SAMPLE_DIRECTORY], str(tmp_path / "out"), {"symbols": True}, workers=1, cache=cache)
+    for result in results:
+        assert result["cached"] and result["status"] == "ok"
+        assert result["parse_seconds"] is None and result["render_seconds"] is None
+
+
+def test_died_worker(tmp_path, monkeypatch):
+    # the forked worker processes look up the patched function
+    monkeypatch.setattr(batch, "convert_file", exit_worker)
+    results = batch.run_batch([SAMPLE_DIRECTORY], str(tmp_path), workers=1, profile=True)
+    assert len(results) == 3
+    for result in results:
+        assert set(result) == KEYS | {"profile"}
+        assert result["status"] == "failed"
+        assert result["output"].startswith(str(tmp_path))
+        assert result["traceback"] is None
+        assert result["seconds"] is None
@@ -0,0 +1,82 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import LinkageCache, STATS_FILE
+from conftest import sample_file
+from parse import parse_solvespace_file
+
+
+def count_lookups(directory: str, lookups: int):
+    cache = LinkageCache(directory)
+    for _ in range(lookups):
+        cache.get_configuration("missing")
+    cache.flush_stats()
+
+
+def test_configuration_hit_and_miss(tmp_path):
+    cache = LinkageCache(str(tmp_path))
+    with open(sample_file("saxena"), "rb") as file:
+        key = LinkageCache.key(file.read(), {"reader": "native"})
+    assert key != LinkageCache.key(b"", {"reader": "native"})
+    assert cache.get_configuration(key) is None
+
+    configuration = parse_solvespace_file(sample_file("saxena"))
+    cache.put_configuration(key, configuration)
+    cached = cache.get_configuration(key)
+    assert cached.hub_array.tolist() == configuration.hub_array.tolist()
+    assert cached.link_array.tolist() == configuration.link_array.tolist()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_outputs(tmp_path):
+    cache = LinkageCache(str(tmp_path / "cache"))
+    base_name = str(tmp_path / "linkage")
+    files = [base_name + ".svg", base_name + "_assembly_manual.svg"]
+    for file_name in files:
+        with open(file_name, "w") as file:
+            file.write(file_name)
+    cache.put_outputs("key", base_name, files, {"links": 3})
+
+    restored_base = str(tmp_path / "restored")
+    meta = cache.get_outputs("key", restored_base)
+    assert meta["links"] == 3
+    assert meta["files"] == [restored_base + ".svg", restored_base + "_assembly_manual.svg"]
+    for file_name, original in zip(meta["files"], files):
+        with open(file_name) as file:
+            assert file.read() == original
+
+
+def test_eviction(tmp_path):
+    cache = LinkageCache(str(tmp_path), max_bytes=3500)
+    for index in range(3):
+        cache._store("entry{}".format(index), {"data": b"x" * 1000})
+        # distinct access times, entry0 is the least recently used one
+        os.utime(os.path.join(str(tmp_path), "entry{}".format(index)), (index, index))
+    cache._lookup("entry0")
+    cache._store("entry3", {"data": b"x" * 1000})
+    assert sorted(os.path.basename(entry) for entry, _, _ in cache._entries()) == ["entry0", "entry2", "entry3"]
+    assert cache.stats()["bytes"] <= 3500
+
+
+def test_stats_of_concurrent_processes(tmp_path):
+    directory = str(tmp_path)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(count_lookups, [directory] * 8, range(1, 9)))
+    # one statistics file, no matter how many processes used the cache
+    assert [name for name in os.listdir(directory) if name.endswith(".json")] == [STATS_FILE]
+    stats = LinkageCache(directory).stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (0, 36, 0)
+
+
+def test_legacy_stats_are_merged(tmp_path):
+    directory = str(tmp_path)
+    for pid, counts in ((101, {"hits": 2, "misses": 3}), (102, {"hits": 1, "misses": 0})):
+        with open(os.path.join(directory, "stats-{}.json".format(pid)), "w") as file:
+            json.dump(counts, file)
+    cache = LinkageCache(directory)
+    cache.get_configuration("missing")
+    cache.flush_stats()
+    assert [name for name in os.listdir(directory) if name.endswith(".json")] == [STATS_FILE]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 4)
@@ -0,0 +1,130 @@
+import contextlib
+import io
+import re
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from conftest import sample_file
+import export
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from parse import parse_solvespace_file
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def render(name: str, **options) -> (export.RenderReport, dict):
+    """Renders a sample into memory, returns the report and the output text per suffix. """
+    outputs = {}
+
+    @contextlib.contextmanager
+    def open_output(suffix):
+        stream = io.StringIO()
+        yield stream
+        outputs[suffix] = stream.getvalue()
+
+    report = export.render_layout(parse_solvespace_file(sample_file(name)), open_output, **options)
+    return report, outputs
+
+
+def elements(svg: str, tag: str) -> list:
+    return [element for element in ElementTree.fromstring(svg).iter()
+            if element.tag in (tag, SVG + tag)]
+
+
+def numbers(text: str) -> list:
+    return re.findall(r"-?\d+(?:\.\d+)?", text)
+
+
+@pytest.mark.parametrize("name, links", [("peaucellier_lipkin", 8), ("saxena", 16), ("simple_parallelogram", 4)])
+def test_svg(name, links):
+    report, outputs = render(name)
+    assert report.suffixes == ["", export.ASSEMBLY_SUFFIX]
+    assert report.nesting.sheet_count == 1
+    for svg in outputs.values():
+        # one path (outline and hub holes) per link
+        assert len(elements(svg, "path")) == links
+
+
+def test_sheets():
+    report, outputs = render("saxena", sheet=(100, 230))
+    assert report.nesting.sheet_count > 1
+    assert list(outputs) == ["_sheet{}".format(index + 1) for index in range(report.nesting.sheet_count)] + \
+        [export.ASSEMBLY_SUFFIX]
+    assert sum(len(elements(outputs[suffix], "path")) for suffix in report.suffixes[:-1]) == 16
+
+
+def test_toolpath():
+    report, outputs = render("saxena", optimize_toolpath=True)
+    assert len(report.toolpaths) == 1
+    toolpath_report = report.toolpaths[0]
+    # every link outline and hub hole is a cut path of its own
+    assert toolpath_report.path_count == 16 * 3
+    assert len(elements(outputs[""], "path")) == toolpath_report.path_count
+    assert toolpath_report.travel_after < toolpath_report.travel_before
+
+
+def test_dxf():
+    _, outputs = render("simple_parallelogram", output_format="dxf")
+    lines = outputs[""].split("\n")
+    pairs = list(zip(lines[0:-1:2], lines[1::2]))
+    assert pairs.count(("0", "SECTION")) == pairs.count(("0", "ENDSEC")) == 3
+    assert pairs[-1] == ("0", "EOF")
+    entities = [value for code, value in pairs if code == "0"]
+    # every link: 2 lines and 2 arcs of the outline, 2 hub holes
+    assert entities.count("LINE") == 8
+    assert entities.count("ARC") == 8
+    assert entities.count("CIRCLE") == 8
+    assert {value for code, value in pairs if code == "8"} == {"CUT", "ENGRAVE"}
+
+
+def test_gcode():
+    _, outputs = render("simple_parallelogram", output_format="gcode", decimals=2)
+    lines = outputs[""].splitlines()
+    assert lines[1:3] == ["G21", "G90"]
+    assert lines[-3:] == ["M5", "G0 X0 Y0", "M2"]
+    moves = [line for line in lines if line.startswith(("G0 ", "G1 ", "G2 ", "G3 "))]
+    assert moves
+    assert all(len(number.partition(".")[2]) <= 2 for line in moves for number in numbers(line[2:]))
+    # the laser is off for every travel move
+    laser_on = False
+    for line in lines:
+        if line.startswith("M3"):
+            laser_on = True
+        elif line.startswith("M5"):
+            laser_on = False
+        elif line.startswith("G0 "):
+            assert not laser_on
+
+
+def test_symbols():
+    report, outputs = render("saxena", symbols=True)
+    assert report.symbol_classes == 3
+    manual = outputs[export.ASSEMBLY_SUFFIX]
+    # the single link without a congruent partner is written as path, the others as instances of 3 symbols
+    uses = elements(manual, "use")
+    assert len(uses) == 15
+    assert len({use.get("href") for use in uses}) == 3
+    assert len(elements(manual, "path")) == 3 + 1
+
+
+@pytest.mark.parametrize("output_format", ["dxf", "gcode"])
+def test_symbols_skipped(output_format):
+    report, outputs = render("saxena", symbols=True, output_format=output_format)
+    assert report.symbols_skipped == "{} output".format(output_format)
+    assert "{} output doesn't support them".format(output_format) in str(report)
+    assert len(elements(outputs[export.ASSEMBLY_SUFFIX], "use")) == 15
+
+
+def test_decimals():
+    _, outputs = render("saxena", decimals=2)
+    for path in elements(outputs[""], "path"):
+        assert all(len(number.partition(".")[2]) <= 2 for number in numbers(path.get("d")))
+
+
+@pytest.mark.parametrize("options", [{"output_format": "pdf"}, {"geometry": "bezier"}])
+def test_unknown_options(options, monkeypatch):
+    # rejected before any link is transformed or written
+    monkeypatch.setattr(LinkageConfiguration, "primitive_transforms", lambda *args: pytest.fail("transformed"))
+    with pytest.raises(ValueError, match="Unknown"):
+        render("saxena", **options)
@@ -0,0 +1,76 @@
+import numpy as np
+from shapely.geometry import LineString
+
+from interference import SWEEP_FRAMES, InterferenceChecker, assign_layers
+from linkage_graph.linkage_configuration import LinkageConfiguration
+import util.geometry as utils
+
+RADIUS = 7.5
+
+
+def random_configuration(count: int, seed: int = 0) -> LinkageConfiguration:
+    random = np.random.default_rng(seed)
+    starts = random.uniform(0, 300, size=(count, 2))
+    ends = starts + random.uniform(-40, 40, size=(count, 2))
+    # chain every fifth link to the previous one, so some links share a hub
+    ends[5::5] = starts[4:-1:5]
+    return LinkageConfiguration.from_line_segments(np.stack((starts, ends), axis=1).tolist())
+
+
+def brute_force_overlaps(configuration: LinkageConfiguration, positions: np.ndarray, clearance: float = 0.0) -> dict:
+    """{(i, j): overlapping frames} of all links without a common hub, by Shapely distances. """
+    ends = configuration.link_array
+    overlaps = {}
+    for i in range(len(ends)):
+        for j in range(i + 1, len(ends)):
+            if set(ends[i].tolist()) & set(ends[j].tolist()):
+                continue
+            frames = [frame for frame, pose in enumerate(positions)
+                      if LineString(pose[ends[i]]).distance(LineString(pose[ends[j]])) < 2 * RADIUS + clearance]
+            if frames:
+                overlaps[(i, j)] = frames
+    return overlaps
+
+
+def test_intersecting_box_pairs():
+    random = np.random.default_rng(1)
+    corners = random.uniform(0, 100, size=(200, 2))
+    bounds = np.hstack((corners, corners + random.uniform(0, 15, size=(200, 2))))
+    pairs = {tuple(pair) for pair in utils.intersecting_box_pairs(bounds).tolist()}
+    expected = {(i, j) for i in range(len(bounds)) for j in range(len(bounds))
+                if (bounds[i, :2] <= bounds[j, 2:]).all() and (bounds[j, :2] <= bounds[i, 2:]).all()}
+    assert pairs == expected
+
+
+def test_assembled_pose():
+    configuration = random_configuration(150)
+    report = InterferenceChecker(configuration, RADIUS).check()
+    expected = brute_force_overlaps(configuration, configuration.hub_array[None])
+    assert [tuple(pair) for pair in report.pairs.tolist()] == sorted(expected)
+    assert report.frame_counts.tolist() == [1] * len(expected)
+
+
+def test_poses():
+    configuration = random_configuration(60, seed=2)
+    random = np.random.default_rng(3)
+    # more frames than a window of the candidate search, hubs drifting away from the assembled pose
+    frame_count = 2 * SWEEP_FRAMES + 5
+    drift = np.cumsum(random.normal(0, 3, size=(frame_count,) + configuration.hub_array.shape), axis=0)
+    positions = configuration.hub_array[None] + drift
+
+    report = InterferenceChecker(configuration, RADIUS, clearance=1.0).check(positions)
+    expected = brute_force_overlaps(configuration, positions, clearance=1.0)
+    assert [tuple(pair) for pair in report.pairs.tolist()] == sorted(expected)
+    assert report.frame_counts.tolist() == [len(expected[pair]) for pair in sorted(expected)]
+    assert report.first_frames.tolist() == [expected[pair][0] for pair in sorted(expected)]
+
+
+def test_layers():
+    configuration = random_configuration(150)
+    checker = InterferenceChecker(configuration, RADIUS)
+    report = checker.check()
+    conflicts = np.concatenate((report.pairs, checker.shared_hub_pairs()))
+    assert len(checker.shared_hub_pairs()) > 0
+    assert all(report.layers[a] != report.layers[b] for a, b in conflicts.tolist())
+    # bipartite conflicts (an even cycle) need two layers
+    assert assign_layers(4, np.array([[0, 1], [1, 2], [2, 3], [3, 0]])) in ([0, 1, 0, 1], [1, 0, 1, 0])
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from conftest import sample_file
+from labels import place_labels
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from parse import parse_solvespace_file
+
+
+@pytest.mark.parametrize("name", ["saxena", "peaucellier_lipkin"])
+def test_labels_placed_once(name):
+    configuration = parse_solvespace_file(sample_file(name))
+    placement = place_labels(configuration)
+    assert placement.hubs.tolist() == np.unique(configuration.link_array).tolist()
+    assert placement.labels == [configuration.hubs[index].get_id() for index in placement.hubs.tolist()]
+    assert placement.unplaced == []
+
+    boxes = [box(*aabb) for aabb in placement.bounds().tolist()]
+    outlines = [link.as_polygon(kernel="shapely").boundary for link in configuration.links]
+    for index, label in enumerate(boxes):
+        assert not any(label.intersects(outline) for outline in outlines)
+        assert not any(label.intersection(other).area > 0 for other in boxes[index + 1:])
+
+
+def test_isolated_link():
+    placement = place_labels(LinkageConfiguration.from_line_segments([[[0, 0], [40, 0]]]))
+    # the first candidate, right of the hub within the link
+    np.testing.assert_allclose(placement.positions, [[2.5, 1.875], [42.5, 1.875]])
+    assert str(placement) == "2 hub labels placed"
+
+
+def test_crowded_labels_reported():
+    # outlines of parallel links every 2mm leave no free position
+    segments = [[[-100, y], [100, y]] for y in np.arange(-60, 61, 2.0)] + [[[0, 1], [0, 50]]]
+    placement = place_labels(LinkageConfiguration.from_line_segments(segments))
+    assert len(placement) == 124
+    assert 0 < len(placement.unplaced) < len(placement)
+    assert "overlap link outlines or other labels" in str(placement)
+
+    unplaced = placement.unplaced[0]
+    placed = next(index for index in range(len(placement)) if index not in placement.unplaced)
+    subset = placement.subset([placed, unplaced])
+    assert subset.labels == [placement.labels[placed], placement.labels[unplaced]]
+    assert subset.unplaced == [1]
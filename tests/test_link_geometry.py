@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+from shapely.geometry import LineString, Point, Polygon
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+import util.link_geometry as link_geometry
+
+
+def random_hubs(count: int, seed: int = 0) -> np.ndarray:
+    random = np.random.default_rng(seed)
+    starts = random.uniform(-100, 100, size=(count, 2))
+    return np.stack((starts, starts + random.uniform(-60, 60, size=(count, 2))), axis=1)
+
+
+def shapely_link(hubs: np.ndarray, resolution: int = 256) -> Polygon:
+    outline = LineString(hubs).buffer(link_geometry.LINKAGE_RADIUS, resolution)
+    for hub in hubs:
+        outline = outline.difference(Point(hub).buffer(link_geometry.JOINT_RADIUS, resolution))
+    return outline
+
+
+def test_arc_segment_count():
+    for radius, chord_tolerance in ((7.5, 0.01), (1, 0.01), (7.5, 0.5), (100, 0.001)):
+        count = link_geometry.arc_segment_count(radius, math.pi, chord_tolerance)
+        sagitta = radius * (1 - math.cos(math.pi / count / 2))
+        assert sagitta <= chord_tolerance + 1e-12
+        assert radius * (1 - math.cos(math.pi / (count - 1) / 2)) > chord_tolerance or count == 2
+    assert link_geometry.arc_segment_count(1, math.pi, 5) == 2
+
+
+def test_rings_match_shapely():
+    hubs = random_hubs(50)
+    hubs = hubs[link_geometry.is_simple(hubs)]
+    outlines, holes = link_geometry.link_rings(hubs, chord_tolerance=0.01)
+    areas = link_geometry.link_areas(hubs)
+    bounds = link_geometry.link_bounds(hubs)
+    for link_hubs, outline, link_holes, area, link_bounds in zip(hubs, outlines, holes, areas, bounds):
+        polygon = Polygon(outline, list(link_holes))
+        assert polygon.is_valid
+        # all vertices lie on the exact outline, chords stay within the tolerance
+        exact = shapely_link(link_hubs)
+        assert polygon.hausdorff_distance(exact) < 0.01 + 1e-6
+        assert abs(polygon.area - area) / area < 1e-3
+        assert np.allclose(link_bounds, exact.bounds, atol=1e-3)
+
+
+def test_short_links_fall_back_to_shapely():
+    # hub holes overlap for links shorter than two joint radii
+    configuration = LinkageConfiguration.from_line_segments([[[0, 0], [1.5, 0]], [[10, 0], [40, 0]]])
+    assert link_geometry.is_simple(configuration.hub_position_array()).tolist() == [False, True]
+    short, regular = configuration.links
+    assert short.as_polygon(kernel="arc").equals(short.as_polygon(kernel="shapely"))
+    assert len(regular.as_polygon(kernel="arc").interiors) == 2
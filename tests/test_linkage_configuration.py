@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from linkage_graph.linkage_hub import LinkageHub
+from linkage_graph.linkage_link import ConfigurationSpace, LinkageLink
+from util.spatial_hash import SpatialHash
+
+
+def test_from_line_segments_joins_hubs_within_tolerance():
+    # endpoints straddle cell borders of the snapping grid
+    segments = [[[0.0, 0.0], [10.0, 0.0]], [[10.0 + 0.9e-3, -0.9e-3], [10.0, 10.0]], [[10.0, 10.0 - 1e-4], [0.0, 0.0]]]
+    configuration = LinkageConfiguration.from_line_segments(segments, tolerance=1e-3)
+    assert len(configuration.hubs) == 3
+    assert configuration.link_array.tolist() == [[0, 1], [1, 2], [2, 0]]
+
+    configuration = LinkageConfiguration.from_line_segments(segments, tolerance=1e-6)
+    assert len(configuration.hubs) == 5
+
+
+def test_spatial_hash():
+    spatial_hash = SpatialHash(0.5)
+    spatial_hash.insert((0.99, 0.0), "a")
+    spatial_hash.insert((1.2, 0.0), "b")
+    assert spatial_hash.find((1.01, 0.0)) == "a"
+    assert spatial_hash.find((1.7, 0.0)) == "b"
+    assert spatial_hash.find((2.0, 0.0)) is None
+    assert sorted(spatial_hash.find_all((1.1, 0.1))) == ["a", "b"]
+    assert len(spatial_hash) == 2
+    with pytest.raises(ValueError):
+        SpatialHash(0)
+
+
+def test_hub_identity():
+    configuration = LinkageConfiguration.from_line_segments([[[0, 0], [1, 0]], [[1, 0], [1, 1]]])
+    other = LinkageConfiguration.from_line_segments([[[0, 0], [1, 0]], [[1, 0], [1, 1]]])
+    hubs = configuration.hubs
+    # the links view the same rows as the configuration's hubs
+    assert configuration.links[0].hub_b == configuration.links[1].hub_a == hubs[1]
+    assert hash(configuration.links[0].hub_b) == hash(hubs[1])
+    # hubs at the same position in another configuration are different hubs
+    assert hubs[0] != other.hubs[0]
+    assert len(set(hubs) | set(other.hubs)) == 6
+    assert hubs[0] != "A"
+
+
+def test_hubs_in_sets():
+    random = np.random.default_rng(0)
+    segments = random.uniform(-100, 100, size=(2000, 2, 2)).tolist()
+    configuration = LinkageConfiguration.from_line_segments(segments)
+    hubs = configuration.hubs
+    assert len(set(hubs)) == len(hubs) == 4000
+    # hubs don't share hash buckets
+    assert len({hash(hub) for hub in hubs}) == len(hubs)
+    lookup = {hub: hub.index for hub in hubs}
+    assert all(lookup[link.hub_a] == configuration.link_array[link.index][0] for link in configuration.links)
+
+
+def test_hub_adoption():
+    hub_a, hub_b = LinkageHub([0, 0]), LinkageHub([3, 4])
+    assert hub_a != LinkageHub([0, 0])
+    configuration = LinkageConfiguration([hub_a, hub_b], [])
+    assert [hub.id for hub in configuration.hubs] == [1, 2]
+    assert hub_a == configuration.hubs[0]
+    np.testing.assert_array_equal(configuration.hub_array, [[0, 0], [3, 4]])
+
+
+
+def test_array_views():
+    configuration = LinkageConfiguration.from_arrays([[0, 0], [10, 0], [10, 10], [0, 10]],
+                                                     [[0, 1], [1, 2], [2, 3], [3, 0], [0, 2]])
+    assert [link.get_id() for link in configuration.links] == ["A|B", "B|C", "C|D", "D|A", "A|C"]
+    configuration.hubs[2].position = (12.0, 12.0)
+    np.testing.assert_array_equal(configuration.hub_array[2], [12, 12])
+    np.testing.assert_array_equal(configuration.links[1].hub_b.position, [12, 12])
+
+    offsets, link_indices = configuration.adjacency()
+    for hub in range(len(configuration.hubs)):
+        expected = [index for index, ends in enumerate(configuration.link_array.tolist()) if hub in ends]
+        assert sorted(configuration.hub_links(hub).tolist()) == expected
+    assert offsets[-1] == len(link_indices) == 2 * len(configuration.links)
+
+
+def test_batched_queries_match_links():
+    configuration = LinkageConfiguration.from_line_segments([[[0, 0], [30, 5]], [[30, 5], [40, 40]], [[40, 40], [0, 0]]])
+    for index, link in enumerate(configuration.links):
+        transform = np.identity(4)
+        transform[0:2, 3] = (100.0 * index, 20.0)
+        link.set_fabrication_transform(transform, sheet=index)
+    for space in ConfigurationSpace:
+        positions = configuration.hub_positions(space)
+        for link, link_positions in zip(configuration.links, positions):
+            assert np.allclose(link.hub_positions(space), link_positions)
+
+    restored = LinkageConfiguration.from_dict(configuration.to_dict())
+    np.testing.assert_array_equal(restored.hub_array, configuration.hub_array)
+    np.testing.assert_array_equal(restored.link_array, configuration.link_array)
+    assert [link.fabrication_sheet for link in restored.links] == [0, 1, 2]
+    assert np.allclose(restored.hub_positions(ConfigurationSpace.fabrication),
+                       configuration.hub_positions(ConfigurationSpace.fabrication))
+
+
+def test_link_adoption():
+    hub_a, hub_b, hub_c = LinkageHub([0, 0]), LinkageHub([5, 0]), LinkageHub([5, 5])
+    links = [LinkageLink(hub_b, hub_c), LinkageLink(hub_a, hub_b)]
+    configuration = LinkageConfiguration([hub_a, hub_b, hub_c], links)
+    # hubs are numbered in order of their appearance in the links
+    assert [link.get_id() for link in configuration.links] == ["A|B", "C|A"]
+    assert links[1].hub_a == hub_a and hub_a.id == 3
+    assert configuration.link_array.tolist() == [[0, 1], [2, 0]]
+
+
+def test_primitive_transforms_match_legacy_transform():
+    random = np.random.default_rng(0)
+    starts = random.uniform(-100, 100, size=(300, 2))
+    # lengths from links barely longer than their two hub holes, plus axis aligned links
+    angles = np.concatenate((random.uniform(0, 2 * np.pi, size=284), np.arange(16) * np.pi / 8))
+    lengths = random.uniform(2.5, 120, size=300)
+    ends = starts + lengths[:, None] * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+    configuration = LinkageConfiguration.from_line_segments(np.stack((starts, ends), axis=1).tolist())
+
+    transforms = configuration.primitive_transforms()
+    for link, transform in zip(configuration.links, transforms):
+        assert np.allclose(transform, link._create_primitive_transform(), atol=1e-6)
@@ -0,0 +1,24 @@
+import argparse
+
+import pytest
+
+from conftest import sample_file
+from linkage_fab import main, size_argument
+
+
+def test_size_argument():
+    assert size_argument("1000x500") == (1000.0, 500.0)
+    assert size_argument("297X210.5") == (297.0, 210.5)
+
+
+@pytest.mark.parametrize("text", ["1000", "0x0", "-10x10", "axb", "1x2x3", "infx10", "nanx10"])
+def test_invalid_size_argument(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        size_argument(text)
+
+
+def test_links_longer_than_the_sheet(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main([sample_file("saxena"), "--sheet", "200x200", "--no-cache", "--output", str(tmp_path / "saxena.svg")])
+    assert exit_info.value.code == 2
+    assert "doesn't fit onto a" in capsys.readouterr().err
@@ -0,0 +1,48 @@
+import numpy as np
+
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from linkage_graph.linkage_link import ConfigurationSpace
+
+
+def single_link(start=(0.0, 0.0), end=(40.0, 30.0)):
+    return LinkageConfiguration.from_line_segments([[start, end]]).links[0]
+
+
+def test_cached_polygons():
+    link = single_link()
+    polygon = link.as_polygon(ConfigurationSpace.fabrication)
+    assert link.as_polygon(ConfigurationSpace.fabrication) is polygon
+    assert link.cache_info()["polygon"] == (1, 1)
+    # other parameters are cached separately
+    assert link.as_polygon(ConfigurationSpace.fabrication, linkage_radius=5) is not polygon
+    assert link.cache_info()["polygon"] == (1, 2)
+
+    link.clear_cache()
+    assert link.cache_info() == {}
+    assert link.as_polygon(ConfigurationSpace.fabrication).equals(polygon)
+
+
+def test_moved_hubs_invalidate():
+    link = single_link()
+    assembled = link.as_polygon()
+    link.hub_b.position = (40.0, 60.0)
+    moved = link.as_polygon()
+    assert moved is not assembled
+    assert np.allclose(moved.centroid.coords[0], (20.0, 30.0))
+    assert np.allclose(link.hub_positions(ConfigurationSpace.primitive), [[0.0, 36.0555127546], [0.0, -36.0555127546]])
+
+
+def test_fabrication_transform_invalidates_fabrication_space():
+    link = single_link()
+    assembled = link.as_polygon()
+    primitive = link.as_polygon(ConfigurationSpace.primitive)
+    fabrication = link.as_polygon(ConfigurationSpace.fabrication)
+
+    transform = np.identity(4)
+    transform[0:2, 3] = (100.0, 50.0)
+    link.set_fabrication_transform(transform, sheet=1)
+    assert link.fabrication_sheet == 1
+    assert link.as_polygon() is assembled
+    assert link.as_polygon(ConfigurationSpace.primitive) is primitive
+    moved = link.as_polygon(ConfigurationSpace.fabrication)
+    assert np.allclose(np.subtract(moved.bounds, fabrication.bounds), [100.0, 50.0, 100.0, 50.0])
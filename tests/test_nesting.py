@@ -0,0 +1,90 @@
+import itertools
+
+import numpy as np
+import pytest
+from shapely.geometry import LineString
+
+from nesting import EPSILON, PACKERS, MaxRectsPacker, NestingResult
+
+SHEET = (200, 100)
+
+
+def random_sizes(count: int, seed: int = 0) -> list:
+    random = np.random.default_rng(seed)
+    return [(float(width), float(height)) for width, height in random.uniform(5, 60, size=(count, 2))]
+
+
+def placed_rectangles(sizes: list, placements: list) -> list:
+    rectangles = []
+    for (width, height), (sheet, x, y, rotated) in zip(sizes, placements):
+        if rotated:
+            width, height = height, width
+        rectangles.append((sheet, x, y, x + width, y + height))
+    return rectangles
+
+
+def stadium(rectangle: tuple):
+    """The stadium shaped part (a link) filling a placed rectangle, rounded at the ends of its longer side. """
+    _, x1, y1, x2, y2 = rectangle
+    radius = min(x2 - x1, y2 - y1) / 2
+    if x2 - x1 >= y2 - y1:
+        axis = [(x1 + radius, y1 + radius), (x2 - radius, y1 + radius)]
+    else:
+        axis = [(x1 + radius, y1 + radius), (x1 + radius, y2 - radius)]
+    return LineString(axis).buffer(radius)
+
+
+def assert_valid_packing(sizes: list, placements: list, stadiums: bool = False):
+    rectangles = placed_rectangles(sizes, placements)
+    assert len(rectangles) == len(sizes)
+    for _, x1, y1, x2, y2 in rectangles:
+        assert x1 >= -EPSILON and y1 >= -EPSILON
+        assert x2 <= SHEET[0] + EPSILON and y2 <= SHEET[1] + EPSILON
+    for a, b in itertools.combinations(rectangles, 2):
+        if a[0] == b[0] and stadiums:
+            # the polygon packer interleaves the rounded ends, only the parts themselves must not overlap
+            assert stadium(a).intersection(stadium(b)).area < 1e-6, "{} overlaps {}".format(a, b)
+            continue
+        if a[0] != b[0]:
+            continue
+        overlap_x = min(a[3], b[3]) - max(a[1], b[1])
+        overlap_y = min(a[4], b[4]) - max(a[2], b[2])
+        assert overlap_x <= EPSILON or overlap_y <= EPSILON, "{} overlaps {}".format(a, b)
+
+
+@pytest.mark.parametrize("nesting", PACKERS)
+@pytest.mark.parametrize("allow_rotation", [False, True])
+def test_packing_is_valid(nesting, allow_rotation):
+    sizes = random_sizes(60)
+    placements = PACKERS[nesting](*SHEET, allow_rotation).pack(sizes)
+    assert_valid_packing(sizes, placements, stadiums=nesting == "polygon")
+    assert allow_rotation or not any(placement[3] for placement in placements)
+    assert max(placement[0] for placement in placements) >= 1
+
+
+@pytest.mark.parametrize("nesting", PACKERS)
+def test_rotation_fits_tall_parts(nesting):
+    sizes = [(90, 150)]
+    with pytest.raises(ValueError):
+        PACKERS[nesting](*SHEET).pack(sizes)
+    placements = PACKERS[nesting](*SHEET, allow_rotation=True).pack(sizes)
+    assert placements[0][3]
+    assert_valid_packing(sizes, placements, stadiums=nesting == "polygon")
+
+
+def test_continue_used_sheets():
+    packer = MaxRectsPacker(*SHEET)
+    sheets = []
+    first = random_sizes(10, seed=1)
+    second = random_sizes(10, seed=2)
+    first_placements = packer.pack(first, sheets)
+    second_placements = packer.pack(second, sheets)
+    assert_valid_packing(first + second, first_placements + second_placements)
+
+
+def test_nesting_result():
+    placements = [(0, 0, 0, False), (1, 0, 0, False), (1, 50, 0, False)]
+    result = NestingResult(placements, SHEET, [5000, 2000, 2000])
+    assert result.sheet_count == 2
+    assert result.sheet_utilization == pytest.approx([0.25, 0.2])
+    assert result.utilization == pytest.approx(0.225)
@@ -0,0 +1,60 @@
+import io
+
+import numpy as np
+import pytest
+
+from conftest import sample_file
+from parse import parse_solvespace_file, read_line_segments
+
+SIMPLE_PARALLELOGRAM = [
+    [[0.0, 0.0], [99.91543814941835, -4.111595725476352]],
+    [[99.91543814941835, -4.111595725476352], [155.44651403593832, 79.0526971584625]],
+    [[155.44651403593832, 79.0526971584625], [55.53107588651996, 83.16429288393886]],
+    [[55.53107588651996, 83.16429288393886], [0.0, 0.0]],
+]
+
+
+@pytest.mark.parametrize("name, count", [("peaucellier_lipkin", 8), ("saxena", 16), ("simple_parallelogram", 4)])
+def test_sample_segment_counts(name, count):
+    assert len(read_line_segments(sample_file(name))) == count
+
+
+def test_simple_parallelogram_segments():
+    np.testing.assert_allclose(read_line_segments(sample_file("simple_parallelogram")), SIMPLE_PARALLELOGRAM,
+                               rtol=0, atol=1e-9)
+
+
+def test_first_segments():
+    peaucellier_lipkin = read_line_segments(sample_file("peaucellier_lipkin"))
+    np.testing.assert_allclose(peaucellier_lipkin[:2], [[[0.0, 0.0], [50.0, 0.0]],
+                                                        [[50.0, 0.0], [99.99976993557871, -0.15167857198091947]]],
+                               rtol=0, atol=1e-9)
+    saxena = read_line_segments(sample_file("saxena"))
+    np.testing.assert_allclose(saxena[0], [[-202.39157301080232, 38.35437574113847],
+                                           [-104.10151603759655, 56.76808531319277]], rtol=0, atol=1e-9)
+
+
+def test_sources():
+    file_name = sample_file("saxena")
+    with open(file_name, "rb") as file:
+        content = file.read()
+    expected = read_line_segments(file_name)
+    assert read_line_segments(content) == expected
+    assert read_line_segments(io.BytesIO(content)) == expected
+    assert read_line_segments(io.StringIO(content.decode("latin-1"))) == expected
+
+
+@pytest.mark.parametrize("block", [
+    "Param.h.v.=zz\nParam.val=1.0\nAddParam\n",
+    "Param.h.v.=00040010\nParam.val=one\nAddParam\n",
+    "Entity.h.v=00040000\nEntity.type=11000\nEntity.workplane.v=80020000\nAddEntity\n",
+])
+def test_malformed_blocks(block):
+    with pytest.raises(ValueError, match="Malformed"):
+        read_line_segments(block.encode("ascii"))
+
+
+def test_configuration():
+    configuration = parse_solvespace_file(sample_file("simple_parallelogram"))
+    assert len(configuration.links) == 4
+    assert len(configuration.hubs) == 4
@@ -0,0 +1,110 @@
+import asyncio
+import contextlib
+import gzip
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import parse_qs
+from urllib.request import Request, urlopen
+
+import pytest
+
+from conftest import sample_file
+import service
+
+
+def read_sample(name: str) -> bytes:
+    with open(sample_file(name), "rb") as file:
+        return file.read()
+
+
+@contextlib.contextmanager
+def running_server():
+    server = service.create_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://{}:{}".format(*server.server_address[:2])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def post(url: str, body: bytes) -> (int, str, bytes):
+    try:
+        with urlopen(Request(url, data=body, method="POST"), timeout=60) as response:
+            return response.status, response.headers["Content-Type"], response.read()
+    except HTTPError as error:
+        return error.code, error.headers["Content-Type"], error.read()
+
+
+def test_render_file_and_bytes():
+    from_file = service.render(sample_file("saxena"), {"sheet": (300, 300)})
+    from_bytes = service.render(read_sample("saxena"), {"sheet": (300, 300)})
+    assert from_file.link_count == 16
+    assert from_file.outputs() == from_bytes.outputs()
+
+    compressed = service.render(read_sample("saxena"), {"sheet": (300, 300)}, compress=True)
+    assert [gzip.decompress(svg) for svg in compressed.fabrication] == from_file.fabrication
+    assert compressed.to_dict() == from_file.to_dict()
+
+
+def test_concurrent_renders():
+    source = read_sample("saxena")
+    expected = service.render(source).outputs()
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: service.render(source).outputs(), range(8)))
+    assert all(result == expected for result in results)
+
+    async def render_all():
+        return await asyncio.gather(*(service.render_async(source) for _ in range(3)))
+    assert all(result.outputs() == expected for result in asyncio.run(render_all()))
+
+
+@pytest.mark.parametrize("query", ["sheet=10", "sheet=0x100", "nesting=spiral", "format=pdf", "geometry=bezier"])
+def test_invalid_options(query):
+    with pytest.raises(ValueError):
+        service.render_options_from_query(parse_qs(query))
+
+
+def test_http():
+    source = read_sample("saxena")
+    with running_server() as url:
+        with urlopen(url + "/health", timeout=60) as response:
+            assert response.read() == b"ok"
+
+        status, content_type, body = post(url + "/render?sheet=300x300", source)
+        assert (status, content_type) == (200, "application/json")
+        summary = json.loads(body)
+        assert summary["links"] == 16
+        assert summary["fabrication"] == [svg.decode("utf-8") for svg in service.render(
+            source, {"sheet": (300, 300)}).fabrication]
+
+        status, content_type, body = post(url + "/render?output=fabrication&format=gcode", source)
+        assert (status, content_type) == (200, "text/x-gcode")
+        assert body.decode("utf-8").splitlines()[-1] == "M2"
+
+        status, content_type, body = post(url + "/render?output=assembly", source)
+        assert (status, content_type) == (200, "image/svg+xml")
+        assert body.startswith(b"<?xml")
+
+        assert post(url + "/render?output=fabrication&page=2", source)[0] == 404
+        assert post(url + "/unknown", source)[0] == 404
+
+
+def test_http_errors(monkeypatch):
+    with running_server() as url:
+        status, _, body = post(url + "/render?sheet=1x2x3", read_sample("saxena"))
+        assert status == 400
+        assert body.startswith(b"ValueError: ")
+
+        status, _, body = post(url + "/render", b"Param.h.v.=zz\nAddParam\n")
+        assert status == 400
+        assert b"Malformed param" in body
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("out of memory")
+        monkeypatch.setattr(service, "render", fail)
+        status, _, body = post(url + "/render", read_sample("saxena"))
+        assert (status, body) == (500, b"RuntimeError: out of memory")
@@ -0,0 +1,86 @@
+import io
+import math
+
+import numpy as np
+import pytest
+
+from conftest import sample_file
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from parse import parse_solvespace_file
+from simulation import ConstraintSystem, DEFAULT_TOLERANCE, simulate, write_animation_svg
+
+# crank A-B, coupler B-C and rocker C-D around the fixed hub D, B only reaches C while within 40mm of D
+FOUR_BAR = [[[0, 0], [20, 0]], [[20, 0], [48.5, math.sqrt(87.75)]], [[48.5, math.sqrt(87.75)], [45, 0]]]
+
+
+def link_lengths(positions: np.ndarray, link_array: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(positions[..., link_array[:, 0], :] - positions[..., link_array[:, 1], :], axis=-1)
+
+
+def test_saxena():
+    configuration = parse_solvespace_file(sample_file("saxena"))
+    simulation = simulate(configuration, ["J"], ("A", "B"), frames=720)
+    assert simulation.converged.all()
+    assert simulation.errors.max() <= DEFAULT_TOLERANCE
+    lengths = link_lengths(simulation.positions, configuration.link_array)
+    np.testing.assert_allclose(lengths, np.broadcast_to(lengths[0], lengths.shape), rtol=0, atol=DEFAULT_TOLERANCE)
+    # fixed hubs stay, the crank hub turns around its pivot
+    for hub_id in ("A", "J"):
+        index = [hub.get_id() for hub in configuration.hubs].index(hub_id)
+        np.testing.assert_allclose(simulation.positions[:, index], np.broadcast_to(
+            configuration.hub_array[index], (720, 2)))
+    radii = np.linalg.norm(simulation.positions[:, 1] - simulation.positions[:, 0], axis=1)
+    np.testing.assert_allclose(radii, radii[0])
+
+    stream = io.StringIO()
+    write_animation_svg(simulation, stream, max_frames=90)
+    assert stream.getvalue().count("<animate") > 0
+
+
+def test_motion_range():
+    configuration = LinkageConfiguration.from_line_segments(FOUR_BAR)
+    simulation = simulate(configuration, ["D"], ("A", "B"), frames=72)
+    assert simulation.converged[0]
+    assert not simulation.converged.all()
+    # locked frames keep the last reachable pose
+    assert simulation.errors.max() <= DEFAULT_TOLERANCE
+    reach = np.linalg.norm(simulation.positions[:, 1] - configuration.hub_array[3], axis=1)
+    assert (reach <= 40 + 1e-6).all()
+
+
+def test_sparse_products():
+    random = np.random.default_rng(3)
+    configuration = parse_solvespace_file(sample_file("saxena"))
+    system = ConstraintSystem(configuration.hub_array, configuration.link_array, {0, 1, 9})
+    frames = 5
+    positions = configuration.hub_array + random.normal(scale=0.5, size=(frames,) + configuration.hub_array.shape)
+
+    # dense Jacobians of the squared length residuals with respect to the free hubs
+    deltas = positions[:, system.ends[:, 0]] - positions[:, system.ends[:, 1]]
+    dense = np.zeros((frames, len(system.ends), len(system.free), 2))
+    variable = {hub: index for index, hub in enumerate(system.free)}
+    for row, (hub_a, hub_b) in enumerate(system.ends):
+        if hub_a in variable:
+            dense[:, row, variable[hub_a]] += 2 * deltas[:, row]
+        if hub_b in variable:
+            dense[:, row, variable[hub_b]] -= 2 * deltas[:, row]
+    dense = dense.reshape((frames, len(system.ends), -1))
+
+    link_major = deltas.transpose(1, 0, 2)
+    steps = random.normal(size=(len(system.free), frames, 2))
+    vectors = random.normal(size=(len(system.ends), frames))
+    np.testing.assert_allclose(system.multiply(link_major, steps).T,
+                               (dense @ steps.transpose(1, 0, 2).reshape((frames, -1, 1)))[..., 0], atol=1e-9)
+    np.testing.assert_allclose(system.multiply_transposed(link_major, vectors).transpose(1, 0, 2).reshape(frames, -1),
+                               (dense.transpose(0, 2, 1) @ vectors.T[..., None])[..., 0], atol=1e-9)
+
+    damping = 1e-3
+    solution = system.solve_normal(link_major, vectors, damping, relative_tolerance=1e-12)
+    normal = dense @ dense.transpose(0, 2, 1) + damping * np.identity(len(system.ends))
+    np.testing.assert_allclose(solution.T, np.linalg.solve(normal, vectors.T[..., None])[..., 0], rtol=1e-6)
+
+
+def test_unknown_hub():
+    configuration = LinkageConfiguration.from_line_segments(FOUR_BAR)
+    with pytest.raises(ValueError, match="Unknown hub"):
+        simulate(configuration, ["Z"], ("A", "B"))
@@ -0,0 +1,66 @@
+import os
+import re
+
+import numpy as np
+import pytest
+
+from conftest import sample_file
+from export import render_fabrication_layout
+from parse import parse_solvespace_file
+import tiles as tiling
+
+
+def test_tile_grid():
+    grid = tiling.tile_grid((-10, 0, 250, 100), (100, 80))
+    assert [tile.name for tile in grid] == ["r1c1", "r1c2", "r1c3", "r2c1", "r2c2", "r2c3"]
+    assert grid[4].bounds == (90, 80, 190, 160)
+    assert len(tiling.tile_grid((0, 0, 0, 0))) == 1
+    with pytest.raises(ValueError):
+        tiling.tile_grid((0, 0, 10, 10), (0, 10))
+
+
+def test_assign_tiles():
+    random = np.random.default_rng(0)
+    corners = random.uniform(0, 500, size=(300, 2))
+    link_bounds = np.hstack((corners, corners + random.uniform(0, 60, size=(300, 2))))
+    label_bounds = np.hstack((corners[:20], corners[:20] + 3))
+    grid = tiling.tile_grid((0, 0, 1000, 600), (100, 80))
+    pages = tiling.assign_tiles(grid, link_bounds, label_bounds)
+
+    def intersecting(tile, bounds):
+        return [index for index, aabb in enumerate(bounds.tolist()) if aabb[0] <= tile.bounds[2] and
+                tile.bounds[0] <= aabb[2] and aabb[1] <= tile.bounds[3] and tile.bounds[1] <= aabb[3]]
+    assert [tile.name for tile in pages] == [tile.name for tile in grid if intersecting(tile, link_bounds)]
+    for tile in pages:
+        assert tile.links.tolist() == intersecting(tile, link_bounds)
+        assert tile.labels.tolist() == intersecting(tile, label_bounds)
+
+
+def test_tiled_manual(tmp_path):
+    configuration = parse_solvespace_file(sample_file("saxena"))
+    report = render_fabrication_layout(configuration, str(tmp_path / "linkage.svg"), sheet=(300, 300),
+                                       manual_tiles=(100, 80))
+    page_files = report.files[1:-1]
+    assert report.manual_tiles == len(page_files) > 1
+    assert report.files[-1] == str(tmp_path / "linkage_assembly_manual.svg")
+
+    # the overview links to every page by its file name
+    with open(report.files[-1]) as file:
+        overview = file.read()
+    assert re.findall('href="([^"]+)"', overview) == [os.path.basename(page_file) for page_file in page_files]
+
+    # every link and hub label shows up on a page
+    paths, labels = set(), set()
+    for page_file in page_files:
+        with open(page_file) as file:
+            page = file.read()
+        paths.update(re.findall('<path[^>]* d="([^"]+)"', page))
+        labels.update(re.findall("<text[^>]*> (\\w+) </text>", page))
+    assert len(paths) == len(configuration.links)
+    assert labels == set(report.labels.labels)
+
+    parallel = render_fabrication_layout(configuration, str(tmp_path / "parallel.svg"), sheet=(300, 300),
+                                         manual_tiles=(100, 80), workers=2)
+    for serial_file, parallel_file in zip(report.files[1:-1], parallel.files[1:-1]):
+        with open(serial_file) as serial, open(parallel_file) as parallel_page:
+            assert serial.read() == parallel_page.read()
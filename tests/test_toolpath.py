@@ -0,0 +1,62 @@
+import numpy as np
+from shapely.geometry import MultiLineString, box
+from shapely.ops import unary_union
+
+from toolpath import optimize_toolpath, travel_distance
+
+
+def cut_length(paths: list) -> float:
+    return sum(float(np.linalg.norm(np.diff(path.points, axis=0), axis=1).sum()) for path in paths)
+
+
+def cut_lines(paths: list) -> MultiLineString:
+    return MultiLineString([path.points.tolist() for path in paths])
+
+
+def test_shared_edge():
+    paths, report = optimize_toolpath([box(0, 0, 10, 10), box(10, 0, 20, 10)])
+    assert report.removed_segments == 1
+    assert abs(report.removed_length - 10) < 1e-9
+    assert abs(cut_length(paths) - 70) < 1e-9
+
+
+def test_overlapping_collinear_edges():
+    # the second square's left edge runs along the upper half of the first square's right edge
+    polygons = [box(0, 0, 10, 10), box(10, 5, 20, 15)]
+    paths, report = optimize_toolpath(polygons)
+    assert report.removed_segments == 1
+    assert abs(report.removed_length - 5) < 1e-9
+    assert abs(cut_length(paths) - 75) < 1e-9
+    assert cut_lines(paths).equals(unary_union([polygon.boundary for polygon in polygons]))
+
+
+def test_edges_within_tolerance():
+    polygons = [box(0, 0, 10, 10), box(10.0004, 2, 20, 8), box(10.01, -5, 20, -1)]
+    paths, report = optimize_toolpath(polygons, tolerance=1e-3)
+    # the second part's left edge is cut with the first part, the third part is too far off
+    assert report.removed_segments == 1
+    assert abs(report.removed_length - 6) < 1e-9
+    assert abs(cut_length(paths) - (40 + (2 * 9.9996 + 6) + (2 * 9.99 + 2 * 4))) < 1e-9
+
+
+def test_parallel_edges():
+    _, report = optimize_toolpath([box(0, 0, 10, 10), box(10.5, 0, 20, 10)])
+    assert report.removed_segments == 0
+    assert report.removed_length == 0
+
+
+def test_abutting_grid():
+    # parts nested edge to edge with partly shared edges, checked against the union of their outlines
+    random = np.random.default_rng(3)
+    polygons = []
+    for row in range(6):
+        x = 0.0
+        for width in random.uniform(3, 12, size=8):
+            polygons.append(box(x, row * 10.0 + (row % 2) * 2.5, x + width, row * 10.0 + (row % 2) * 2.5 + 10))
+            x += width
+    paths, report = optimize_toolpath(polygons)
+    outlines = unary_union([polygon.boundary for polygon in polygons])
+    assert abs(cut_length(paths) - outlines.length) < 1e-6
+    assert cut_lines(paths).symmetric_difference(outlines).length < 1e-6
+    assert report.path_count == len(paths)
+    assert report.travel_after == travel_distance(paths)
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import sample_file
+from linkage_graph.linkage_configuration import LinkageConfiguration
+from parse import parse_solvespace_file
+from watch import IncrementalRenderer, match_configuration
+
+
+def segments(name: str = "saxena") -> list:
+    return parse_solvespace_file(sample_file(name)).hub_position_array().tolist()
+
+
+def test_match_configuration():
+    previous = LinkageConfiguration.from_line_segments([[[0, 0], [10, 0]], [[10, 0], [10, 10]], [[10, 10], [0, 0]]])
+    # reordered and reversed links, one moved to a new hub and one added
+    current = LinkageConfiguration.from_line_segments([[[10, 10], [10, 0]], [[0, 0], [20, 20]], [[10, 0], [0, 0]],
+                                                       [[20, 20], [10, 10]]])
+    configuration, kept, removed = match_configuration(previous, current)
+    assert kept.tolist() == [0, 1]
+    assert removed.tolist() == [2]
+    assert [link.get_id() for link in configuration.links] == ["A|B", "B|C", "A|D", "D|C"]
+    np.testing.assert_array_equal(configuration.hub_array, [[0, 0], [10, 0], [10, 10], [20, 20]])
+
+
+def test_incremental_updates(tmp_path):
+    output_file = str(tmp_path / "linkage.svg")
+    renderer = IncrementalRenderer(output_file, sheet=(300, 300))
+    first = renderer.update(parse_solvespace_file(sample_file("saxena")))
+    assert (first.links, first.added, first.sheet_count) == (16, 16, 1)
+    assert sorted(os.path.basename(file) for file in first.files) == ["linkage.svg", "linkage_assembly_manual.svg"]
+    transforms = renderer.configuration.transform_array.copy()
+    with open(output_file) as file:
+        sheet = file.read()
+
+    unchanged = renderer.update(LinkageConfiguration.from_line_segments(segments()[::-1]))
+    assert (unchanged.added, unchanged.removed, unchanged.files) == (0, 0, [])
+
+    added = renderer.update(LinkageConfiguration.from_line_segments(segments() + [[[500, 500], [540, 500]]]))
+    assert (added.links, added.added, added.removed) == (17, 1, 0)
+    assert len(added.files) == 2
+    # unchanged links keep their place on the sheet and their rendered paths
+    np.testing.assert_array_equal(renderer.configuration.transform_array[:16], transforms)
+    with open(output_file) as file:
+        updated = file.read()
+    assert updated.count("<path") == sheet.count("<path") + 1
+    assert all(line in updated for line in sheet.splitlines() if line.startswith("<path"))
+
+
+def test_unsupported_options():
+    with pytest.raises(ValueError):
+        IncrementalRenderer(symbols=True)
+    with pytest.raises(ValueError):
+        IncrementalRenderer(output_format="pdf")